@@ -0,0 +1,195 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from app import metrics
+
+logger = logging.getLogger("admission")
+
+# ------------------------
+# Config
+# ------------------------
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Longest a request may wait for a slot before it is turned away
+ADMISSION_MAX_WAIT_S = float(os.getenv("ADMISSION_MAX_WAIT_S", "10"))
+
+# Per stage: requests running at once, and requests allowed to wait for a slot.
+# Overridable as ADMISSION_<STAGE>_CONCURRENCY / ADMISSION_<STAGE>_QUEUE.
+_DEFAULT_LIMITS = {
+    "stt": (4, 32),
+    "retrieval": (8, 64),
+    "llm": (32, 128),
+    "tts": (2, 32),
+}
+
+# Priorities (lower is served first); WebSocket turns are interactive, REST is bulk
+INTERACTIVE = 0
+BULK = 1
+BACKGROUND = 2  # e.g. streaming STT partials, fine to drop
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("tutor_priority", default=BULK)
+
+
+def set_priority(priority: int):
+    """Priority for the current request/connection (inherited by its tasks and threads)."""
+    _priority.set(priority)
+
+
+class Overloaded(RuntimeError):
+    """A stage's wait queue is full (or the wait timed out); retry after `retry_after` seconds."""
+
+    def __init__(self, stage: str, retry_after: int, reason: str = "queue full"):
+        self.stage = stage
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"{stage} busy ({reason}), retry in {retry_after}s")
+
+
+class StageLimiter:
+    """
+    Priority semaphore with a bounded wait queue for one pipeline stage.
+    - At most `concurrency` holders; further callers wait, best priority first
+    - When `queue_size` callers are already waiting, new ones fail fast with
+      Overloaded (callers waiting longer than `max_wait` fail too)
+    - A released slot is handed straight to the next waiter
+    Runs on the event loop; limits are per worker process.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, max_wait: float = ADMISSION_MAX_WAIT_S):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: List = []  # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_s = 0.0
+        self.hold_s = 0.0
+        self.released = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Rough time until a new caller would get a slot."""
+        avg_hold = self.hold_s / self.released if self.released else 1.0
+        return max(1, math.ceil(avg_hold * (self.queued + 1) / self.concurrency))
+
+    async def acquire(self, priority: int = BULK) -> float:
+        """Wait for a slot; returns the seconds spent waiting."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._admit(priority, 0.0)
+            return 0.0
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue full")
+
+        t0 = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        metrics.admission_queue(self.name, self.queued)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            elif entry in self._waiters:
+                # release() may already have popped (and skipped) our cancelled entry
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                metrics.admission_queue(self.name, self.queued)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("wait timeout")
+            raise
+        waited = time.perf_counter() - t0
+        self._admit(priority, waited)
+        return waited
+
+    def release(self, held_s: float = 0.0):
+        self.released += 1
+        self.hold_s += held_s
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # slot moves to the waiter; active stays the same
+                metrics.admission_queue(self.name, self.queued)
+                return
+        self.active -= 1
+        metrics.admission_active(self.name, self.active)
+
+    def _admit(self, priority: int, waited: float):
+        self.admitted += 1
+        self.wait_s += waited
+        metrics.admission_active(self.name, self.active)
+        metrics.admission_wait(self.name, PRIORITY_NAMES.get(priority, str(priority)), waited)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        metrics.admission_rejected(self.name)
+        raise Overloaded(self.name, self.retry_after(), reason)
+
+    def stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_s / self.admitted * 1000, 2) if self.admitted else None,
+            "avg_hold_ms": round(self.hold_s / self.released * 1000, 2) if self.released else None,
+            "retry_after_s": self.retry_after(),
+        }
+
+
+def _build_limiters() -> Dict[str, StageLimiter]:
+    limiters = {}
+    for name, (concurrency, queue_size) in _DEFAULT_LIMITS.items():
+        limiters[name] = StageLimiter(
+            name,
+            int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", str(concurrency))),
+            int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(queue_size))),
+        )
+    return limiters
+
+
+limiters = _build_limiters()
+
+
+@asynccontextmanager
+async def stage(name: str, priority: Optional[int] = None):
+    """
+    Hold a slot of stage `name` for the body; raises Overloaded when the stage
+    is saturated. Priority defaults to the current request's (see set_priority).
+    """
+    limiter = limiters.get(name) if ADMISSION_ENABLED else None
+    if limiter is None:
+        yield
+        return
+    await limiter.acquire(_priority.get() if priority is None else priority)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        limiter.release(time.perf_counter() - t0)
+
+
+def stats() -> Dict:
+    return {
+        "enabled": ADMISSION_ENABLED,
+        "max_wait_s": ADMISSION_MAX_WAIT_S,
+        "stages": {name: limiter.stats() for name, limiter in limiters.items()},
+    }
@@ -0,0 +1,164 @@
+import os
+import struct
+import logging
+from typing import Iterator, Optional, Dict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import av
+except ImportError:
+    av = None
+
+logger = logging.getLogger("audio")
+
+# ------------------------
+# Config
+# ------------------------
+AUDIO_CHUNK_BYTES = int(os.getenv("AUDIO_CHUNK_BYTES", "4096"))
+OPUS_BITRATE = int(os.getenv("OPUS_BITRATE", "32000"))
+MP3_BITRATE = int(os.getenv("MP3_BITRATE", "48000"))
+
+# format -> (media type, container, codec, encoder sample rate or None to keep)
+FORMATS: Dict[str, tuple] = {
+    "wav": ("audio/wav", None, None, None),
+    "pcm": ("audio/L16", None, None, None),
+    "opus": ("audio/ogg", "ogg", "libopus", 48000),
+    "mp3": ("audio/mpeg", "mp3", "libmp3lame", None),
+}
+_ACCEPT_TO_FORMAT = {
+    "audio/ogg": "opus", "audio/opus": "opus", "audio/webm": "opus",
+    "audio/mpeg": "mp3", "audio/mp3": "mp3",
+    "audio/wav": "wav", "audio/x-wav": "wav", "audio/l16": "pcm",
+}
+# Formats that can be sent sentence by sentence while later sentences still render
+STREAMABLE_FORMATS = ("wav", "pcm")
+_MP3_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+
+def available_formats() -> list:
+    return [f for f, (_, container, _, _) in FORMATS.items() if container is None or av is not None]
+
+
+def negotiate_format(requested: Optional[str] = None, accept: Optional[str] = None) -> str:
+    """
+    Pick an output format from an explicit `format` value or an Accept header.
+    Raises ValueError for unknown/unavailable formats.
+    """
+    fmt = (requested or "").lower().strip()
+    if not fmt and accept:
+        for part in accept.split(","):
+            media = part.split(";")[0].strip().lower()
+            if media in _ACCEPT_TO_FORMAT:
+                fmt = _ACCEPT_TO_FORMAT[media]
+                break
+    fmt = fmt or "wav"
+    if fmt == "ogg":
+        fmt = "opus"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported audio format '{fmt}'. Use one of {list(FORMATS)}")
+    if fmt not in available_formats():
+        raise ValueError(f"Audio format '{fmt}' needs PyAV (pip install av)")
+    return fmt
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][0]
+
+
+def wav_header(num_bytes: int, sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    byte_rate = sample_rate * channels * sample_width
+    return (
+        b"RIFF" + struct.pack("<I", 36 + num_bytes) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8)
+        + b"data" + struct.pack("<I", num_bytes)
+    )
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Header for a WAV of unknown length: RIFF/data sizes set to the maximum, as ffmpeg writes to pipes."""
+    header = bytearray(wav_header(0, sample_rate, channels, sample_width))
+    header[4:8] = header[40:44] = b"\xff\xff\xff\xff"
+    return bytes(header)
+
+
+def _slices(pcm: bytes, chunk_bytes: int) -> Iterator[bytes]:
+    # Keep every slice sample-aligned (16-bit mono)
+    step = max(2, chunk_bytes - chunk_bytes % 2)
+    view = memoryview(pcm)
+    for i in range(0, len(view), step):
+        yield view[i:i + step]
+
+
+class _Sink:
+    """Write-only file object that collects muxer output between reads."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def take(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts, self.size = [], 0
+        return out
+
+
+def _encode_av(pcm: bytes, sample_rate: int, fmt: str, chunk_bytes: int) -> Iterator[bytes]:
+    _, container, codec, out_rate = FORMATS[fmt]
+    if out_rate is None:
+        out_rate = sample_rate if sample_rate in _MP3_RATES else 24000
+
+    sink = _Sink()
+    out = av.open(sink, mode="w", format=container, container_options={"flush_packets": "1"})
+    stream = out.add_stream(codec, rate=out_rate, layout="mono")
+    stream.bit_rate = OPUS_BITRATE if fmt == "opus" else MP3_BITRATE
+    resampler = av.AudioResampler(format=stream.codec_context.format.name, layout="mono", rate=out_rate)
+
+    samples = np.frombuffer(pcm, dtype="<i2").reshape(1, -1)
+    frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+    frame.sample_rate = sample_rate
+
+    # Whole packets are muxed per write, so each yielded chunk holds complete
+    # Ogg pages / MP3 frames and can be decoded by the client as it arrives.
+    for f in [*resampler.resample(frame), *resampler.resample(None), None]:
+        for packet in stream.encode(f):
+            out.mux(packet)
+            if sink.size >= chunk_bytes:
+                yield sink.take()
+    out.close()
+    tail = sink.take()
+    if tail:
+        yield tail
+
+
+def iter_audio(pcm: bytes, sample_rate: int, fmt: str = "wav", chunk_bytes: int = AUDIO_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Stream in-memory 16-bit mono PCM as `fmt` without touching disk.
+    - wav: 44-byte header, then sample-aligned PCM slices
+    - pcm: sample-aligned raw PCM slices
+    - opus/mp3: encoded with PyAV; every chunk ends on a page/frame boundary
+    """
+    if fmt == "wav":
+        yield wav_header(len(pcm), sample_rate)
+        yield from _slices(pcm, chunk_bytes)
+    elif fmt == "pcm":
+        yield from _slices(pcm, chunk_bytes)
+    else:
+        yield from _encode_av(pcm, sample_rate, fmt, chunk_bytes)
+
+
+def iter_pcm(pcm: bytes, chunk_bytes: int = AUDIO_CHUNK_BYTES) -> Iterator[bytes]:
+    """Sample-aligned slices of raw PCM, e.g. one sentence of a streamed WAV/PCM answer."""
+    return _slices(pcm, chunk_bytes)
+
+
+def encode_audio(pcm: bytes, sample_rate: int, fmt: str = "wav") -> bytes:
+    return b"".join(bytes(c) for c in iter_audio(pcm, sample_rate, fmt))
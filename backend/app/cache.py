@@ -0,0 +1,314 @@
+import os
+import re
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger("rag_cache")
+
+# ------------------------
+# Config
+# ------------------------
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "5000"))
+# Empty = in-memory only; otherwise the query caches are loaded from / saved to this file.
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+# Written by ingestion whenever the collection changes; readers compare its mtime.
+COLLECTION_STAMP = ".collection_version"
+
+
+def bump_collection_version(chroma_dir: str):
+    """Mark the persisted collection as changed so caches in running servers invalidate."""
+    os.makedirs(chroma_dir, exist_ok=True)
+    path = os.path.join(chroma_dir, COLLECTION_STAMP)
+    with open(path, "w") as f:
+        f.write(str(time.time_ns()))
+
+
+def read_collection_stamp(chroma_dir: str) -> int:
+    try:
+        return os.stat(os.path.join(chroma_dir, COLLECTION_STAMP)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _normalize(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on query embeddings.
+    - Lookup returns the stored answer whose query embedding has the highest cosine
+      similarity to the new query, if it is >= `threshold`.
+    - Entries expire after `ttl` seconds; the least recently used entry is evicted
+      once `max_entries` is reached.
+    - Everything is dropped when the collection version changes.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None   # (max_entries, dim), rows are slots
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)  # per slot, time.monotonic()
+        self._lru: "OrderedDict[int, str]" = OrderedDict()  # slot -> answer
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._version: Any = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ------------------------
+    # Internals
+    # ------------------------
+    def _drop(self, slot: int):
+        self._lru.pop(slot, None)
+        self._valid[slot] = False
+        self._free.append(slot)
+
+    def _expire(self):
+        # Before scoring, so an expired best match can't hide a valid runner-up
+        if not self.ttl:
+            return
+        expired = np.flatnonzero(self._valid & (self._created < time.monotonic() - self.ttl))
+        for slot in expired.tolist():
+            self._drop(slot)
+        self.expirations += len(expired)
+
+    def _check_version(self, version: Any):
+        if version != self._version:
+            if self._lru:
+                self.invalidations += 1
+            for slot in list(self._lru):
+                self._drop(slot)
+            self._version = version
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def lookup(self, embedding: Sequence[float], version: Any = None) -> Optional[str]:
+        q = _normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            if not self._lru or self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+
+            sims = self._vectors @ q
+            sims[~self._valid] = -np.inf
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._lru[slot]
+
+    def store(self, embedding: Sequence[float], answer: str, version: Any = None):
+        v = _normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None or self._vectors.shape[1] != v.shape[0]:
+                self._vectors = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._lru.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+
+            if not self._free:
+                oldest, _ = self._lru.popitem(last=False)
+                self._valid[oldest] = False
+                self._free.append(oldest)
+                self.evictions += 1
+
+            slot = self._free.pop()
+            self._vectors[slot] = v
+            self._valid[slot] = True
+            self._created[slot] = time.monotonic()
+            self._lru[slot] = answer
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._lru):
+                self._drop(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+        }
+
+
+# ------------------------
+# Query embedding / retrieval caches
+# ------------------------
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return _WS_RE.sub(" ", text.strip().lower())
+
+
+def embedding_key(embedding: Sequence[float]) -> str:
+    return hashlib.sha1(np.asarray(embedding, dtype=np.float32).tobytes()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+class QueryCache:
+    """
+    Two-level cache in front of the vector store:
+    - (encoder, normalized query text) -> embedding vector
+    - (embedding hash, k, collection version) -> retrieved (chunk id, text) pairs
+    Optionally persisted to `path` (pickle) so it survives restarts. `encoder`
+    identifies the embedding model (backend, model, quantization): a file saved
+    under another encoder is not loaded, so switching EMBED_BACKEND never serves
+    vectors from the old model.
+    """
+
+    def __init__(
+        self,
+        max_embeddings: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        max_results: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        path: str = QUERY_CACHE_PATH,
+        encoder: str = "",
+    ):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+        self.path = path
+        self.encoder = encoder
+        if path:
+            self.load()
+
+    def get_embedding(self, text: str) -> Optional[np.ndarray]:
+        return self.embeddings.get((self.encoder, normalize_query(text)))
+
+    def put_embedding(self, text: str, embedding: Sequence[float]):
+        self.embeddings.put((self.encoder, normalize_query(text)), np.asarray(embedding, dtype=np.float32))
+
+    def get_results(self, embedding: Sequence[float], k: int, version: Any):
+        return self.results.get((embedding_key(embedding), k, version))
+
+    def put_results(self, embedding: Sequence[float], k: int, version: Any, results):
+        self.results.put((embedding_key(embedding), k, version), results)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("encoder", "") != self.encoder:
+                logger.info(f"Query cache {self.path} was built with encoder '{data.get('encoder', '')}', not '{self.encoder}'; starting empty")
+                return
+            for key, value in data.get("embeddings", []):
+                self.embeddings.put(key, value)
+            for key, value in data.get("results", []):
+                self.results.put(key, value)
+            logger.info(f"Loaded query cache from {self.path} ({len(self.embeddings)} embeddings, {len(self.results)} results)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load query cache {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Own temp file per writer: workers shutting down together all save here
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"encoder": self.encoder, "embeddings": self.embeddings.items(), "results": self.results.items()}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save query cache {self.path}: {e}")
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"embedding": self.embeddings.stats(), "retrieval": self.results.stats()}
@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Any
+
+logger = logging.getLogger("components")
+
+# ------------------------
+# Config
+# ------------------------
+# Load every component in the background right after startup (0 = on first use)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+# Components that must be ready before /healthz/ready reports ready
+READY_REQUIRED = [c.strip() for c in os.getenv("READY_REQUIRED", "embeddings,vector_store").split(",") if c.strip()]
+# Retry-After hint (seconds) sent while a component is still loading
+NOT_READY_RETRY_AFTER = int(os.getenv("NOT_READY_RETRY_AFTER", "5"))
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ComponentNotReady(RuntimeError):
+    def __init__(self, name: str, state: str, error: Optional[str] = None):
+        self.name = name
+        self.state = state
+        self.error = error
+        detail = f": {error}" if error else ""
+        super().__init__(f"{name} is {state}{detail}")
+
+
+class Component:
+    """
+    A heavy dependency (model, index) with a pending -> loading -> ready | failed
+    state machine. The blocking loader runs once, in a worker thread, after any
+    components it depends on; callers check() it instead of waiting on it.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], depends_on: Optional[List["Component"]] = None):
+        self.name = name
+        self.loader = loader
+        self.depends_on = depends_on or []
+        self.state = PENDING
+        self.value: Any = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.load_s: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    @property
+    def settled(self) -> bool:
+        return self.state in (READY, FAILED)
+
+    async def load(self):
+        """Load (once) and wait for the result; concurrent callers share one task."""
+        if self.settled:
+            return
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        await asyncio.shield(self._task)
+
+    def start(self):
+        """Kick off a background load from async code without waiting for it."""
+        if self.state == PENDING and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        for dep in self.depends_on:
+            await dep.load()
+            if not dep.ready:
+                self._finish(FAILED, error=f"dependency {dep.name} {dep.state}")
+                return
+        with self._lock:
+            self.state = LOADING
+            self.started_at = time.time()
+        t0 = time.perf_counter()
+        try:
+            self.value = await asyncio.to_thread(self.loader)
+            self._finish(READY, load_s=time.perf_counter() - t0)
+            logger.info(f"✅ {self.name} ready in {self.load_s:.2f}s")
+        except Exception as e:
+            self._finish(FAILED, load_s=time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+            logger.warning(f"⚠️ {self.name} failed to load: {self.error}")
+
+    def _finish(self, state: str, load_s: Optional[float] = None, error: Optional[str] = None):
+        with self._lock:
+            self.state = state
+            self.load_s = load_s
+            self.error = error
+
+    def check(self, allow_failed: bool = False):
+        """
+        Raise ComponentNotReady unless loaded. A pending component starts loading
+        in the background; with allow_failed, a failed one lets callers degrade.
+        """
+        if self.state == READY or (allow_failed and self.state == FAILED):
+            return
+        if self.state == PENDING:
+            try:
+                self.start()
+            except RuntimeError:  # no running loop
+                pass
+        raise ComponentNotReady(self.name, self.state, self.error)
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "load_s": round(self.load_s, 3) if self.load_s is not None else None,
+            "error": self.error,
+        }
+
+
+class ComponentRegistry:
+    def __init__(self, required: Optional[List[str]] = None):
+        self.required = READY_REQUIRED if required is None else required
+        self.components: Dict[str, Component] = {}
+        self.created_at = time.perf_counter()
+
+    def register(self, name: str, loader: Callable[[], Any], depends_on: Optional[List[str]] = None) -> Component:
+        component = Component(name, loader, [self.components[d] for d in depends_on or []])
+        self.components[name] = component
+        return component
+
+    def __getitem__(self, name: str) -> Component:
+        return self.components[name]
+
+    def check(self, *names: str, allow_failed: bool = False):
+        for name in names:
+            self.components[name].check(allow_failed=allow_failed)
+
+    async def warmup(self):
+        """Load everything concurrently (dependencies are awaited per component)."""
+        t0 = time.perf_counter()
+        await asyncio.gather(*(c.load() for c in self.components.values()))
+        logger.info(f"🔥 Warmup finished in {time.perf_counter() - t0:.2f}s: "
+                    f"{ {n: c.state for n, c in self.components.items()} }")
+
+    def is_ready(self) -> bool:
+        return all(self.components[n].ready for n in self.required if n in self.components)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.is_ready(),
+            "required": self.required,
+            "uptime_s": round(time.perf_counter() - self.created_at, 1),
+            "components": {name: c.status() for name, c in self.components.items()},
+        }
+
+
+# Process-wide registry; components are registered by app.main
+components = ComponentRegistry()
@@ -0,0 +1,131 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, List
+
+logger = logging.getLogger("embedder")
+
+# ------------------------
+# Config
+# ------------------------
+# Sentence-transformer runtime: "torch" (sentence-transformers) or "onnx" (app/onnx_embedder.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Query texts embedded in one forward pass, and how long the first one waits for company
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "3"))
+
+
+class BatchingEmbedder:
+    """
+    Dynamic micro-batching in front of a LangChain embeddings object.
+    - Callers from any thread submit() a text and get a concurrent Future
+    - One worker thread takes the first pending text, collects more for up to
+      EMBED_BATCH_WAIT_MS (or until EMBED_BATCH_SIZE), runs a single
+      embed_documents() call and resolves every caller's future
+    - While a batch is being embedded new texts queue up, so batches grow with load
+    """
+
+    def __init__(self, model, batch_size: int = EMBED_BATCH_SIZE, batch_wait_ms: float = EMBED_BATCH_WAIT_MS):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.max_batch = 0
+        self.compute_s = 0.0
+        self.wait_s = 0.0
+        self._thread = threading.Thread(target=self._worker, name="embedder", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Blocking; for callers already on a worker thread."""
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a known batch (e.g. a question bank) in one embed_documents() call
+        on the caller's thread, skipping the micro-batching window. Blocking.
+        """
+        if not texts:
+            return []
+        started = time.perf_counter()
+        try:
+            return self.model.embed_documents(list(texts))
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.texts += len(texts)
+                self.max_batch = max(self.max_batch, len(texts))
+                self.compute_s += time.perf_counter() - started
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                # Drain whatever is already queued, then wait out the window
+                entry = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [e for e in self._collect(first) if e[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                vectors = self.model.embed_documents([text for text, _, _ in batch])
+                for (_, future, _), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            finally:
+                with self._lock:
+                    self.batches += 1
+                    self.texts += len(batch)
+                    self.max_batch = max(self.max_batch, len(batch))
+                    self.compute_s += time.perf_counter() - started
+                    self.wait_s += sum(started - queued for _, _, queued in batch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "batch_wait_ms": round(self.batch_wait * 1000, 2),
+                "queue_depth": self._queue.qsize(),
+                "texts": self.texts,
+                "batches": self.batches,
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else None,
+                "max_batch_size": self.max_batch,
+                "avg_compute_ms": round(self.compute_s / self.batches * 1000, 2) if self.batches else None,
+                "avg_wait_ms": round(self.wait_s / self.texts * 1000, 2) if self.texts else None,
+            }
+
@@ -1,26 +1,356 @@
 import os
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.document_loaders import TextLoader
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain.vectorstores import Chroma
+import glob
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Iterator, Iterable, List, Dict, Set
 
+from app.cache import bump_collection_version
+from app.embedder import EMBED_BACKEND
+
+logger = logging.getLogger("ingest")
+
+# ------------------------
+# Optional loaders
+# ------------------------
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    from pptx import Presentation
+except ImportError:
+    Presentation = None
+
+# ------------------------
+# Config
+# ------------------------
 CHROMA_DIR = os.getenv("CHROMA_DB_DIR", "./chroma_db")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "200"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+MANIFEST_NAME = "ingest_manifest.json"
+
+_TXT_BLOCK = 64 * 1024
+
+
+# ------------------------
+# Streaming loaders
+# ------------------------
+def iter_txt(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while block := f.read(_TXT_BLOCK):
+            yield block
+
+
+def iter_pdf(path: str) -> Iterator[str]:
+    if PdfReader is None:
+        raise RuntimeError("PyPDF2 is required to ingest PDF files.")
+    reader = PdfReader(path)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if text.strip():
+            yield text + "\n\n"
+
+
+def iter_pptx(path: str) -> Iterator[str]:
+    if Presentation is None:
+        raise RuntimeError("python-pptx is required to ingest PPTX files.")
+    deck = Presentation(path)
+    for slide in deck.slides:
+        parts = [shape.text_frame.text for shape in slide.shapes if getattr(shape, "has_text_frame", False)]
+        text = "\n".join(p for p in parts if p.strip())
+        if text:
+            yield text + "\n\n"
+
+
+LOADERS = {
+    ".txt": iter_txt,
+    ".md": iter_txt,
+    ".pdf": iter_pdf,
+    ".pptx": iter_pptx,
+}
+
+
+def iter_chunks(segments: Iterable[str], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Split a stream of text segments into ~chunk_size windows with `overlap` chars
+    carried over, preferring paragraph/whitespace boundaries. Only one window of
+    text is buffered at a time.
+    """
+    buf = ""
+    for seg in segments:
+        buf += seg
+        while len(buf) >= chunk_size:
+            cut = buf.rfind("\n\n", chunk_size // 2, chunk_size)
+            if cut == -1:
+                cut = buf.rfind(" ", chunk_size // 2, chunk_size)
+            if cut == -1:
+                cut = chunk_size
+            chunk = buf[:cut].strip()
+            if chunk:
+                yield chunk
+            buf = buf[cut - overlap:] if cut > overlap else buf[cut:]
+    tail = buf.strip()
+    if tail:
+        yield tail
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ------------------------
+# Embedding workers
+# ------------------------
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    if EMBED_BACKEND == "onnx":
+        from app.onnx_embedder import OnnxEmbeddings
+        _worker_model = OnnxEmbeddings(model_name, threads=threads)
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    if EMBED_BACKEND == "onnx":
+        return _worker_model.embed_documents(texts)
+    return _worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False).tolist()
+
+
+class _InlineExecutor:
+    """Executor stand-in that embeds in the calling process (workers <= 1)."""
+
+    def __init__(self, model_name: str):
+        _init_worker(model_name, os.cpu_count() or 1)
+
+    def submit(self, fn, *args) -> Future:
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+
+# ------------------------
+# Pipeline
+# ------------------------
+def _get_collection(collection_name: str, chroma_dir: str):
+    import chromadb
+    client = chromadb.PersistentClient(path=chroma_dir)
+    return client.get_or_create_collection(collection_name)
+
+
+def _load_manifest(chroma_dir: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(chroma_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(chroma_dir: str, manifest: Dict[str, Dict]):
+    os.makedirs(chroma_dir, exist_ok=True)
+    path = os.path.join(chroma_dir, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def expand_paths(patterns: Iterable[str]) -> List[str]:
+    """Expand directories (recursively) and glob patterns into supported files."""
+    paths: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.extend(m for m in matches if os.path.isfile(m) and os.path.splitext(m)[1].lower() in LOADERS)
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+
+def ingest_paths(
+    paths: Iterable[str],
+    collection_name: str = "ai_tutor",
+    chroma_dir: str = CHROMA_DIR,
+    batch_size: int = INGEST_BATCH_SIZE,
+    workers: int = INGEST_WORKERS,
+    force: bool = False,
+    report_every: float = 5.0,
+) -> Dict:
+    """
+    Incrementally ingest files into the Chroma collection.
+    - Files whose content hash matches the manifest are skipped (unless `force`).
+    - Chunks are identified by their content hash; ones already stored are skipped.
+    - New chunks are embedded in batches of `batch_size` across `workers` processes
+      and written with one bulk `add` per batch.
+    Returns counters including the chunks/s throughput.
+    """
+    files = expand_paths(paths)
+    collection = _get_collection(collection_name, chroma_dir)
+    manifest = _load_manifest(chroma_dir)
+
+    if EMBED_BACKEND == "onnx":
+        # Export/quantize once here rather than racing in every worker
+        from app.onnx_embedder import ensure_model
+        ensure_model(EMBEDDING_MODEL)
+
+    if workers > 1:
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(EMBEDDING_MODEL, threads))
+    else:
+        executor = _InlineExecutor(EMBEDDING_MODEL)
+
+    stats = {"files": len(files), "files_skipped": 0, "files_failed": 0,
+             "chunks_seen": 0, "chunks_skipped": 0, "chunks_added": 0, "chunks_removed": 0}
+    in_flight: List[tuple] = []
+    max_in_flight = max(2, workers * 2)
+    seen: Set[str] = set()
+    pending_ids: List[str] = []
+    pending_docs: List[str] = []
+    pending_meta: List[Dict] = []
+    t_start = last_report = time.perf_counter()
+
+    def drain(limit: int):
+        while len(in_flight) > limit:
+            fut, ids, docs, metas = in_flight.pop(0)
+            collection.add(ids=ids, embeddings=fut.result(), documents=docs, metadatas=metas)
+            stats["chunks_added"] += len(ids)
+
+    def flush_pending():
+        # Drop chunks that are already stored, then hand the batch to a worker.
+        nonlocal pending_ids, pending_docs, pending_meta
+        if not pending_ids:
+            return
+        existing = set(collection.get(ids=pending_ids, include=[])["ids"])
+        keep = [i for i, cid in enumerate(pending_ids) if cid not in existing]
+        stats["chunks_skipped"] += len(pending_ids) - len(keep)
+        if keep:
+            ids = [pending_ids[i] for i in keep]
+            docs = [pending_docs[i] for i in keep]
+            metas = [pending_meta[i] for i in keep]
+            in_flight.append((executor.submit(_embed_batch, docs), ids, docs, metas))
+            drain(max_in_flight)
+        pending_ids, pending_docs, pending_meta = [], [], []
+
+    def report(final: bool = False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if final or now - last_report >= report_every:
+            elapsed = now - t_start
+            rate = stats["chunks_added"] / elapsed if elapsed else 0.0
+            logger.info(
+                f"📚 ingest: {stats['chunks_added']} added, {stats['chunks_skipped']} skipped, "
+                f"{stats['files_skipped']} unchanged files, {rate:.1f} chunks/s"
+            )
+            last_report = now
+
+    try:
+        for path in files:
+            digest = file_sha256(path)
+            previous = manifest.get(path)
+            if not force and previous and previous.get("sha256") == digest:
+                stats["files_skipped"] += 1
+                continue
+
+            loader = LOADERS[os.path.splitext(path)[1].lower()]
+            file_ids: List[str] = []
+            try:
+                for text in iter_chunks(loader(path)):
+                    stats["chunks_seen"] += 1
+                    cid = chunk_id(text)
+                    file_ids.append(cid)
+                    if cid in seen:
+                        stats["chunks_skipped"] += 1
+                        continue
+                    seen.add(cid)
+                    pending_ids.append(cid)
+                    pending_docs.append(text)
+                    pending_meta.append({"source": path})
+                    if len(pending_ids) >= batch_size:
+                        flush_pending()
+                    report()
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to ingest {path}: {e}")
+                stats["files_failed"] += 1
+                continue
+
+            # Remove chunks from the previous version of this file that no other file references
+            if previous:
+                still_used = set(file_ids)
+                for other, entry in manifest.items():
+                    if other != path:
+                        still_used.update(entry.get("chunks", []))
+                stale = [cid for cid in previous.get("chunks", []) if cid not in still_used]
+                if stale:
+                    collection.delete(ids=stale)
+                    stats["chunks_removed"] += len(stale)
+
+            manifest[path] = {"sha256": digest, "chunks": file_ids}
+
+        flush_pending()
+        drain(0)
+    finally:
+        executor.shutdown(wait=True)
+
+    _save_manifest(chroma_dir, manifest)
+    if stats["chunks_added"] or stats["chunks_removed"]:
+        bump_collection_version(chroma_dir)
+
+    elapsed = time.perf_counter() - t_start
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["chunks_per_s"] = round(stats["chunks_added"] / elapsed, 2) if elapsed else 0.0
+    report(final=True)
+    return stats
+
 
 def ingest_text_file(path: str, collection_name: str = "ai_tutor"):
-    loader = TextLoader(path, encoding="utf-8")
-    docs = loader.load()
-    splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = splitter.split_documents(docs)
-    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    db = Chroma(collection_name=collection_name, embedding_function=embedding, persist_directory=CHROMA_DIR)
-    db.add_documents(chunks)
-    db.persist()
-    return len(chunks)
+    stats = ingest_paths([path], collection_name=collection_name, workers=1)
+    return stats["chunks_seen"]
+
 
 if __name__ == "__main__":
     import argparse
+    logging.basicConfig(level=logging.INFO)
     p = argparse.ArgumentParser()
-    p.add_argument("--file", required=True)
+    p.add_argument("--file", help="Single file to ingest")
+    p.add_argument("--path", nargs="+", default=[], help="Directories and/or glob patterns to ingest")
+    p.add_argument("--collection", default="ai_tutor")
+    p.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    p.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    p.add_argument("--force", action="store_true", help="Re-process files even if unchanged")
     args = p.parse_args()
-    c = ingest_text_file(args.file)
-    print(f"Ingested {c} chunks")
+    targets = ([args.file] if args.file else []) + args.path
+    if not targets:
+        p.error("Pass --file or --path")
+    s = ingest_paths(targets, collection_name=args.collection, batch_size=args.batch_size,
+                     workers=args.workers, force=args.force)
+    print(f"Ingested {s['chunks_added']} chunks ({s['chunks_skipped']} skipped, "
+          f"{s['files_skipped']} unchanged files) at {s['chunks_per_s']} chunks/s")
@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import List, Dict, AsyncGenerator, Optional, Tuple
+
+from app import metrics
+from app.providers import LLMProvider
+
+logger = logging.getLogger("llm_router")
+
+# ------------------------
+# Config
+# ------------------------
+# Start a second provider when the first hasn't produced a token by its p<N> time-to-first-token
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "150"))
+# Hedge deadline until a provider has LLM_HEDGE_MIN_SAMPLES latency samples
+LLM_HEDGE_DEFAULT_MS = float(os.getenv("LLM_HEDGE_DEFAULT_MS", "1500"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Smoothing for the per-provider latency / error-rate EWMAs that order providers
+LLM_EWMA_ALPHA = float(os.getenv("LLM_EWMA_ALPHA", "0.2"))
+# A provider is only ranked ahead of a preferred one when it scores this many times better
+LLM_ROUTE_MARGIN = float(os.getenv("LLM_ROUTE_MARGIN", "1.5"))
+# Circuit breaker: open after N consecutive failures (or error EWMA above the rate), probe after the cooldown
+LLM_CB_FAILURES = int(os.getenv("LLM_CB_FAILURES", "5"))
+LLM_CB_ERROR_RATE = float(os.getenv("LLM_CB_ERROR_RATE", "0.5"))
+LLM_CB_COOLDOWN_S = float(os.getenv("LLM_CB_COOLDOWN_S", "30"))
+
+_LATENCY_WINDOW = 200
+# Score assumed for a provider without samples, so config order decides at first
+_PRIOR_LATENCY_S = 0.5
+
+
+class ProviderHealth:
+    """
+    Latency and error EWMAs plus a circuit breaker for one provider.
+    Latency is time to first token for streams and total time for completions.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.samples: deque = deque(maxlen=_LATENCY_WINDOW)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.opened = 0
+        self.last_failure = 0.0
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + LLM_EWMA_ALPHA * (value - current)
+
+    def success(self, latency_s: float):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.error_ewma = self._ewma(self.error_ewma, 0.0)
+        self.observe_latency(latency_s)
+        if self.open_until:
+            logger.info(f"✅ {self.name} circuit closed")
+            self.open_until = 0.0
+
+    def observe_latency(self, latency_s: float):
+        # Tail spikes are hedging's job; the routing EWMA tracks typical latency,
+        # so samples are capped at the current hedge deadline (p95)
+        typical = min(latency_s, self.hedge_after()) if len(self.samples) >= LLM_HEDGE_MIN_SAMPLES else latency_s
+        self.samples.append(latency_s)
+        self.latency_ewma = self._ewma(self.latency_ewma, typical)
+
+    def failure(self):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_failure = time.monotonic()
+        self.error_ewma = self._ewma(self.error_ewma, 1.0)
+        tripped = self.consecutive_failures >= LLM_CB_FAILURES or (
+            self.requests >= LLM_CB_FAILURES and self.error_ewma > LLM_CB_ERROR_RATE
+        )
+        if tripped:
+            # Also re-arms after a failed half-open probe
+            self.open_until = time.monotonic() + LLM_CB_COOLDOWN_S
+            self.opened += 1
+            logger.warning(f"⚠️ {self.name} circuit open for {LLM_CB_COOLDOWN_S:.0f}s (error_ewma={self.error_ewma:.2f})")
+
+    @property
+    def available(self) -> bool:
+        """Closed, or open with the cooldown over (half-open: traffic probes it)."""
+        return time.monotonic() >= self.open_until
+
+    def score(self) -> float:
+        latency = self.latency_ewma if self.latency_ewma is not None else _PRIOR_LATENCY_S
+        # Old errors fade (half-life LLM_CB_COOLDOWN_S) so a demoted provider wins traffic back
+        fade = 0.5 ** ((time.monotonic() - self.last_failure) / LLM_CB_COOLDOWN_S)
+        return latency * (1 + 4 * self.error_ewma * fade)
+
+    def hedge_after(self) -> float:
+        """Seconds to wait for this provider before hedging: its p<N> latency."""
+        if len(self.samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_MS / 1000
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(LLM_HEDGE_PERCENTILE / 100 * len(ordered)))
+        return max(LLM_HEDGE_MIN_MS / 1000, ordered[idx])
+
+    def stats(self) -> Dict:
+        if self.open_until == 0.0:
+            circuit = "closed"
+        else:
+            circuit = "half_open" if self.available else "open"
+        return {
+            "circuit": circuit,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "error_ewma": round(self.error_ewma, 3),
+            "hedge_after_ms": round(self.hedge_after() * 1000, 1),
+            "circuit_opened": self.opened,
+        }
+
+
+class _Attempt:
+    """One provider call in flight: a task producing the first delta (stream) or the answer."""
+
+    def __init__(self, provider: LLMProvider, messages: List[Dict], stream: bool):
+        self.provider = provider
+        self.started = time.perf_counter()
+        self.agen = provider.stream(messages) if stream else None
+        self.task = asyncio.ensure_future(self.agen.__anext__() if stream else provider.complete(messages))
+
+    async def cancel(self):
+        self.task.cancel()
+        # Swallow only the loser's own outcome; cancelling the caller still propagates
+        await asyncio.gather(self.task, return_exceptions=True)
+        if self.agen is not None:
+            await self.agen.aclose()
+
+
+class LLMRouter:
+    """
+    Routes completions/streams over several providers (same interface as LLMProvider).
+    - Providers are tried in order of their latency/error score; open circuits are skipped
+    - If the first choice has not answered (first token, for streams) by its p95
+      latency, the next provider is started as a hedge; whichever answers first
+      wins and the other request is cancelled
+    - An error before the first token fails over to the next provider; once tokens
+      have been sent the stream is committed to its provider
+    """
+
+    def __init__(self, providers: List[LLMProvider], hedge: bool = LLM_HEDGE_ENABLED):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge = hedge
+        self.health: Dict[str, ProviderHealth] = {p.name: ProviderHealth(p.name) for p in providers}
+        self.name = providers[0].name
+        self.model_name = providers[0].model_name
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def _ordered(self) -> List[LLMProvider]:
+        available = [p for p in self.providers if self.health[p.name].available]
+        # If every circuit is open, trying them beats failing outright
+        candidates = available or list(self.providers)
+        # Config order is a head start (LLM_ROUTE_MARGIN per position) so routing doesn't flap
+        return sorted(
+            candidates,
+            key=lambda p: self.health[p.name].score() * LLM_ROUTE_MARGIN ** self.providers.index(p),
+        )
+
+    async def _race(self, messages: List[Dict], stream: bool) -> Tuple[_Attempt, object]:
+        """Run attempts (hedging / failing over) until one yields a result; cancel the rest."""
+        pending_providers = self._ordered()
+        running: Dict[asyncio.Future, _Attempt] = {}
+        hedged: List[_Attempt] = []
+        state = {"hedge_at": None}
+        last_error: Optional[BaseException] = None
+        won = False
+
+        def launch() -> _Attempt:
+            attempt = _Attempt(pending_providers.pop(0), messages, stream)
+            running[attempt.task] = attempt
+            state["hedge_at"] = None
+            if self.hedge and pending_providers:
+                state["hedge_at"] = time.perf_counter() + self.health[attempt.provider.name].hedge_after()
+            return attempt
+
+        launch()
+        try:
+            while running:
+                hedge_at = state["hedge_at"]
+                timeout = max(0.0, hedge_at - time.perf_counter()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(running.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Deadline passed with nothing back: hedge
+                    slow = [a.provider.name for a in running.values()]
+                    attempt = launch()
+                    hedged.append(attempt)
+                    self.hedges += 1
+                    metrics.llm_hedge("fired")
+                    logger.info(f"⏱️ hedging {', '.join(slow)} with {attempt.provider.name}")
+                    continue
+
+                for task in done:
+                    attempt = running.pop(task)
+                    health = self.health[attempt.provider.name]
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        # StopAsyncIteration: an empty stream, a valid (if odd) answer
+                        health.success(time.perf_counter() - attempt.started)
+                        if attempt in hedged:
+                            self.hedge_wins += 1
+                            metrics.llm_hedge("won")
+                        won = True
+                        return attempt, task.result() if error is None else None
+                    health.failure()
+                    last_error = error
+                    logger.warning(f"⚠️ {attempt.provider.name} failed: {error}")
+
+                if not running and pending_providers:
+                    self.failovers += 1
+                    launch()
+            raise last_error or RuntimeError("No LLM provider available")
+        finally:
+            for attempt in running.values():
+                if won:
+                    # Losers were slower than the winner: that bounds their latency from below
+                    self.health[attempt.provider.name].observe_latency(time.perf_counter() - attempt.started)
+                # All at once, so a caller cancelled mid-cleanup leaves none running
+                attempt.task.cancel()
+            for attempt in running.values():
+                await attempt.cancel()
+
+    async def complete(self, messages: List[Dict]) -> str:
+        _, answer = await self._race(messages, stream=False)
+        return answer
+
+    async def stream(self, messages: List[Dict]) -> AsyncGenerator[str, None]:
+        attempt, first_delta = await self._race(messages, stream=True)
+        if first_delta is None:
+            return
+        try:
+            yield first_delta
+            async for delta in attempt.agen:
+                yield delta
+        except Exception:
+            self.health[attempt.provider.name].failure()
+            raise
+        finally:
+            await attempt.agen.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "hedging": self.hedge,
+            "order": [p.name for p in self._ordered()],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "providers": {p.name: {"model": p.model_name, **self.health[p.name].stats()} for p in self.providers},
+        }
@@ -1,22 +1,31 @@
 import os
-import tempfile
-import pathlib
+import json
+import time
+import asyncio
+from contextlib import aclosing
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Dict, Optional
 
-from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 
-from app.models import QueryRequest, ChatRequest
-from app.sessions import SessionStore
+from app.models import QueryRequest, BatchQueryRequest, ChatRequest
+from app.sessions import create_session_store
 from app.utils import pick_emotion
-from app.rag import RagService
-from app.stt import transcribe_audio_file
-from app.tts import synthesize_tts
-from app import tts_ws
+from app.rag import RagService, RAG_BATCH_MAX_QUERIES, RAG_BATCH_CONCURRENCY
+from app.providers import close_http_client
+from app.prompt import HISTORY_MAX_TURNS, SUMMARY_ENABLED, SUMMARY_MIN_FOLD
+from app import stt
+from app import tts_cache
+from app import tts_ws, stt_ws
+from app.tts_registry import registry as tts_registry, load as load_tts
+from app.audio import negotiate_format, media_type, iter_audio, iter_pcm, wav_stream_header, STREAMABLE_FORMATS
+from app import metrics, admission, model_client
+from app.ws_framing import Framing, TokenStream
+from app.components import components, ComponentNotReady, STARTUP_WARMUP, NOT_READY_RETRY_AFTER
 
 # ------------------------
 # Setup
@@ -39,11 +48,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.TimingMiddleware)
+
 # Attach routers
 app.include_router(tts_ws.router)
+app.include_router(stt_ws.router)
 
-sessions = SessionStore()
+sessions = create_session_store()
 rag: Optional[RagService] = None
+_summarizing: set = set()
+_background_tasks: set = set()  # strong refs: the loop only keeps weak ones
+_warmup_task: Optional[asyncio.Task] = None
+
+
+# ------------------------
+# Heavy components (loaded in the background, see app/components.py)
+# ------------------------
+def _load_embeddings():
+    if not rag:
+        raise RuntimeError("RAG not configured")
+    return rag.load_embedding()
+
+
+def _load_vector_store():
+    return rag.load_store()
+
+
+components.register("embeddings", _load_embeddings)
+components.register("vector_store", _load_vector_store, depends_on=["embeddings"])
+components.register("stt", stt.load)
+components.register("tts", load_tts)
+
+# Retrieval degrades to no-context answers if these failed, but not while loading
+RAG_COMPONENTS = ("embeddings", "vector_store")
+
+
+def _not_ready(*names: str, allow_failed: bool = False) -> Optional[JSONResponse]:
+    """503 + Retry-After if a component is still loading (or failed), else None."""
+    try:
+        components.check(*names, allow_failed=allow_failed)
+    except ComponentNotReady as e:
+        return JSONResponse(
+            {"error": str(e), "component": e.name, "state": e.state},
+            status_code=503,
+            headers={"Retry-After": str(NOT_READY_RETRY_AFTER)},
+        )
+    return None
+
+
+@app.exception_handler(admission.Overloaded)
+async def overloaded_handler(request: Request, exc: admission.Overloaded):
+    """A saturated stage turns REST callers away fast instead of queueing them unboundedly."""
+    return JSONResponse(
+        {"error": str(exc), "stage": exc.stage, "reason": exc.reason},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def _session_context(session_id: str):
+    """Recent history not yet folded into the session's rolling summary, plus that summary."""
+    history, summary, covered = await sessions.aget_context(session_id)
+    return history[covered:], summary
+
+
+async def _fold_history(session_id: str):
+    """Fold turns that fell out of the history window into the rolling summary."""
+    if not rag or not SUMMARY_ENABLED or session_id in _summarizing:
+        return
+    history, offset, summary, covered = await sessions.aget_snapshot(session_id)
+    start = max(0, covered - offset)
+    fold_to = len(history) - HISTORY_MAX_TURNS
+    if fold_to - start < SUMMARY_MIN_FOLD:
+        return
+    _summarizing.add(session_id)
+    try:
+        new_summary = await rag.summarize(summary, history[start:fold_to])
+        if new_summary:
+            # Absolute position: turns appended (and evicted) during the LLM call don't shift it
+            await sessions.aset_summary_at(session_id, new_summary, offset + fold_to)
+    finally:
+        _summarizing.discard(session_id)
+
+
+def _task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"❌ Background task {task.get_name()} failed: {task.exception()!r}")
+
+
+def _spawn(coro) -> asyncio.Task:
+    """Fire-and-forget task that is neither garbage-collected mid-flight nor fails silently."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
+
+def _drop(task: asyncio.Task):
+    """Cancel a task whose result is no longer wanted; an error it already raised is consumed."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
 
 # ------------------------
@@ -51,14 +156,33 @@ rag: Optional[RagService] = None
 # ------------------------
 @app.on_event("startup")
 async def startup_event():
-    global rag
+    global rag, _warmup_task
     try:
-        rag = RagService()
+        # Providers only; embeddings and the vector store load as components
+        rag = RagService(load_models=False)
         logger.info("✅ Groq RAG Service initialized successfully.")
     except Exception as e:
         logger.warning("⚠️ GROQ_API_KEY not set, RAG service unavailable.")
         rag = None
 
+    # Start listening right away; models (embeddings, Chroma, Whisper, TTS) warm
+    # up in the background and endpoints answer 503 until theirs is ready.
+    if STARTUP_WARMUP:
+        _warmup_task = asyncio.create_task(components.warmup())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _warmup_task:
+        _warmup_task.cancel()
+    if rag:
+        rag.close()
+    stt.shutdown()
+    model_client.close_all()
+    if hasattr(sessions, "close"):
+        sessions.close()
+    await close_http_client()
+
 
 # ------------------------
 # Health Check
@@ -68,9 +192,90 @@ async def health_check() -> dict:
     return {
         "status": "ok",
         "rag_available": rag is not None,
+        **components.status(),
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus exposition of per-stage latency, LLM speed and audio real-time factors."""
+    if not metrics.METRICS_ENABLED:
+        return JSONResponse({"error": "Metrics disabled (install prometheus_client)"}, status_code=501)
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/healthz/live")
+async def liveness() -> dict:
+    """The event loop is serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/healthz/ready")
+async def readiness():
+    """200 once every READY_REQUIRED component has loaded, 503 before that."""
+    status = components.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/tts/models")
+async def tts_models() -> dict:
+    return tts_registry.stats()
+
+
+@app.get("/stt/stats")
+async def stt_stats() -> dict:
+    """Whisper pool queue depth, batching and real-time factor per request class."""
+    return stt.stats()
+
+
+@app.get("/llm/stats")
+async def llm_stats() -> dict:
+    """Provider order, latency/error EWMAs, circuit states and hedging counters."""
+    if not rag:
+        return {"providers": {}}
+    return rag.llm.stats()
+
+
+@app.get("/embed/stats")
+async def embed_stats() -> dict:
+    """Query-embedding micro-batching: batch sizes, queue wait and compute time."""
+    if not rag:
+        return {"enabled": False}
+    return rag.embedder_stats()
+
+
+@app.get("/models/stats")
+async def models_stats() -> dict:
+    """Which models run in a model server, this worker's calls to it and the server's own stats."""
+    servers = {}
+    for path, client_stats in model_client.stats().items():
+        try:
+            server_stats = await asyncio.to_thread(model_client.connect(path).server_stats)
+        except model_client.ModelServerError as e:
+            server_stats = {"error": str(e)}
+        servers[path] = {"client": client_stats, "server": server_stats}
+    return {"remote": {m: model_client.remote_socket(m) for m in model_client.MODELS}, "servers": servers}
+
+
+@app.get("/admission/stats")
+async def admission_stats() -> dict:
+    """Per-stage concurrency, queue length, wait time and rejections (autoscaling inputs)."""
+    return admission.stats()
+
+
+@app.get("/sessions/stats")
+async def sessions_stats() -> dict:
+    return await sessions.astats()
+
+
+@app.get("/cache/stats")
+async def cache_stats() -> dict:
+    stats = rag.cache_stats() if rag else {"answer": {"enabled": False}}
+    stats["tts"] = tts_cache.stats()
+    return stats
+
+
 # ------------------------
 # REST Endpoints
 # ------------------------
@@ -78,68 +283,269 @@ async def health_check() -> dict:
 async def query_endpoint(req: QueryRequest) -> dict:
     if not rag:
         return JSONResponse({"error": "RAG not configured. Set GROQ_API_KEY."}, status_code=500)
+    not_ready = _not_ready(*RAG_COMPONENTS, allow_failed=True)
+    if not_ready:
+        return not_ready
 
-    text = rag.answer_single(req.query)
+    stats: dict = {}
+    text = await rag.answer_single(req.query, stats=stats)
     emotion = pick_emotion(text)
-    return {"text": text, "emotion": emotion}
+    return {"text": text, "emotion": emotion, "prompt_tokens": stats.get("prompt_tokens")}
+
+
+async def _resume(first, rest):
+    """Re-attach the already awaited first item of a streamed body (see /tts)."""
+    async with aclosing(rest):
+        yield first
+        async for chunk in rest:
+            yield chunk
+
+
+async def _ndjson_answers(queries, concurrency: int, retrieved: dict):
+    t0 = retrieved["started"]
+    errors = 0
+    async with aclosing(rag.answer_batch(queries, concurrency=concurrency, retrieved=retrieved)) as results:
+        async for result in results:
+            if "text" in result:
+                result["emotion"] = pick_emotion(result["text"])
+            else:
+                errors += 1
+            yield json.dumps(result) + "\n"
+    yield json.dumps({"done": True, "count": len(queries), "errors": errors,
+                      "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}) + "\n"
+
+
+@app.post("/query/batch")
+async def query_batch_endpoint(req: BatchQueryRequest):
+    """
+    Answer a question bank: {"queries": [...], "concurrency": 8}. Streams NDJSON,
+    one {"index", "text", "emotion", ...} or {"index", "error"} line per question
+    as each completes (any order), then a {"done": true, ...} summary line.
+    """
+    if not rag:
+        return JSONResponse({"error": "RAG not configured. Set GROQ_API_KEY."}, status_code=500)
+    if not req.queries:
+        return JSONResponse({"error": "No queries"}, status_code=400)
+    if len(req.queries) > RAG_BATCH_MAX_QUERIES:
+        return JSONResponse({"error": f"At most {RAG_BATCH_MAX_QUERIES} queries per batch"}, status_code=413)
+    not_ready = _not_ready(*RAG_COMPONENTS, allow_failed=True)
+    if not_ready:
+        return not_ready
+
+    concurrency = min(req.concurrency or RAG_BATCH_CONCURRENCY, RAG_BATCH_CONCURRENCY)
+    logger.info(f"📚 Batch query: {len(req.queries)} questions, concurrency {concurrency}")
+    # Embedding + retrieval run before the response starts, so a saturated stage is still a 429;
+    # answers then stream as they complete
+    retrieved = await rag.retrieve_batch(req.queries)
+    return StreamingResponse(_ndjson_answers(req.queries, concurrency, retrieved), media_type="application/x-ndjson")
 
 
 @app.post("/chat")
 async def chat_endpoint(req: ChatRequest) -> dict:
     if not rag:
         return JSONResponse({"error": "RAG not configured. Set GROQ_API_KEY."}, status_code=500)
+    not_ready = _not_ready(*RAG_COMPONENTS, allow_failed=True)
+    if not_ready:
+        return not_ready
 
-    history = sessions.get_history(req.session_id)
-    answer = rag.answer_with_history(req.query, history)
+    history, summary = await _session_context(req.session_id)
+    stats: dict = {}
+    answer = await rag.answer_with_history(req.query, history, summary=summary, stats=stats)
 
-    sessions.append(req.session_id, {"role": "user", "text": req.query})
-    sessions.append(req.session_id, {"role": "assistant", "text": answer})
+    await sessions.aappend_many(req.session_id, [
+        {"role": "user", "text": req.query},
+        {"role": "assistant", "text": answer},
+    ])
+    _spawn(_fold_history(req.session_id))
 
     emotion = pick_emotion(answer)
-    return {"text": answer, "emotion": emotion}
+    return {"text": answer, "emotion": emotion, "prompt_tokens": stats.get("prompt_tokens")}
 
 
 @app.post("/stt")
 async def stt_endpoint(file: UploadFile = File(...)) -> dict:
+    not_ready = _not_ready("stt")
+    if not_ready:
+        return not_ready
     try:
         contents = await file.read()
-        suffix = pathlib.Path(file.filename).suffix or ".wav"
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(contents)
-            tmp_path = tmp.name
-
         logger.info(f"🎤 STT request: {file.filename}")
-        transcript = transcribe_audio_file(tmp_path)
+        # Decoded from memory, transcribed on the Whisper pool; see /ws/stt for streaming input
+        transcript = await stt.atranscribe_bytes(contents)
         return {"text": transcript}
 
+    except admission.Overloaded:
+        raise
     except Exception as e:
         logger.exception("STT error")
         return JSONResponse({"error": str(e)}, status_code=500)
-    finally:
-        if 'tmp_path' in locals() and pathlib.Path(tmp_path).exists():
-            os.remove(tmp_path)
+
+
+_AUDIO_EXTENSIONS = {"wav": "wav", "pcm": "pcm", "opus": "ogg", "mp3": "mp3"}
+
+
+async def _speech_stream(text: str, voice: Optional[str], fmt: str, info: Dict):
+    """
+    Streamed /tts body: each sentence goes out as soon as it and those before it
+    are rendered (later ones render meanwhile). Holds the tts admission slot
+    throughout; the first chunk is only yielded once the first sentence exists,
+    and by then info["sample_rate"] holds the rate it was rendered at.
+    """
+    async with admission.stage("tts"):
+        async with aclosing(tts_cache.aiter_synthesized(text, voice)) as parts:
+            first = True
+            async for pcm, sample_rate in parts:
+                info.setdefault("sample_rate", sample_rate)
+                if first and fmt == "wav":
+                    yield wav_stream_header(sample_rate)
+                first = False
+                for chunk in iter_pcm(pcm):
+                    yield bytes(chunk)
 
 
 @app.post("/tts")
-async def tts_endpoint(payload: dict):
+async def tts_endpoint(payload: dict, request: Request):
+    """
+    Synthesize {"text", "voice", "format"} and stream the audio straight from memory.
+    `format` (wav | pcm | opus | mp3) may also be negotiated via the Accept header.
+    With "stream": true (wav | pcm) audio starts after the first sentence instead
+    of the whole text; the WAV header then carries no length.
+    """
     text = payload.get("text", "").strip()
     if not text:
         return JSONResponse({"error": "Empty text payload"}, status_code=400)
 
+    try:
+        fmt = negotiate_format(payload.get("format"), request.headers.get("accept"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=406)
+
+    not_ready = _not_ready("tts")
+    if not_ready:
+        return not_ready
+
+    headers = {"Content-Disposition": f"attachment; filename=response.{_AUDIO_EXTENSIONS[fmt]}"}
+    if payload.get("stream") and fmt in STREAMABLE_FORMATS:
+        logger.info("🗣️ TTS request (streamed)")
+        info: Dict = {}
+        body = _speech_stream(text, payload.get("voice"), fmt, info)
+        try:
+            # Admission (429) and a failing first sentence (500) surface before the response starts
+            first = await body.__anext__()
+        except admission.Overloaded:
+            raise
+        except Exception as e:
+            logger.exception("TTS error")
+            return JSONResponse({"error": str(e)}, status_code=500)
+        # From the render, not the engine: pyttsx3 only knows its rate after one
+        headers["X-Sample-Rate"] = str(info["sample_rate"])
+        return StreamingResponse(_resume(first, body), media_type=media_type(fmt), headers=headers)
+
     try:
         logger.info("🗣️ TTS request")
-        audio_path = synthesize_tts(text)
+        async with admission.stage("tts"):
+            pcm, sample_rate = await asyncio.to_thread(tts_cache.synthesize_cached, text, payload.get("voice"))
+    except admission.Overloaded:
+        raise
     except Exception as e:
         logger.exception("TTS error")
         return JSONResponse({"error": str(e)}, status_code=500)
 
-    def iterfile():
-        with open(audio_path, "rb") as f:
-            yield from f
+    headers["X-Sample-Rate"] = str(sample_rate)
+    return StreamingResponse(iter_audio(pcm, sample_rate, fmt), media_type=media_type(fmt), headers=headers)
+
 
-    headers = {"Content-Disposition": "attachment; filename=response.wav"}
-    return StreamingResponse(iterfile(), media_type="audio/wav", headers=headers)
+# ------------------------
+# WebSocket answer turn (shared by /ws/chat and /ws/voice)
+# ------------------------
+async def _answer_turn(
+    framing: Framing,
+    send_lock: asyncio.Lock,
+    session_id: str,
+    user_text: str,
+    t_start: float,
+    audio_format: Optional[str] = None,
+    voice: Optional[str] = None,
+    chunks: Optional[list] = None,
+    timeline: Optional[dict] = None,
+):
+    """
+    Stream one answer on the socket: "start", "token"* (coalesced per `framing`),
+    sentence-pipelined audio when `audio_format` is set, then "final" (and
+    "audio_end"). `timeline` collects
+    ms-since-`t_start` marks and is sent along with the stage timings.
+    Raises admission.Overloaded (and stores nothing) when retrieval or the LLM is saturated.
+    """
+    async def send(message: dict):
+        async with send_lock:
+            await framing.send(message)
+
+    def mark(name: str):
+        if timeline is not None:
+            timeline[name] = round((time.perf_counter() - t_start) * 1000, 1)
+
+    history, summary = await _session_context(session_id)
+    stats: dict = {}
+    timings = metrics.start_timings()
+    await send({"type": "start"})
+
+    speech = None
+    if audio_format:
+        speech = tts_ws.SpeechPipeline(
+            framing.websocket, send_lock, voice=voice, started_at=t_start, audio_format=audio_format, framing=framing
+        )
+
+    tokens = TokenStream(framing, send_lock)
+    try:
+        stream = rag.stream_answer_with_history(user_text, history, summary=summary, stats=stats, chunks=chunks)
+        async with aclosing(stream):
+            async for chunk in stream:
+                if not tokens.parts:
+                    mark("first_token")
+                await tokens.feed(chunk)
+                if speech:
+                    speech.feed(chunk)
+        await tokens.flush()
+        metrics.observe("ws_send", tokens.send_s)
+        full_response = tokens.text()
+
+        await sessions.aappend_many(session_id, [
+            {"role": "user", "text": user_text},
+            {"role": "assistant", "text": full_response},
+        ])
+        _spawn(_fold_history(session_id))
+
+        mark("final")
+        final = {
+            "type": "final",
+            "text": full_response,
+            "emotion": pick_emotion(full_response),
+            "prompt_tokens": stats.get("prompt_tokens"),
+            "timings_ms": dict(timings, total=round((time.perf_counter() - t_start) * 1000, 1)),
+        }
+        if timeline is not None:
+            final["timeline_ms"] = dict(timeline)
+        await send(final)
+
+        if speech:
+            await speech.finish()
+            if speech.first_audio_ms is not None and timeline is not None:
+                timeline["first_audio"] = speech.first_audio_ms
+            mark("audio_end")
+            audio_end = {
+                "type": "audio_end",
+                "sentences": speech.sentences,
+                "time_to_first_audio_ms": speech.first_audio_ms,
+                "timings_ms": dict(timings, total=round((time.perf_counter() - t_start) * 1000, 1)),
+            }
+            if timeline is not None:
+                audio_end["timeline_ms"] = dict(timeline)
+            await send(audio_end)
+            speech = None
+    finally:
+        tokens.cancel()
+        if speech:
+            speech.cancel()
 
 
 # ------------------------
@@ -147,43 +553,301 @@ async def tts_endpoint(payload: dict):
 # ------------------------
 @app.websocket("/ws/chat")
 async def ws_chat(websocket: WebSocket):
+    """
+    Streaming chat.
+    - Client sends JSON: {"query": "...", "tts": false, "voice": null, "audio_format": "pcm"}
+    - Server sends "start", "token"* and "final" messages.
+    - With "tts": true (or ?tts=1 on the URL) each completed sentence is synthesized
+      while the answer is still generating; its audio arrives as an {"type": "audio"}
+      header followed by binary frames (raw PCM by default, or opus/mp3/wav per
+      "audio_format"), interleaved with tokens, and the turn
+      ends with {"type": "audio_end"}.
+    - "final" and "audio_end" carry "timings_ms" (retrieval, llm_first_token, llm,
+      tts, ws_send, ...) so clients can attribute their own latency.
+    - ?framing=coalesced batches deltas into one "token" message per ~coalesce_ms
+      (default 25); ?framing=msgpack also sends every server message as a binary
+      msgpack map, audio as {"type": "audio_frame", "data"}. Requests stay JSON text.
+    """
     await websocket.accept()
+    try:
+        framing = Framing.negotiate(websocket)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1003)  # unsupported data
+        return
+    # Live conversations go ahead of bulk REST calls at every stage
+    admission.set_priority(admission.INTERACTIVE)
     session_id = websocket.query_params.get("session_id") or "default"
+    tts_default = websocket.query_params.get("tts") in ("1", "true")
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict):
+        async with send_lock:
+            await framing.send(message)
 
     try:
         while True:
-            payload = await websocket.receive_json()
-            user_text = (payload or {}).get("query", "").strip()
+            payload = await websocket.receive_json() or {}
+            user_text = payload.get("query", "").strip()
+            t_start = time.perf_counter()
 
             if not rag:
-                await websocket.send_json({"type": "error", "message": "RAG not configured."})
+                await send({"type": "error", "message": "RAG not configured."})
                 continue
 
             if not user_text:
-                await websocket.send_json({"type": "error", "message": "Empty query"})
+                await send({"type": "error", "message": "Empty query"})
                 continue
 
-            logger.info(f"💬 WS chat request (session={session_id})")
-
-            history = sessions.get_history(session_id)
-            await websocket.send_json({"type": "start"})
-
-            full_response = ""
-            async for chunk in rag.stream_answer_with_history(user_text, history):
-                full_response += chunk
-                await websocket.send_json({"type": "token", "text": chunk})
+            wants_tts = payload.get("tts", tts_default)
+            try:
+                components.check(*RAG_COMPONENTS, allow_failed=True)
+                if wants_tts:
+                    components.check("tts")
+            except ComponentNotReady as e:
+                await send({"type": "error", "message": str(e), "retry_after": NOT_READY_RETRY_AFTER})
+                continue
 
-            sessions.append(session_id, {"role": "user", "text": user_text})
-            sessions.append(session_id, {"role": "assistant", "text": full_response})
+            audio_format = None
+            if wants_tts:
+                try:
+                    audio_format = negotiate_format(payload.get("audio_format") or "pcm")
+                except ValueError as e:
+                    await send({"type": "error", "message": str(e)})
+                    continue
 
-            emotion = pick_emotion(full_response)
-            await websocket.send_json({"type": "final", "text": full_response, "emotion": emotion})
+            logger.info(f"💬 WS chat request (session={session_id})")
+            try:
+                await _answer_turn(
+                    framing, send_lock, session_id, user_text, t_start,
+                    audio_format=audio_format, voice=payload.get("voice"),
+                )
+            except admission.Overloaded as e:
+                await send({"type": "error", "message": str(e), "busy": True, "retry_after": e.retry_after})
 
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket disconnected: session {session_id}")
     except Exception as e:
         logger.exception("WebSocket error")
+        await send({"type": "error", "message": str(e)})
+
+
+# ------------------------
+# WebSocket Endpoint (Voice)
+# ------------------------
+def _normalize_transcript(text: str) -> str:
+    return " ".join("".join(c for c in text.lower() if c.isalnum() or c.isspace()).split())
+
+
+@app.websocket("/ws/voice")
+async def ws_voice(websocket: WebSocket):
+    """
+    One socket per voice conversation: microphone audio in, transcript, answer
+    tokens and speech out.
+    - Client may first send {"type": "start", "format": "pcm_s16le" | "opus",
+      "sample_rate": 16000, "language": "en", "tts": true, "voice": null,
+      "audio_format": "pcm"}, then binary audio frames; {"type": "stop"} ends the
+      current utterance (VAD also ends it after a pause)
+    - Server sends "speech_start", "partial" transcripts, "speech_end", then per
+      utterance "transcript" followed by the /ws/chat turn messages ("start",
+      "token"*, "audio" + binary frames, "final", "audio_end")
+    - Stages overlap: retrieval starts on the latest partial transcript while the
+      user is still talking and is reused when the final transcript matches; TTS
+      runs per sentence while the answer streams
+    - "final"/"audio_end" carry "timeline_ms": ms from end of speech to transcript,
+      retrieval, first_token, first_audio, final and audio_end
+    - ?framing= works as on /ws/chat
+    """
+    await websocket.accept()
+    try:
+        framing = Framing.negotiate(websocket)
+    except ValueError as e:
         await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1003)
+        return
+    admission.set_priority(admission.INTERACTIVE)
+    session_id = websocket.query_params.get("session_id") or "default"
+    wants_tts = websocket.query_params.get("tts", "1") in ("1", "true")
+    try:
+        components.check("stt")
+        components.check(*RAG_COMPONENTS, allow_failed=True)
+        if wants_tts:
+            components.check("tts")
+        if not rag:
+            raise RuntimeError("RAG not configured.")
+    except (ComponentNotReady, RuntimeError) as e:
+        await framing.send({"type": "error", "message": str(e), "retry_after": NOT_READY_RETRY_AFTER})
+        await websocket.close(code=1013)  # try again later
+        return
+
+    send_lock = asyncio.Lock()
+    decoder = stt_ws.PcmDecoder(stt.WHISPER_SAMPLE_RATE)
+    segmenter = stt_ws.SpeechSegmenter()
+    options = {"language": "en", "voice": None, "audio_format": "pcm" if wants_tts else None}
+    segment_id = 0
+    last_partial = 0.0
+    partial_task: Optional[asyncio.Task] = None
+    partials: set = set()  # partial transcriptions still running, incl. ones of ended segments
+    # Speculative retrieval for the open segment: (segment, normalized partial text, task)
+    speculation: Optional[tuple] = None
+    utterances: asyncio.Queue = asyncio.Queue()
+
+    async def send(message: dict):
+        async with send_lock:
+            await framing.send(message)
+
+    async def partial(seg_id: int, audio):
+        nonlocal speculation
+        try:
+            text = await stt.atranscribe_array(audio, options["language"], "partial")
+        except Exception as e:
+            logger.warning(f"Partial transcription failed: {e}")
+            return
+        if not text or seg_id != segment_id:
+            return
+        await send({"type": "partial", "segment": seg_id, "text": text})
+        normalized = _normalize_transcript(text)
+        if not speculation or speculation[:2] != (seg_id, normalized):
+            if speculation:
+                _drop(speculation[2])
+            speculation = (seg_id, normalized, asyncio.create_task(rag.aretrieve(text)))
+
+    async def answer_utterances():
+        previous = None
+        while (item := await utterances.get()) is not None:
+            seg_id, audio, ended_at, guess = item
+            timeline: dict = {}
+            try:
+                text = await stt.atranscribe_array(audio, options["language"], "final", previous)
+            except admission.Overloaded as e:
+                await send({"type": "error", "segment": seg_id, "message": str(e), "busy": True,
+                            "retry_after": e.retry_after})
+                continue
+            except Exception as e:
+                logger.exception("Voice STT error")
+                await send({"type": "error", "segment": seg_id, "message": f"STT failed: {e}"})
+                continue
+            timeline["transcript"] = round((time.perf_counter() - ended_at) * 1000, 1)
+            await send({"type": "transcript", "segment": seg_id, "text": text, "latency_ms": timeline["transcript"]})
+            if not text.strip():
+                continue
+            previous = text
+
+            try:
+                chunks = None
+                if guess and guess[1] == _normalize_transcript(text):
+                    try:
+                        chunks = await guess[2]
+                        timeline["speculative_retrieval"] = True
+                    except Exception:
+                        chunks = None
+                if chunks is None:
+                    if guess:
+                        _drop(guess[2])
+                    timeline["speculative_retrieval"] = False
+                    chunks = await rag.aretrieve(text)
+                timeline["retrieval"] = round((time.perf_counter() - ended_at) * 1000, 1)
+
+                logger.info(f"🎙️ Voice turn (session={session_id})")
+                await _answer_turn(
+                    framing, send_lock, session_id, text, ended_at,
+                    audio_format=options["audio_format"], voice=options["voice"],
+                    chunks=chunks, timeline=timeline,
+                )
+            except admission.Overloaded as e:
+                await send({"type": "error", "segment": seg_id, "message": str(e), "busy": True,
+                            "retry_after": e.retry_after})
+
+    async def end_utterance(seg):
+        nonlocal segment_id, partial_task, speculation
+        audio, _, _ = seg
+        await send({"type": "speech_end", "segment": segment_id})
+        guess = speculation if speculation and speculation[0] == segment_id else None
+        if speculation and not guess:
+            _drop(speculation[2])
+        utterances.put_nowait((segment_id, audio, time.perf_counter(), guess))
+        segment_id += 1
+        partial_task = None
+        speculation = None
+
+    worker = asyncio.create_task(answer_utterances())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("text") is not None:
+                try:
+                    ctrl = json.loads(message["text"])
+                except ValueError:
+                    await send({"type": "error", "message": "Invalid JSON"})
+                    continue
+                if ctrl.get("type") == "start":
+                    try:
+                        fmt = ctrl.get("format", "pcm_s16le")
+                        default_rate = 48000 if fmt == "opus" else stt.WHISPER_SAMPLE_RATE
+                        decoder = stt_ws.make_decoder(fmt, int(ctrl.get("sample_rate") or default_rate))
+                        if ctrl.get("tts", wants_tts):
+                            components.check("tts")
+                            options["audio_format"] = negotiate_format(ctrl.get("audio_format") or "pcm")
+                        else:
+                            options["audio_format"] = None
+                    except (ValueError, ComponentNotReady) as e:
+                        await send({"type": "error", "message": str(e)})
+                        continue
+                    options["language"] = ctrl.get("language", options["language"])
+                    options["voice"] = ctrl.get("voice")
+                    await send({"type": "ready", "sample_rate": stt.WHISPER_SAMPLE_RATE})
+                elif ctrl.get("type") == "stop":
+                    tail = segmenter.flush()
+                    if tail is not None:
+                        await end_utterance(tail)
+                continue
+
+            data = message.get("bytes")
+            if not data:
+                continue
+            try:
+                samples = decoder.decode(data)
+            except Exception as e:
+                await send({"type": "error", "message": f"Could not decode audio: {e}"})
+                continue
+
+            for event, seg in segmenter.feed(samples):
+                if event == "start":
+                    await send({"type": "speech_start", "segment": segment_id})
+                else:
+                    await end_utterance(seg)
+
+            now = time.perf_counter()
+            if (
+                stt_ws.PARTIAL_INTERVAL_MS
+                and segmenter.active
+                and (partial_task is None or partial_task.done())
+                and (now - last_partial) * 1000 >= stt_ws.PARTIAL_INTERVAL_MS
+            ):
+                last_partial = now
+                partial_task = asyncio.create_task(partial(segment_id, segmenter.current()))
+                partials.add(partial_task)
+                partial_task.add_done_callback(partials.discard)
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        logger.info(f"🔌 Voice socket closed: session {session_id}")
+        # No more Whisper, retrieval, LLM or TTS work (or sends) for a closed socket:
+        # the turn in flight and the utterances still queued are abandoned
+        pending = [worker, *partials]
+        if speculation:
+            pending.append(speculation[2])
+        while not utterances.empty():
+            guess = utterances.get_nowait()[3]
+            if guess:
+                pending.append(guess[2])
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
 
 # ------------------------
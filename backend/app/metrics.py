@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("metrics")
+
+try:
+    from prometheus_client import (
+        Counter,
+        Gauge,
+        Histogram,
+        CollectorRegistry,
+        generate_latest,
+        CONTENT_TYPE_LATEST,
+    )
+    from prometheus_client import multiprocess
+except ImportError:
+    Counter = Gauge = Histogram = None
+
+# ------------------------
+# Config
+# ------------------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1" and Histogram is not None
+# Set by gunicorn/uvicorn multi-worker deployments so /metrics aggregates all workers
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+_RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+_RATE_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+
+if METRICS_ENABLED:
+    STAGE_SECONDS = Histogram(
+        "tutor_stage_seconds",
+        "Latency of one pipeline stage (stt, embed, retrieval, llm, llm_first_token, tts, ws_send)",
+        ["stage"],
+        buckets=_LATENCY_BUCKETS,
+    )
+    LLM_TOKENS_PER_SECOND = Histogram(
+        "tutor_llm_tokens_per_second",
+        "Generation speed after the first token",
+        ["provider"],
+        buckets=_RATE_BUCKETS,
+    )
+    LLM_ERRORS = Counter("tutor_llm_errors_total", "Failed LLM calls", ["provider"])
+    LLM_HEDGES = Counter("tutor_llm_hedges_total", "Hedged LLM requests (fired, won by the hedge)", ["outcome"])
+    REAL_TIME_FACTOR = Histogram(
+        "tutor_real_time_factor",
+        "Compute seconds per second of audio (stt by request class, tts)",
+        ["engine"],
+        buckets=_RTF_BUCKETS,
+    )
+    HTTP_SECONDS = Histogram(
+        "tutor_http_request_seconds",
+        "HTTP request latency until the response body is sent",
+        ["method", "route", "status"],
+        buckets=_LATENCY_BUCKETS,
+    )
+    # Admission control (app/admission.py): inputs for autoscaling
+    ADMISSION_QUEUE = Gauge(
+        "tutor_admission_queue_depth", "Requests waiting for a stage slot", ["stage"], multiprocess_mode="livesum"
+    )
+    ADMISSION_ACTIVE = Gauge(
+        "tutor_admission_in_flight", "Requests holding a stage slot", ["stage"], multiprocess_mode="livesum"
+    )
+    ADMISSION_WAIT_SECONDS = Histogram(
+        "tutor_admission_wait_seconds",
+        "Time spent waiting for a stage slot",
+        ["stage", "priority"],
+        buckets=_LATENCY_BUCKETS,
+    )
+    ADMISSION_REJECTED = Counter(
+        "tutor_admission_rejected_total", "Requests turned away with 429/busy", ["stage"]
+    )
+
+# Per-request stage timings (ms) for Server-Timing headers / WebSocket fields
+_timings: contextvars.ContextVar = contextvars.ContextVar("tutor_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request/turn; returns the dict."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def observe(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        # Repeated stages (e.g. one tts per sentence) accumulate
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 1)
+
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def observe_rtf(engine: str, compute_s: float, audio_s: float):
+    if METRICS_ENABLED and audio_s > 0:
+        REAL_TIME_FACTOR.labels(engine).observe(compute_s / audio_s)
+
+
+def observe_llm(provider: str, total_s: float, first_token_s: Optional[float] = None, tokens: int = 0):
+    observe("llm", total_s)
+    if first_token_s is not None:
+        observe("llm_first_token", first_token_s)
+    gen_s = total_s - (first_token_s or 0.0)
+    if METRICS_ENABLED and tokens > 1 and gen_s > 0:
+        LLM_TOKENS_PER_SECOND.labels(provider).observe(tokens / gen_s)
+
+
+def llm_error(provider: str):
+    if METRICS_ENABLED:
+        LLM_ERRORS.labels(provider).inc()
+
+
+def admission_queue(stage_name: str, depth: int):
+    if METRICS_ENABLED:
+        ADMISSION_QUEUE.labels(stage_name).set(depth)
+
+
+def admission_active(stage_name: str, active: int):
+    if METRICS_ENABLED:
+        ADMISSION_ACTIVE.labels(stage_name).set(active)
+
+
+def admission_wait(stage_name: str, priority: str, seconds: float):
+    if METRICS_ENABLED:
+        ADMISSION_WAIT_SECONDS.labels(stage_name, priority).observe(seconds)
+
+
+def admission_rejected(stage_name: str):
+    if METRICS_ENABLED:
+        ADMISSION_REJECTED.labels(stage_name).inc()
+
+
+def llm_hedge(outcome: str):
+    if METRICS_ENABLED:
+        LLM_HEDGES.labels(outcome).inc()
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in timings.items())
+
+
+def render() -> Tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware: gives each HTTP request a fresh timings dict, adds
+    Server-Timing (per stage + total) to the response headers and records the
+    request in tutor_http_request_seconds once the body has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        t0 = time.perf_counter()
+        timings = start_timings()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                entries = dict(timings)
+                entries["total"] = round((time.perf_counter() - t0) * 1000, 1)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(entries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if METRICS_ENABLED:
+                route = scope.get("route")
+                HTTP_SECONDS.labels(
+                    scope.get("method", ""),
+                    getattr(route, "path", "unmatched"),
+                    str(status["code"]),
+                ).observe(time.perf_counter() - t0)
@@ -0,0 +1,322 @@
+import os
+import sys
+import time
+import queue
+import socket
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("model_client")
+
+# ------------------------
+# Config
+# ------------------------
+# Unix socket of a model server (python -m app.model_server); empty = models load in-process
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+# Which models go to the server; MODEL_SERVER_<STT|TTS|EMBED>_SOCKET points one at its own server
+MODEL_SERVER_MODELS = [m.strip() for m in os.getenv("MODEL_SERVER_MODELS", "stt,tts,embed").split(",") if m.strip()]
+# Requests one web worker keeps in flight per server (one connection each)
+MODEL_CLIENT_CONNECTIONS = int(os.getenv("MODEL_CLIENT_CONNECTIONS", "8"))
+MODEL_CLIENT_TIMEOUT = float(os.getenv("MODEL_CLIENT_TIMEOUT", "120"))
+# Per-connection shared-memory arena for audio/PCM (grown for longer clips; 0 = everything via the socket)
+MODEL_SHM_ARENA_MB = float(os.getenv("MODEL_SHM_ARENA_MB", "4"))
+# Payloads smaller than this ride in the frame
+MODEL_SHM_MIN_BYTES = int(os.getenv("MODEL_SHM_MIN_BYTES", "16384"))
+
+MODELS = ("stt", "tts", "embed")
+# Ops whose reply carries audio, so the request brings an arena even without a payload
+_ARENA_REPLIES = ("tts",)
+
+# Frames: 4-byte big-endian length, then a msgpack map
+HEADER = struct.Struct("!I")
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def remote_socket(model: str) -> Optional[str]:
+    """Socket of the server hosting `model`, or None if it loads in this process."""
+    path = os.getenv(f"MODEL_SERVER_{model.upper()}_SOCKET")
+    if path:
+        return path
+    if MODEL_SERVER_SOCKET and model in MODEL_SERVER_MODELS:
+        return MODEL_SERVER_SOCKET
+    return None
+
+
+# ------------------------
+# Framing
+# ------------------------
+def pack(message: Dict) -> bytes:
+    body = msgpack.packb(message, use_bin_type=True)
+    return HEADER.pack(len(body)) + body
+
+
+def unpack(body: bytes) -> Dict:
+    return msgpack.unpackb(body, raw=False)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:])
+        if not read:
+            raise ConnectionError("model server closed the connection")
+        got += read
+    return bytes(buf)
+
+
+# ------------------------
+# Shared memory
+# ------------------------
+def attach(name: str) -> shared_memory.SharedMemory:
+    """Map a segment created by the peer, which owns (and unlinks) it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the segment with our resource tracker, which
+    # would unlink it under the owner when this process exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def write_payload(data, arena: Optional[shared_memory.SharedMemory]) -> Dict:
+    """
+    Describe a bytes-like payload for a frame: copied into the arena when there is
+    one and it fits (at least MODEL_SHM_MIN_BYTES), otherwise inline in the frame.
+    """
+    view = memoryview(data).cast("B")
+    if arena is None or view.nbytes < MODEL_SHM_MIN_BYTES or view.nbytes > arena.size:
+        return {"data": view.tobytes()}
+    arena.buf[:view.nbytes] = view
+    return {"shm": view.nbytes}
+
+
+def read_payload(payload: Dict, arena: Optional[shared_memory.SharedMemory]) -> bytes:
+    if "shm" in payload:
+        return bytes(arena.buf[:payload["shm"]])
+    return payload["data"]
+
+
+class _Connection:
+    """
+    One socket plus its shared-memory arena: a segment created once and reused by
+    every request on the connection (audio in, PCM out), so a request costs a
+    memcpy rather than a segment create/map/unlink.
+    """
+
+    def __init__(self, path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.arena: Optional[shared_memory.SharedMemory] = None
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            self.sock.close()
+            raise ModelServerError(f"model server at {path} unreachable: {e}")
+
+    def ensure_arena(self, nbytes: int):
+        if not MODEL_SHM_ARENA_MB or (self.arena is not None and self.arena.size >= nbytes):
+            return
+        self._drop_arena()
+        self.arena = shared_memory.SharedMemory(create=True, size=max(nbytes, int(MODEL_SHM_ARENA_MB * 2**20)))
+
+    def _drop_arena(self):
+        if self.arena is not None:
+            self.arena.close()
+            try:
+                self.arena.unlink()
+            except FileNotFoundError:
+                pass
+            self.arena = None
+
+    def roundtrip(self, message: Dict) -> Dict:
+        self.sock.sendall(pack(message))
+        (size,) = HEADER.unpack(_recv_exactly(self.sock, HEADER.size))
+        return unpack(_recv_exactly(self.sock, size))
+
+    def close(self):
+        self.sock.close()
+        self._drop_arena()
+
+
+# ------------------------
+# Client
+# ------------------------
+class ModelClient:
+    """
+    Blocking, thread-safe client for one model server.
+    - Up to `connections` requests in flight, each on its own pooled connection
+      (callers are worker threads: the Whisper pool, TTS engines, the embedder)
+    - Audio goes out and PCM comes back through the connection's shared-memory
+      arena; only small control messages cross the socket
+    - A stale pooled connection (server restarted) is replaced once, transparently
+    """
+
+    def __init__(self, path: str, connections: int = MODEL_CLIENT_CONNECTIONS, timeout: float = MODEL_CLIENT_TIMEOUT):
+        if msgpack is None:
+            raise ImportError("The model server client needs msgpack (pip install msgpack)")
+        self.path = path
+        self.timeout = timeout
+        self.connections = max(1, connections)
+        self._slots = threading.BoundedSemaphore(self.connections)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.calls: Dict[str, Dict] = {}
+        self.shm_bytes = 0
+        self.inline_bytes = 0
+
+    def _exchange(self, conn: _Connection, op: str, data, args: Dict) -> Dict:
+        message = {"op": op, **args}
+        if data is not None or op in _ARENA_REPLIES:
+            conn.ensure_arena(memoryview(data).nbytes if data is not None else 0)
+        if conn.arena is not None:
+            message["arena"] = conn.arena.name
+        if data is not None:
+            message["payload"] = write_payload(data, conn.arena)
+            self._count(message["payload"])
+        reply = conn.roundtrip(message)
+        if "payload" in reply:
+            self._count(reply["payload"])
+            reply["payload"] = read_payload(reply["payload"], conn.arena)
+        return reply
+
+    def call(self, op: str, data=None, **args) -> Dict:
+        """Send one request; `data` (bytes-like) rides in shared memory, as does a binary reply."""
+        started = time.perf_counter()
+        with self._slots:
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = _Connection(self.path, self.timeout), False
+            try:
+                reply = self._exchange(conn, op, data, args)
+            except ConnectionError as e:
+                conn.close()
+                if not reused:
+                    raise ModelServerError(f"model server at {self.path}: {e}")
+                logger.info(f"🔌 Reconnecting to model server {self.path} ({e})")
+                conn = _Connection(self.path, self.timeout)
+                try:
+                    reply = self._exchange(conn, op, data, args)
+                except OSError as e:
+                    conn.close()
+                    raise ModelServerError(f"model server at {self.path}: {e}")
+            except OSError as e:
+                # Timeouts included: the reply may still arrive, so the connection can't be reused
+                conn.close()
+                raise ModelServerError(f"model server at {self.path}: {e}")
+            self._idle.put(conn)
+        with self._lock:
+            s = self.calls.setdefault(op, {"calls": 0, "errors": 0, "total_s": 0.0})
+            s["calls"] += 1
+            s["total_s"] += time.perf_counter() - started
+            if not reply.get("ok"):
+                s["errors"] += 1
+        if not reply.get("ok"):
+            raise ModelServerError(reply.get("error", "model server error"))
+        return reply
+
+    def _count(self, payload: Dict):
+        with self._lock:
+            if "shm" in payload:
+                self.shm_bytes += payload["shm"]
+            else:
+                self.inline_bytes += len(payload["data"])
+
+    # ------------------------
+    # Operations
+    # ------------------------
+    def transcribe(self, audio: np.ndarray, language: Optional[str], kind: str, initial_prompt: Optional[str]) -> str:
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        return self.call("stt", audio, language=language, kind=kind, initial_prompt=initial_prompt)["text"]
+
+    def synthesize(self, text: str, voice: Optional[str] = None, model_name: Optional[str] = None) -> Tuple[bytes, int]:
+        reply = self.call("tts", text=text, voice=voice, model=model_name)
+        return reply["payload"], reply["sample_rate"]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        reply = self.call("embed", texts=texts)
+        return np.frombuffer(reply["vectors"], dtype=np.float32).reshape(len(texts), reply["dim"]).tolist()
+
+    def info(self) -> Dict:
+        return self.call("info")["info"]
+
+    def server_stats(self) -> Dict:
+        return self.call("stats")["stats"]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "socket": self.path,
+                "connections": self.connections,
+                "idle_connections": self._idle.qsize(),
+                "shm_mb": round(self.shm_bytes / 1e6, 2),
+                "inline_mb": round(self.inline_bytes / 1e6, 2),
+                "ops": {
+                    op: {
+                        "calls": s["calls"],
+                        "errors": s["errors"],
+                        "avg_ms": round(s["total_s"] / s["calls"] * 1000, 2) if s["calls"] else None,
+                    }
+                    for op, s in self.calls.items()
+                },
+            }
+
+
+class RemoteEmbeddings:
+    """LangChain-style embeddings (embed_documents / embed_query) computed by a model server."""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(list(texts)) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed([text])[0]
+
+
+# One client per socket, shared by the STT, TTS and embedding proxies of this process
+_clients: Dict[str, ModelClient] = {}
+_clients_lock = threading.Lock()
+
+
+def connect(path: str) -> ModelClient:
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            client = _clients[path] = ModelClient(path)
+    return client
+
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def stats() -> Dict:
+    with _clients_lock:
+        return {path: client.stats() for path, client in _clients.items()}
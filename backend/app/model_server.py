@@ -0,0 +1,234 @@
+import os
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app import stt, model_client
+from app.tts_registry import registry as tts_registry, EXTRA_MODELS, TTS_POOL_SIZE
+from app.embedder import BatchingEmbedder
+from app.model_client import MODELS, MODEL_SERVER_SOCKET, HEADER
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger("model_server")
+
+DEFAULT_SOCKET = "/tmp/tutor-models.sock"
+
+
+class ModelServer:
+    """
+    Hosts Whisper, TTS and the sentence-transformer for every web worker on the box.
+    - Web workers (MODEL_SERVER_SOCKET set) load no models: app/model_client.py
+      proxies transcription, synthesis and query embeddings over a Unix socket
+    - Requests are length-prefixed msgpack maps; audio in and PCM out travel
+      through each connection's shared-memory arena, not through the socket
+    - Work from all workers lands in this process' Whisper priority queue/batcher,
+      TTS engine pool and embedding micro-batcher, so batches form across workers
+    - Sized on its own: STT_WORKERS, TTS_POOL_SIZE, EMBED_BATCH_SIZE etc. apply here;
+      run one server per model (MODEL_SERVER_<STT|TTS|EMBED>_SOCKET) to scale them apart
+    """
+
+    def __init__(self, socket_path: str, models: List[str]):
+        unknown = set(models) - set(MODELS)
+        if unknown:
+            raise ValueError(f"Unknown models {sorted(unknown)}. Use any of: {', '.join(MODELS)}")
+        self.socket_path = socket_path
+        self.models = list(models)
+        self.embedder = None
+        self.connections = 0
+        self.ops: Dict[str, Dict] = {}
+        self.started_at = time.time()
+        self._handlers = {"stt": self._stt, "tts": self._tts, "embed": self._embed, "info": self._info, "stats": self._stats}
+
+    def load(self, stt_factory=None, tts_factory=None, embed_factory=None):
+        """Load and warm the served models. Blocking. Factories plug in stub engines."""
+        t0 = time.perf_counter()
+        if "stt" in self.models:
+            stt.pool.start(stt_factory)
+        if "tts" in self.models:
+            if tts_factory:
+                tts_registry.register(tts_registry.default_model, tts_factory, TTS_POOL_SIZE)
+            else:
+                tts_registry.dedicated = self.models == ["tts"]
+                tts_registry.load_all()
+        if "embed" in self.models:
+            if embed_factory:
+                model = embed_factory()
+            else:
+                # rag pulls in the LLM clients; only the embedding server needs it
+                from app.rag import load_embedding_model
+                model = load_embedding_model()
+            self.embedder = BatchingEmbedder(model)
+        logger.info(f"📦 Models loaded: {', '.join(self.models)} ({time.perf_counter() - t0:.1f}s)")
+
+    # ------------------------
+    # Serving
+    # ------------------------
+    async def serve(self):
+        self._claim_socket()
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info(f"🚀 Model server on {self.socket_path} (pid {os.getpid()})")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.close()
+
+    def _claim_socket(self):
+        """Remove a socket file left by a dead server; refuse to steal a live one."""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another model server is listening on {self.socket_path}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Clients send one request at a time per connection, so its arena is free between them
+        self.connections += 1
+        arena = None
+        try:
+            while True:
+                try:
+                    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    request = model_client.unpack(await reader.readexactly(size))
+                except asyncio.IncompleteReadError:
+                    return
+                name = request.get("arena")
+                if name and (arena is None or arena.name != name):
+                    # First request, or the client grew its arena for a longer clip
+                    if arena is not None:
+                        arena.close()
+                    arena = model_client.attach(name)
+                data = model_client.read_payload(request["payload"], arena) if "payload" in request else None
+                reply = await self._dispatch(request, data)
+                if "payload" in reply:
+                    reply["payload"] = model_client.write_payload(reply["payload"], arena)
+                writer.write(model_client.pack(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            if arena is not None:
+                arena.close()
+            writer.close()
+
+    async def _dispatch(self, request: Dict, data: Optional[bytes]) -> Dict:
+        op = request.get("op")
+        handler = self._handlers.get(op)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown op '{op}'"}
+        if op in MODELS and op not in self.models:
+            return {"ok": False, "error": f"This model server does not serve {op}"}
+        started = time.perf_counter()
+        s = self.ops.setdefault(op, {"requests": 0, "errors": 0, "total_s": 0.0})
+        try:
+            return {"ok": True, **await handler(request, data)}
+        except Exception as e:
+            s["errors"] += 1
+            logger.warning(f"⚠️ {op} failed: {e}")
+            return {"ok": False, "error": str(e)}
+        finally:
+            s["requests"] += 1
+            s["total_s"] += time.perf_counter() - started
+
+    # ------------------------
+    # Operations
+    # ------------------------
+    async def _stt(self, request: Dict, data: bytes) -> Dict:
+        audio = np.frombuffer(data, dtype=np.float32)
+        future = stt.pool.submit(audio, request.get("language"), request.get("kind", "file"), request.get("initial_prompt"))
+        return {"text": await asyncio.wrap_future(future)}
+
+    async def _tts(self, request: Dict, data: None) -> Dict:
+        pcm, sample_rate = await asyncio.to_thread(
+            tts_registry.synthesize, request["text"], request.get("voice"), request.get("model")
+        )
+        return {"payload": pcm, "sample_rate": sample_rate}
+
+    async def _embed(self, request: Dict, data: None) -> Dict:
+        # Each text joins the shared micro-batch, so concurrent workers' queries embed together
+        vectors = await asyncio.gather(*(self.embedder.aembed(text) for text in request["texts"]))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        return {"vectors": matrix.tobytes(), "dim": matrix.shape[1] if matrix.ndim == 2 else 0}
+
+    async def _info(self, request: Dict, data: None) -> Dict:
+        tts = {}
+        if "tts" in self.models:
+            for name in dict.fromkeys([tts_registry.default_model, *EXTRA_MODELS]):
+                try:
+                    pool = tts_registry.get(name)
+                except RuntimeError:
+                    continue
+                tts[name] = {"sample_rate": pool.sample_rate, "speakers": pool.speakers, "backend": pool.model_name}
+        info = {"models": self.models, "pid": os.getpid(), "tts": tts}
+        if self.embedder:
+            from app.rag import embedding_signature
+            info["embed"] = embedding_signature(self.embedder.model)
+        return {"info": info}
+
+    async def _stats(self, request: Dict, data: None) -> Dict:
+        stats = {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "rss_mb": round(psutil.Process().memory_info().rss / (1024 * 1024), 1) if psutil else None,
+            "connections": self.connections,
+            "ops": {
+                op: {
+                    "requests": s["requests"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_s"] / s["requests"] * 1000, 2) if s["requests"] else None,
+                }
+                for op, s in self.ops.items()
+            },
+        }
+        if "stt" in self.models:
+            stats["stt"] = stt.stats()
+        if "tts" in self.models:
+            stats["tts"] = tts_registry.stats()
+        if self.embedder:
+            stats["embed"] = self.embedder.stats()
+        return {"stats": stats}
+
+    def close(self):
+        stt.shutdown()
+        if self.embedder:
+            self.embedder.shutdown()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Serve the STT/TTS/embedding models to web workers over a Unix socket")
+    p.add_argument("--socket", default=MODEL_SERVER_SOCKET or DEFAULT_SOCKET)
+    p.add_argument("--models", default=",".join(MODELS), help="comma separated subset of: " + ", ".join(MODELS))
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ModelServer(args.socket, [m.strip() for m in args.models.split(",") if m.strip()])
+    server.load()
+    asyncio.run(server.serve())
+
+
+if __name__ == "__main__":
+    main()
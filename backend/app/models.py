@@ -1,9 +1,13 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class QueryRequest(BaseModel):
     query: str
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    concurrency: Optional[int] = None
+
 class ChatRequest(BaseModel):
     session_id: str
     query: str
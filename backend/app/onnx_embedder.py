@@ -0,0 +1,208 @@
+import os
+import shutil
+import logging
+from typing import List, Tuple, Dict
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger("onnx_embedder")
+
+# ------------------------
+# Config
+# ------------------------
+# Exported / quantized models are cached here, one directory per model
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "./onnx_models")
+# Dynamic int8 quantization of the weights (activations are quantized on the fly)
+EMBED_ONNX_QUANTIZE = os.getenv("EMBED_ONNX_QUANTIZE", "1") == "1"
+# Intra-op threads per session; 0 = physical cores
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+# Busy-wait between ops: a little faster for bulk ingest, but burns cores a web worker shares
+EMBED_ONNX_SPIN = os.getenv("EMBED_ONNX_SPIN", "0") == "1"
+# Texts per forward pass; inputs are length-sorted first so each pass pads little
+EMBED_ONNX_BATCH_SIZE = int(os.getenv("EMBED_ONNX_BATCH_SIZE", "32"))
+# sentence-transformers' max_seq_length for all-MiniLM-L6-v2
+EMBED_ONNX_MAX_LENGTH = int(os.getenv("EMBED_ONNX_MAX_LENGTH", "256"))
+# Startup check against vectors already in the store (see check_compatibility)
+EMBED_ONNX_VERIFY = os.getenv("EMBED_ONNX_VERIFY", "1") == "1"
+EMBED_ONNX_VERIFY_SAMPLE = int(os.getenv("EMBED_ONNX_VERIFY_SAMPLE", "32"))
+EMBED_ONNX_MIN_COSINE = float(os.getenv("EMBED_ONNX_MIN_COSINE", "0.98"))
+
+_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def _physical_cores() -> int:
+    cores = psutil.cpu_count(logical=False) if psutil else None
+    return cores or os.cpu_count() or 1
+
+
+# ------------------------
+# Export / quantization
+# ------------------------
+def _fetch(model_name: str, target: str):
+    """The ONNX graph sentence-transformers publishes next to the PyTorch weights."""
+    from huggingface_hub import hf_hub_download
+
+    repo = f"sentence-transformers/{model_name}"
+    shutil.copy(hf_hub_download(repo, "onnx/model.onnx"), os.path.join(target, "model.onnx.tmp"))
+    shutil.copy(hf_hub_download(repo, "tokenizer.json"), os.path.join(target, "tokenizer.json"))
+
+
+def _export(model_name: str, target: str):
+    """Trace the transformer (no pooling) to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    repo = f"sentence-transformers/{model_name}"
+    model = AutoModel.from_pretrained(repo).eval()
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    tokenizer.backend_tokenizer.save(os.path.join(target, "tokenizer.json"))
+    sample = tokenizer(["warmup text"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in _INPUTS),
+            os.path.join(target, "model.onnx.tmp"),
+            input_names=list(_INPUTS),
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in (*_INPUTS, "last_hidden_state")},
+            opset_version=17,
+        )
+
+
+def _quantize(source: str, dest: str):
+    # Needs the onnx package besides onnxruntime
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(source, f"{dest}.tmp", weight_type=QuantType.QInt8)
+    os.replace(f"{dest}.tmp", dest)
+
+
+def ensure_model(model_name: str, quantize: bool = EMBED_ONNX_QUANTIZE, model_dir: str = EMBED_ONNX_DIR) -> Tuple[str, str]:
+    """
+    Return (model path, tokenizer.json path), exporting on first use: the published
+    ONNX graph if the hub has one, else a local torch export; then, with `quantize`,
+    a dynamic int8 copy. Run it once before forking workers that share the cache.
+    """
+    target = os.path.join(model_dir, model_name)
+    fp32 = os.path.join(target, "model.onnx")
+    tokenizer = os.path.join(target, "tokenizer.json")
+    if not os.path.exists(fp32) or not os.path.exists(tokenizer):
+        os.makedirs(target, exist_ok=True)
+        try:
+            _fetch(model_name, target)
+        except Exception as e:
+            logger.info(f"No published ONNX graph for {model_name} ({e}); exporting with torch")
+            _export(model_name, target)
+        os.replace(f"{fp32}.tmp", fp32)
+        logger.info(f"📦 ONNX model for {model_name} at {fp32}")
+    if not quantize:
+        return fp32, tokenizer
+    int8 = os.path.join(target, "model_int8.onnx")
+    if not os.path.exists(int8):
+        try:
+            _quantize(fp32, int8)
+        except ImportError as e:
+            logger.warning(f"⚠️ int8 quantization needs the onnx package ({e}); using the fp32 model")
+            return fp32, tokenizer
+    return int8, tokenizer
+
+
+# ------------------------
+# Embeddings
+# ------------------------
+class OnnxEmbeddings:
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime, a drop-in for LangChain's
+    SentenceTransformerEmbeddings (embed_documents / embed_query).
+    - Same pipeline as sentence-transformers: WordPiece tokens (max 256),
+      transformer, mask-aware mean pooling, L2 normalization
+    - Batches are length-sorted and split into EMBED_ONNX_BATCH_SIZE passes, so
+      one long chunk doesn't pad a whole ingest batch
+    - One session with a fixed intra-op thread budget; inter-op parallelism off
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", quantize: bool = EMBED_ONNX_QUANTIZE,
+                 threads: int = EMBED_ONNX_THREADS, batch_size: int = EMBED_ONNX_BATCH_SIZE,
+                 model_dir: str = EMBED_ONNX_DIR):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path, tokenizer_path = ensure_model(model_name, quantize, model_dir)
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(EMBED_ONNX_MAX_LENGTH)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or _physical_cores()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.add_session_config_entry("session.intra_op.allow_spinning", "1" if EMBED_ONNX_SPIN else "0")
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        dim = self.session.get_outputs()[0].shape[-1]
+        self.dim = dim if isinstance(dim, int) else 384
+        self.model_path = model_path
+        self.threads = options.intra_op_num_threads
+        self.batch_size = max(1, batch_size)
+        logger.info(f"🧮 ONNX embedder {os.path.basename(model_path)}: {self.threads} threads, batch {self.batch_size}")
+
+    def _run(self, encodings) -> np.ndarray:
+        width = max(len(e.ids) for e in encodings)
+        ids = np.zeros((len(encodings), width), dtype=np.int64)
+        mask = np.zeros_like(ids)
+        for i, e in enumerate(encodings):
+            ids[i, :len(e.ids)] = e.ids
+            mask[i, :len(e.ids)] = 1
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32, L2-normalized rows, in input order."""
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = np.argsort([len(e.ids) for e in encodings], kind="stable")
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            out[rows] = self._run([encodings[i] for i in rows])
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def check_compatibility(embedding, store, sample: int = EMBED_ONNX_VERIFY_SAMPLE,
+                        min_cosine: float = EMBED_ONNX_MIN_COSINE) -> Dict:
+    """
+    Re-embed up to `sample` stored chunks and compare with their stored vectors.
+    Raises if any falls below `min_cosine`: queries would no longer land near the
+    collection's documents, so it needs re-ingesting with this backend.
+    """
+    texts, stored = store.sample(sample)
+    if not texts:
+        return {"checked": 0}
+    fresh = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+    stored = np.asarray(stored, dtype=np.float32)
+    cosine = (fresh * stored).sum(axis=1) / np.clip(
+        np.linalg.norm(fresh, axis=1) * np.linalg.norm(stored, axis=1), 1e-12, None
+    )
+    result = {"checked": len(texts), "min_cosine": round(float(cosine.min()), 5), "mean_cosine": round(float(cosine.mean()), 5)}
+    if result["min_cosine"] < min_cosine:
+        raise RuntimeError(
+            f"Embeddings don't match the stored collection (min cosine {result['min_cosine']} < {min_cosine}); "
+            "re-ingest with this backend or set EMBED_BACKEND=torch"
+        )
+    return result
@@ -0,0 +1,205 @@
+import os
+import re
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger("prompt_packer")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# ------------------------
+# Config
+# ------------------------
+PROMPT_TOKEN_BUDGET = int(os.getenv("RAG_PROMPT_TOKEN_BUDGET", "3000"))
+# Max share of the budget the retrieved context may take; history gets the rest.
+CONTEXT_TOKEN_SHARE = float(os.getenv("RAG_CONTEXT_TOKEN_SHARE", "0.5"))
+CHUNK_DEDUP_THRESHOLD = float(os.getenv("RAG_CHUNK_DEDUP_THRESHOLD", "0.8"))
+HISTORY_MAX_TURNS = int(os.getenv("RAG_HISTORY_MAX_TURNS", "8"))
+TIKTOKEN_ENCODING = os.getenv("RAG_TIKTOKEN_ENCODING", "cl100k_base")
+
+# Rolling summary of turns that fall out of the history window
+SUMMARY_ENABLED = os.getenv("RAG_SUMMARY_ENABLED", "0") == "1"
+SUMMARY_MIN_FOLD = int(os.getenv("RAG_SUMMARY_MIN_FOLD", "4"))
+SUMMARY_MAX_WORDS = int(os.getenv("RAG_SUMMARY_MAX_WORDS", "150"))
+
+# Per-message overhead of the chat format (role, separators)
+_MESSAGE_OVERHEAD = 4
+# Don't bother keeping a truncated piece smaller than this
+_MIN_TRUNCATED_TOKENS = 32
+_WORD_RE = re.compile(r"\w+")
+
+SYSTEM_PROMPT = (
+    "You are an expert, patient AI tutor. "
+    "Explain concepts clearly, step-by-step, and use context when available."
+)
+
+
+class TokenCounter:
+    """tiktoken-based counter; falls back to a ~4 chars/token estimate."""
+
+    def __init__(self, encoding: str = TIKTOKEN_ENCODING):
+        self.enc = None
+        if tiktoken:
+            try:
+                self.enc = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning(f"⚠️ tiktoken encoding {encoding} unavailable: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.enc:
+            return len(self.enc.encode_ordinary(text))
+        return (len(text) + 3) // 4
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return sum(self.count(m.get("content", "")) + _MESSAGE_OVERHEAD for m in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.enc:
+            tokens = self.enc.encode_ordinary(text)
+            return text if len(tokens) <= max_tokens else self.enc.decode(tokens[:max_tokens])
+        return text[: max_tokens * 4]
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def dedupe_chunks(chunks: List[str], threshold: float = CHUNK_DEDUP_THRESHOLD) -> Tuple[List[str], int]:
+    """Drop chunks whose word 3-gram Jaccard similarity to a higher-ranked chunk is >= threshold."""
+    kept: List[str] = []
+    kept_shingles: List[set] = []
+    dropped = 0
+    for chunk in chunks:
+        sh = _shingles(chunk)
+        dup = False
+        for other in kept_shingles:
+            union = len(sh | other)
+            if union and len(sh & other) / union >= threshold:
+                dup = True
+                break
+        if dup:
+            dropped += 1
+            continue
+        kept.append(chunk)
+        kept_shingles.append(sh)
+    return kept, dropped
+
+
+class ContextPacker:
+    """
+    Assemble chat messages within a token budget.
+    - system prompt, rolling summary and the query are always included
+    - retrieved chunks are de-duplicated, then added in rank order up to
+      `context_share` of the budget (the last one truncated to fit)
+    - history is added newest-first into what remains; older turns are dropped,
+      and the oldest kept turn is truncated rather than skipped
+    """
+
+    def __init__(
+        self,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        context_share: float = CONTEXT_TOKEN_SHARE,
+        max_turns: int = HISTORY_MAX_TURNS,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.budget = budget
+        self.context_share = context_share
+        self.max_turns = max_turns
+        self.counter = counter or TokenCounter()
+
+    def pack(
+        self,
+        query: str,
+        chunks: List[str],
+        history: List[Dict],
+        summary: Optional[str] = None,
+        stats: Optional[Dict] = None,
+    ) -> List[Dict]:
+        count = self.counter.count
+        head = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if summary:
+            head.append({"role": "system", "content": f"Conversation summary so far:\n{summary}"})
+        tail = [{"role": "user", "content": query}]
+        remaining = self.budget - self.counter.count_messages(head + tail)
+
+        # ------------------------
+        # Retrieved context
+        # ------------------------
+        chunks, duplicates = dedupe_chunks(chunks)
+        context_budget = min(int(self.budget * self.context_share), remaining) - _MESSAGE_OVERHEAD - 2
+        context_parts: List[str] = []
+        used = 0
+        for chunk in chunks:
+            cost = count(chunk) + 1
+            if used + cost <= context_budget:
+                context_parts.append(chunk)
+                used += cost
+                continue
+            left = context_budget - used
+            if left >= _MIN_TRUNCATED_TOKENS:
+                context_parts.append(self.counter.truncate(chunk, left - 1))
+            break
+        context_msgs = []
+        if context_parts:
+            context_msgs = [{"role": "system", "content": "Context:\n" + "\n\n".join(context_parts)}]
+            remaining -= self.counter.count_messages(context_msgs)
+
+        # ------------------------
+        # History (newest first)
+        # ------------------------
+        history_msgs: List[Dict] = []
+        window = history[-self.max_turns:] if self.max_turns else []
+        for m in reversed(window):
+            role = "assistant" if m.get("role") == "assistant" else "user"
+            text = m.get("text", "")
+            cost = count(text) + _MESSAGE_OVERHEAD
+            if cost <= remaining:
+                history_msgs.append({"role": role, "content": text})
+                remaining -= cost
+                continue
+            if remaining - _MESSAGE_OVERHEAD >= _MIN_TRUNCATED_TOKENS:
+                history_msgs.append({"role": role, "content": self.counter.truncate(text, remaining - _MESSAGE_OVERHEAD)})
+                remaining = 0
+            break
+        history_msgs.reverse()
+
+        messages = head + context_msgs + history_msgs + tail
+        if stats is not None:
+            stats.update({
+                "prompt_tokens": self.counter.count_messages(messages),
+                "prompt_budget": self.budget,
+                "context_chunks": len(context_parts),
+                "duplicate_chunks": duplicates,
+                "history_turns": len(history_msgs),
+                "history_dropped": len(history) - len(history_msgs),
+                "summary_used": bool(summary),
+            })
+        return messages
+
+
+def summary_messages(previous: Optional[str], turns: List[Dict], max_words: int = SUMMARY_MAX_WORDS) -> List[Dict]:
+    """Prompt that folds `turns` into the previous rolling summary."""
+    transcript = "\n".join(
+        f"{'Tutor' if m.get('role') == 'assistant' else 'Student'}: {m.get('text', '')}" for m in turns
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"Update the running summary of a tutoring session in at most {max_words} words. "
+                "Keep the topics covered, what the student understood or struggled with, "
+                "facts they shared about themselves, and open questions. Reply with the summary only."
+            ),
+        },
+        {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"},
+    ]
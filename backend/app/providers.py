@@ -0,0 +1,180 @@
+import os
+import time
+import logging
+from typing import List, Dict, AsyncGenerator, Optional
+
+from app import metrics
+
+logger = logging.getLogger("llm_providers")
+
+# ------------------------
+# HTTP transport (shared pool)
+# ------------------------
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# ------------------------
+# Async Groq / OpenAI clients
+# ------------------------
+try:
+    from groq import AsyncGroq
+except ImportError:
+    AsyncGroq = None
+
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+# ------------------------
+# Config
+# ------------------------
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Optional base URL overrides (e.g. a local OpenAI-compatible stub for load tests)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Connection pool shared by every provider on this worker
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+
+_http_client = None
+
+
+def get_http_client():
+    """
+    Return the process-wide pooled AsyncClient, creating it on first use.
+    All providers share it so concurrent requests reuse keep-alive connections
+    and the total number of sockets stays bounded.
+    """
+    global _http_client
+    if httpx is None:
+        return None
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+class LLMProvider:
+    """
+    Thin async wrapper around a Groq/OpenAI chat-completions client.
+    """
+
+    def __init__(self, name: str, client, model_name: str, temperature: float, max_tokens: int):
+        self.name = name
+        self.client = client
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def _params(self, messages: List[Dict], **extra) -> Dict:
+        params = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        params.update(extra)
+        return params
+
+    @staticmethod
+    def _extract_content(resp) -> str:
+        try:
+            choices = getattr(resp, "choices", None)
+            if choices is None and isinstance(resp, dict):
+                choices = resp.get("choices")
+            if choices:
+                c0 = choices[0]
+                if hasattr(c0, "message"):
+                    return getattr(c0.message, "content", "") or ""
+                if isinstance(c0, dict):
+                    return c0.get("message", {}).get("content", "") or ""
+        except Exception:
+            pass
+        return str(resp)
+
+    @staticmethod
+    def _extract_delta(chunk) -> Optional[str]:
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            return None
+        delta = getattr(choices[0], "delta", None)
+        if delta is None:
+            return None
+        if isinstance(delta, dict):
+            return delta.get("content")
+        return getattr(delta, "content", None)
+
+    async def complete(self, messages: List[Dict]) -> str:
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.chat.completions.create(**self._params(messages))
+        except Exception:
+            metrics.llm_error(self.name)
+            raise
+        usage = getattr(resp, "usage", None)
+        metrics.observe_llm(self.name, time.perf_counter() - t0, tokens=getattr(usage, "completion_tokens", 0) or 0)
+        return self._extract_content(resp).strip()
+
+    async def stream(self, messages: List[Dict]) -> AsyncGenerator[str, None]:
+        # Time to first token, total and deltas/s (each delta is ~one token)
+        t0 = time.perf_counter()
+        first = None
+        deltas = 0
+        try:
+            stream = await self.client.chat.completions.create(**self._params(messages, stream=True))
+            async for chunk in stream:
+                delta = self._extract_delta(chunk)
+                if delta:
+                    if first is None:
+                        first = time.perf_counter() - t0
+                    deltas += 1
+                    yield delta
+        except Exception:
+            metrics.llm_error(self.name)
+            raise
+        metrics.observe_llm(self.name, time.perf_counter() - t0, first_token_s=first, tokens=deltas)
+
+
+def build_providers(temperature: float, max_tokens: int) -> List[LLMProvider]:
+    """
+    Build every provider with a configured API key, in preference order (Groq first).
+    """
+    http_client = get_http_client()
+    providers: List[LLMProvider] = []
+
+    groq_key = os.getenv("GROQ_API_KEY")
+    if groq_key and AsyncGroq:
+        client = AsyncGroq(api_key=groq_key, base_url=GROQ_BASE_URL, http_client=http_client)
+        providers.append(LLMProvider("groq", client, GROQ_MODEL, temperature, max_tokens))
+
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if openai_key and AsyncOpenAI:
+        client = AsyncOpenAI(api_key=openai_key, base_url=OPENAI_BASE_URL, http_client=http_client)
+        providers.append(LLMProvider("openai", client, OPENAI_MODEL, temperature, max_tokens))
+
+    if len(providers) > 1:
+        # The router fails over to the next provider; SDK retries with backoff would only delay that
+        for provider in providers:
+            provider.client = provider.client.with_options(max_retries=0)
+
+    return providers
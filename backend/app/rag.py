@@ -1,226 +1,525 @@
 import os
+import time
 import asyncio
 import logging
-from typing import List, Dict, AsyncGenerator, Optional
+from typing import List, Dict, AsyncGenerator, Optional, Sequence
+
+from app import metrics, admission, model_client
+from app.providers import build_providers
+from app.llm_router import LLMRouter
+from app.prompt import ContextPacker, summary_messages
+from app.embedder import BatchingEmbedder, EMBED_BACKEND
+from app.cache import (
+    SemanticCache,
+    QueryCache,
+    SEMANTIC_CACHE_ENABLED,
+    QUERY_CACHE_ENABLED,
+)
+from app.vectorstore import (
+    VectorStore,
+    ChromaVectorStore,
+    MmapVectorStore,
+    VECTOR_BACKEND,
+    VECTOR_INDEX_DIR,
+)
 
 # Logging setup
 logger = logging.getLogger("rag_service")
 
-# ------------------------
-# Groq client
-# ------------------------
-try:
-    from groq import Groq
-except ImportError:
-    Groq = None
-
-# ------------------------
-# OpenAI client (fallback)
-# ------------------------
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
-
 # ------------------------
 # LangChain vectorstore
 # ------------------------
-try:
-    from langchain_community.embeddings import SentenceTransformerEmbeddings
-    from langchain_community.vectorstores import Chroma
-except ImportError:
+def _langchain():
+    """
+    Import LangChain's embeddings/Chroma on first use; pulling in
+    sentence-transformers and torch costs seconds, so it stays off the import path.
+    """
     try:
-        from langchain.embeddings import SentenceTransformerEmbeddings
-        from langchain.vectorstores import Chroma
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+        from langchain_community.vectorstores import Chroma
     except ImportError:
-        SentenceTransformerEmbeddings = None
-        Chroma = None
+        try:
+            from langchain.embeddings import SentenceTransformerEmbeddings
+            from langchain.vectorstores import Chroma
+        except ImportError:
+            return None, None
+    return SentenceTransformerEmbeddings, Chroma
+
+
+def load_embedding_model():
+    """The sentence-transformer (EMBED_BACKEND), warmed up. Blocking; used in-process and by the model server."""
+    if EMBED_BACKEND == "onnx":
+        from app.onnx_embedder import OnnxEmbeddings
+        embedding = OnnxEmbeddings()
+        embedding.embed_query("warmup")
+        return embedding
+    SentenceTransformerEmbeddings, _ = _langchain()
+    if not SentenceTransformerEmbeddings:
+        raise ImportError("langchain-community / sentence-transformers not installed")
+    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    embedding.embed_query("warmup")
+    return embedding
+
+def embedding_signature(embedding) -> str:
+    """Identifies the encoder behind `embedding` (backend:model:precision), for cache keys."""
+    if isinstance(embedding, model_client.RemoteEmbeddings):
+        return embedding.client.info().get("embed") or f"remote:{embedding.client.path}"
+    model_path = getattr(embedding, "model_path", None)
+    if model_path:  # OnnxEmbeddings: the file tells whether int8 quantization actually happened
+        precision = "int8" if os.path.basename(model_path).endswith("_int8.onnx") else "fp32"
+        return f"onnx:{os.path.basename(os.path.dirname(model_path))}:{precision}"
+    return f"torch:{getattr(embedding, 'model_name', 'all-MiniLM-L6-v2')}:fp32"
 
 # ------------------------
 # Config
 # ------------------------
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
 
-# ✅ Updated model defaults
-GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")  # Supported Groq model
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-
 TEMPERATURE = float(os.getenv("RAG_TEMPERATURE", "0.2"))
 MAX_TOKENS = int(os.getenv("RAG_MAX_TOKENS", "512"))
 
+# How often (seconds) to re-read the collection size/stamp for cache invalidation
+COLLECTION_VERSION_TTL = float(os.getenv("RAG_COLLECTION_VERSION_TTL", "5"))
+
+# /query/batch: questions per request, and LLM calls one batch keeps in flight
+RAG_BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "500"))
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "8"))
+
 
 class RagService:
-    def __init__(self, chroma_dir: str = CHROMA_DIR):
-        groq_key = os.getenv("GROQ_API_KEY")
-        openai_key = os.getenv("OPENAI_API_KEY")
+    def __init__(self, chroma_dir: str = CHROMA_DIR, load_models: bool = True):
+        self.temperature = TEMPERATURE
+        self.max_tokens = MAX_TOKENS
+        self.packer = ContextPacker()
 
         # ------------------------
         # Choose provider (Groq preferred)
         # ------------------------
-        if groq_key and Groq:
-            self.client = Groq(api_key=groq_key)
-            self.provider = "groq"
-            self.model_name = GROQ_MODEL
-        elif openai_key and OpenAI:
-            self.client = OpenAI(api_key=openai_key)
-            self.provider = "openai"
-            self.model_name = OPENAI_MODEL
-        else:
+        self.providers = build_providers(self.temperature, self.max_tokens)
+        if not self.providers:
             raise RuntimeError("❌ No valid LLM provider found. Set GROQ_API_KEY or OPENAI_API_KEY.")
 
-        self.temperature = TEMPERATURE
-        self.max_tokens = MAX_TOKENS
+        # Every configured provider stays available: hedging, failover, circuit breaking
+        self.llm = LLMRouter(self.providers)
+        self.provider = ",".join(p.name for p in self.providers)
+        self.model_name = self.llm.model_name
 
         # ------------------------
-        # Initialize embeddings + vectorstore
+        # Embeddings + vectorstore (loaded here, or later via load_embedding/load_store)
         # ------------------------
+        self.chroma_dir = chroma_dir
         self.embedding = None
-        self.db = None
-        if SentenceTransformerEmbeddings and Chroma:
+        self.embedder: Optional[BatchingEmbedder] = None
+        self.store: Optional[VectorStore] = None
+        self.answer_cache: Optional[SemanticCache] = None
+        self.query_cache: Optional[QueryCache] = None
+        self._collection_version_value = None
+        self._collection_version_at = 0.0
+        self._latency = {"hit": [0, 0.0], "miss": [0, 0.0]}  # count, total seconds
+
+        if load_models:
             try:
-                self.embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-                self.db = Chroma(
-                    collection_name="ai_tutor",
-                    embedding_function=self.embedding,
-                    persist_directory=chroma_dir,
-                )
+                self.load_embedding()
+                self.load_store()
             except Exception as e:
                 logger.warning(f"⚠️ Vector DB init failed: {e}")
-                self.db = None
+                self.store = None
 
         logger.info(f"✅ RAG initialized with provider={self.provider}, model={self.model_name}")
 
+    def load_embedding(self):
+        """Load the sentence-transformer (or connect to the model server) and the caches that key on its vectors. Blocking."""
+        socket_path = model_client.remote_socket("embed")
+        if socket_path:
+            embedding = model_client.RemoteEmbeddings(model_client.connect(socket_path))
+            embedding.embed_query("warmup")
+        else:
+            embedding = load_embedding_model()
+        self.answer_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+        self.query_cache = QueryCache(encoder=embedding_signature(embedding)) if QUERY_CACHE_ENABLED else None
+        # Concurrent query embeddings share one batched forward pass
+        self.embedder = BatchingEmbedder(embedding)
+        self.embedding = embedding
+        return embedding
+
+    def load_store(self) -> VectorStore:
+        """Open the configured vector store (needs the embedder for Chroma). Blocking."""
+        store = self._open_store(self.chroma_dir)
+        if store is None:
+            raise ImportError("Chroma vector store not available")
+        store.count()
+        if EMBED_BACKEND == "onnx":
+            from app.onnx_embedder import check_compatibility, EMBED_ONNX_VERIFY
+            if EMBED_ONNX_VERIFY:
+                logger.info(f"🧮 ONNX embeddings vs stored vectors: {check_compatibility(self.embedding, store)}")
+        self.store = store
+        return store
+
+    def _open_store(self, chroma_dir: str) -> Optional[VectorStore]:
+        if VECTOR_BACKEND == "mmap":
+            return MmapVectorStore(VECTOR_INDEX_DIR)
+        _, Chroma = _langchain()
+        if not Chroma:
+            return None
+        db = Chroma(
+            collection_name="ai_tutor",
+            embedding_function=self.embedding,
+            persist_directory=chroma_dir,
+        )
+        return ChromaVectorStore(db, chroma_dir)
+
     # ------------------------
-    # Context Retrieval
+    # Embeddings / collection version
     # ------------------------
-    def _retrieve_context(self, query: str, k: int = 4) -> str:
-        if not self.db:
-            return ""
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        """Blocking; for worker threads. Async callers use _aembed_query."""
+        if not self.embedding:
+            return None
+        if self.query_cache:
+            cached = self.query_cache.get_embedding(query)
+            if cached is not None:
+                return cached
         try:
-            docs = self.db.similarity_search(query, k=k)
-            return "\n\n".join(d.page_content for d in docs if getattr(d, "page_content", None))
+            with metrics.stage("embed"):
+                embedding = self.embedder.embed(query)
         except Exception as e:
-            logger.warning(f"Context retrieval failed: {e}")
-            return ""
+            logger.warning(f"Query embedding failed: {e}")
+            return None
+        if self.query_cache:
+            self.query_cache.put_embedding(query, embedding)
+        return embedding
+
+    async def _aembed_query(self, query: str) -> Optional[List[float]]:
+        if not self.embedding:
+            return None
+        if self.query_cache:
+            cached = self.query_cache.get_embedding(query)
+            if cached is not None:
+                return cached
+        try:
+            with metrics.stage("embed"):
+                embedding = await self.embedder.aembed(query)
+        except Exception as e:
+            logger.warning(f"Query embedding failed: {e}")
+            return None
+        if self.query_cache:
+            self.query_cache.put_embedding(query, embedding)
+        return embedding
+
+    def _collection_version(self):
+        """
+        Vector store version, re-read at most every COLLECTION_VERSION_TTL seconds.
+        Changes whenever documents are added.
+        """
+        if not self.store:
+            return None
+        now = time.monotonic()
+        if self._collection_version_value is None or now - self._collection_version_at > COLLECTION_VERSION_TTL:
+            try:
+                self._collection_version_value = self.store.version()
+            except Exception:
+                self._collection_version_value = None
+            self._collection_version_at = now
+        return self._collection_version_value
 
     # ------------------------
-    # Build Chat Messages
+    # Context Retrieval
     # ------------------------
-    def _build_messages(self, query: str, history: List[Dict], context: Optional[str]) -> List[Dict]:
-        system_msg = (
-            "You are an expert, patient AI tutor. "
-            "Explain concepts clearly, step-by-step, and use context when available."
-        )
-        messages = [{"role": "system", "content": system_msg}]
-        if context:
-            messages.append({"role": "system", "content": f"Context:\n{context}"})
+    def _retrieve_chunks(self, query: str, k: int = 4, embedding: Optional[List[float]] = None) -> List[str]:
+        if not self.store:
+            return []
+        if embedding is None:
+            embedding = self._embed_query(query)
+        if embedding is None:
+            return []
 
-        for m in history[-8:]:
-            role = "assistant" if m.get("role") == "assistant" else "user"
-            messages.append({"role": role, "content": m.get("text", "")})
+        with metrics.stage("retrieval"):
+            version = self._collection_version()
+            results = self.query_cache.get_results(embedding, k, version) if self.query_cache else None
+            if results is None:
+                try:
+                    results = self.store.search(embedding, k=k)
+                except Exception as e:
+                    logger.warning(f"Context retrieval failed: {e}")
+                    return []
+                if self.query_cache:
+                    self.query_cache.put_results(embedding, k, version, results)
+        return [text for _, text in results]
 
-        messages.append({"role": "user", "content": query})
-        return messages
+    def _retrieve_context(self, query: str, k: int = 4, embedding: Optional[List[float]] = None) -> str:
+        return "\n\n".join(self._retrieve_chunks(query, k, embedding))
+
+    async def _aretrieve_chunks(self, query: str, k: int = 4, embedding: Optional[List[float]] = None) -> List[str]:
+        """Embed through the batching embedder, then search off the event loop."""
+        if not self.store:
+            return []
+        if embedding is None:
+            embedding = await self._aembed_query(query)
+            if embedding is None:
+                return []
+        return await asyncio.to_thread(self._retrieve_chunks, query, k, embedding)
+
+    async def aretrieve(self, query: str, k: int = 4) -> List[str]:
+        """Context chunks for `query` under the retrieval admission limit (e.g. to retrieve ahead of time)."""
+        async with admission.stage("retrieval"):
+            return await self._aretrieve_chunks(query, k)
 
     # ------------------------
-    # Extract Model Response
+    # Build Chat Messages
     # ------------------------
-    def _extract_content(self, resp) -> str:
-        try:
-            if self.provider == "groq":
-                choices = getattr(resp, "choices", None) or resp.get("choices")
-                if choices:
-                    c0 = choices[0]
-                    if hasattr(c0, "message"):
-                        return getattr(c0.message, "content", "")
-                    if isinstance(c0, dict):
-                        return c0.get("message", {}).get("content", "")
-            elif self.provider == "openai":
-                return resp.choices[0].message.content
-        except Exception:
-            pass
-        return str(resp)
+    def _build_messages(
+        self,
+        query: str,
+        history: List[Dict],
+        chunks: List[str],
+        summary: Optional[str] = None,
+        stats: Optional[Dict] = None,
+    ) -> List[Dict]:
+        info: Dict = {}
+        messages = self.packer.pack(query, chunks, history, summary=summary, stats=info)
+        logger.info(
+            f"🧮 prompt_tokens={info['prompt_tokens']}/{info['prompt_budget']} "
+            f"chunks={info['context_chunks']} (-{info['duplicate_chunks']} dup) history={info['history_turns']}"
+        )
+        if stats is not None:
+            stats.update(info)
+        return messages
 
     # ------------------------
     # Non-Streaming Answers
     # ------------------------
-    def answer_single(self, query: str) -> str:
-        context = self._retrieve_context(query)
-        messages = self._build_messages(query, history=[], context=context)
+    async def answer_single(self, query: str, stats: Optional[Dict] = None) -> str:
+        t0 = time.perf_counter()
+        async with admission.stage("retrieval"):
+            embedding = await self._aembed_query(query)
+            version = self._collection_version()
 
-        try:
-            if self.provider == "groq":
-                resp = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-            else:  # OpenAI
-                resp = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=self.temperature,
-                )
-            return self._extract_content(resp).strip()
-        except Exception as e:
-            logger.error(f"❌ Error generating answer: {e}")
-            return "Sorry, I couldn't process your request right now."
+            if embedding is not None and self.answer_cache:
+                cached = self.answer_cache.lookup(embedding, version)
+                if cached is not None:
+                    self._record_latency("hit", t0)
+                    if stats is not None:
+                        stats.update({"cache_hit": True, "prompt_tokens": 0})
+                    return cached
 
-    def answer_with_history(self, query: str, history: List[Dict]) -> str:
-        context = self._retrieve_context(query)
-        messages = self._build_messages(query, history=history, context=context)
+            chunks = await self._aretrieve_chunks(query, embedding=embedding)
+        messages = self._build_messages(query, history=[], chunks=chunks, stats=stats)
 
-        try:
-            if self.provider == "groq":
-                resp = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-            else:
-                resp = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=self.temperature,
-                )
-            return self._extract_content(resp).strip()
-        except Exception as e:
-            logger.error(f"❌ Error generating contextual answer: {e}")
-            return "I'm having trouble retrieving the information right now."
+        async with admission.stage("llm"):
+            try:
+                answer = await self.llm.complete(messages)
+            except Exception as e:
+                logger.error(f"❌ Error generating answer: {e}")
+                return "Sorry, I couldn't process your request right now."
+
+        if embedding is not None and self.answer_cache and answer:
+            self.answer_cache.store(embedding, answer, version)
+        self._record_latency("miss", t0)
+        return answer
+
+    async def answer_with_history(
+        self,
+        query: str,
+        history: List[Dict],
+        summary: Optional[str] = None,
+        stats: Optional[Dict] = None,
+    ) -> str:
+        async with admission.stage("retrieval"):
+            chunks = await self._aretrieve_chunks(query)
+        messages = self._build_messages(query, history=history, chunks=chunks, summary=summary, stats=stats)
+
+        async with admission.stage("llm"):
+            try:
+                return await self.llm.complete(messages)
+            except Exception as e:
+                logger.error(f"❌ Error generating contextual answer: {e}")
+                return "I'm having trouble retrieving the information right now."
 
     # ------------------------
-    # Streaming (Groq Only)
+    # Batch answers (question banks)
     # ------------------------
-    async def stream_answer_with_history(self, query: str, history: List[Dict]) -> AsyncGenerator[str, None]:
-        if self.provider != "groq":
-            yield self.answer_with_history(query, history)
-            return
+    async def _aembed_many(self, queries: Sequence[str]) -> List[Optional[List[float]]]:
+        """Query-cache hits, then one embedding pass for the rest; None where embedding failed."""
+        if not self.embedding:
+            return [None] * len(queries)
+        cached = [self.query_cache.get_embedding(q) if self.query_cache else None for q in queries]
+        missing = [i for i, e in enumerate(cached) if e is None]
+        if missing:
+            try:
+                with metrics.stage("embed"):
+                    vectors = await asyncio.to_thread(self.embedder.embed_many, [queries[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Batch query embedding failed: {e}")
+                return cached
+            for i, vector in zip(missing, vectors):
+                cached[i] = vector
+                if self.query_cache:
+                    self.query_cache.put_embedding(queries[i], vector)
+        return cached
 
-        context = self._retrieve_context(query)
-        messages = self._build_messages(query, history=history, context=context)
+    def _retrieve_many(self, embeddings: Sequence[Optional[List[float]]], k: int, version) -> List[List[str]]:
+        """Context chunks per embedding: result-cache hits, then one store.search_many for the rest. Blocking."""
+        results: List[Optional[List]] = [None] * len(embeddings)
+        if not self.store:
+            return [[] for _ in embeddings]
+        pending = []
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                results[i] = []
+            elif self.query_cache:
+                results[i] = self.query_cache.get_results(embedding, k, version)
+            if results[i] is None:
+                pending.append(i)
+        if pending:
+            with metrics.stage("retrieval"):
+                try:
+                    found = self.store.search_many([embeddings[i] for i in pending], k=k)
+                except Exception as e:
+                    logger.warning(f"Batch context retrieval failed: {e}")
+                    found = [[] for _ in pending]
+                else:
+                    if self.query_cache:
+                        for i, result in zip(pending, found):
+                            self.query_cache.put_results(embeddings[i], k, version, result)
+            for i, result in zip(pending, found):
+                results[i] = result
+        return [[text for _, text in result] for result in results]
 
-        loop = asyncio.get_event_loop()
+    async def retrieve_batch(self, queries: Sequence[str], k: int = 4) -> Dict:
+        """
+        The embed + retrieve phase of answer_batch, under the retrieval admission
+        stage (raises Overloaded): all questions embedded in one pass and retrieved
+        with one search_many; answer-cache hits and empty questions resolved here.
+        """
+        t0 = time.perf_counter()
+        async with admission.stage("retrieval"):
+            embeddings = await self._aembed_many(queries)
+            version = self._collection_version()
+            ready, todo = [], []
+            for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+                if not query.strip():
+                    ready.append({"index": i, "error": "Empty query"})
+                    continue
+                cached = self.answer_cache.lookup(embedding, version) if embedding is not None and self.answer_cache else None
+                if cached is not None:
+                    self._record_latency("hit", t0)
+                    ready.append({"index": i, "text": cached, "cache_hit": True, "prompt_tokens": 0})
+                else:
+                    todo.append(i)
+            chunks = await asyncio.to_thread(self._retrieve_many, [embeddings[i] for i in todo], k, version)
+        return {"started": t0, "embeddings": embeddings, "version": version, "ready": ready, "todo": todo, "chunks": chunks}
 
-        def blocking_stream():
-            return self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                stream=True,
-            )
+    async def answer_batch(
+        self, queries: Sequence[str], k: int = 4, concurrency: int = RAG_BATCH_CONCURRENCY,
+        retrieved: Optional[Dict] = None,
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Answer independent questions, yielding one result per question as each
+        completes (not in input order): {"index", "text", "cache_hit", "prompt_tokens"},
+        or {"index", "error"} for a question that failed; the others carry on.
+        - `retrieved` is retrieve_batch()'s result when the caller ran that phase first
+        - answer-cache hits come back first, without an LLM call
+        - at most `concurrency` LLM calls are in flight, each under the llm admission stage
+        """
+        if retrieved is None:
+            retrieved = await self.retrieve_batch(queries, k)
+        t0, embeddings, version = retrieved["started"], retrieved["embeddings"], retrieved["version"]
+        ready, todo, chunks = retrieved["ready"], retrieved["todo"], retrieved["chunks"]
 
-        try:
-            stream = await loop.run_in_executor(None, blocking_stream)
-            for chunk in stream:
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def answer(i: int, context: List[str]) -> Dict:
+            async with slots:
+                stats: Dict = {}
+                messages = self._build_messages(queries[i], history=[], chunks=context, stats=stats)
                 try:
-                    delta = getattr(chunk.choices[0], "delta", {}).get("content")
-                    if delta:
-                        yield delta
-                except Exception:
-                    continue
+                    async with admission.stage("llm"):
+                        text = await self.llm.complete(messages)
+                except admission.Overloaded as e:
+                    return {"index": i, "error": str(e), "busy": True, "retry_after": e.retry_after}
+                except Exception as e:
+                    logger.error(f"❌ Batch answer {i} failed: {e}")
+                    return {"index": i, "error": str(e)}
+            if embeddings[i] is not None and self.answer_cache and text:
+                self.answer_cache.store(embeddings[i], text, version)
+            self._record_latency("miss", t0)
+            return {"index": i, "text": text, "cache_hit": False, "prompt_tokens": stats.get("prompt_tokens")}
+
+        tasks = [asyncio.create_task(answer(i, context)) for i, context in zip(todo, chunks)]
+        try:
+            for result in ready:
+                yield result
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # Client went away: don't keep spending LLM calls on the rest
+            for task in tasks:
+                task.cancel()
+
+    # ------------------------
+    # Streaming
+    # ------------------------
+    async def stream_answer_with_history(
+        self,
+        query: str,
+        history: List[Dict],
+        summary: Optional[str] = None,
+        stats: Optional[Dict] = None,
+        chunks: Optional[List[str]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Stream the answer; pass `chunks` when context was already retrieved (see aretrieve)."""
+        if chunks is None:
+            chunks = await self.aretrieve(query)
+        messages = self._build_messages(query, history=history, chunks=chunks, summary=summary, stats=stats)
+
+        # The LLM slot is held for the whole stream
+        async with admission.stage("llm"):
+            try:
+                async for delta in self.llm.stream(messages):
+                    yield delta
+            except Exception as e:
+                logger.error(f"❌ Streaming failed: {e}")
+                yield "Sorry, I encountered a problem while streaming the response."
+
+    # ------------------------
+    # Rolling history summary
+    # ------------------------
+    async def summarize(self, previous: Optional[str], turns: List[Dict]) -> Optional[str]:
+        """Fold `turns` into the previous summary. Returns None on failure."""
+        try:
+            # Background work: yields to every interactive/bulk request, dropped when busy
+            async with admission.stage("llm", admission.BACKGROUND):
+                return await self.llm.complete(summary_messages(previous, turns))
         except Exception as e:
-            logger.error(f"❌ Streaming failed: {e}")
-            yield "Sorry, I encountered a problem while streaming the response."
+            logger.warning(f"History summary failed: {e}")
+            return None
+
+    # ------------------------
+    # Stats / lifecycle
+    # ------------------------
+    def _record_latency(self, kind: str, t0: float):
+        bucket = self._latency[kind]
+        bucket[0] += 1
+        bucket[1] += time.perf_counter() - t0
+
+    def cache_stats(self) -> Dict:
+        stats: Dict = {"answer": {"enabled": False}}
+        if self.answer_cache:
+            answer = {"enabled": True, **self.answer_cache.stats()}
+            for kind, (count, total) in self._latency.items():
+                answer[f"{kind}_latency_ms_avg"] = round(total / count * 1000, 2) if count else None
+            stats["answer"] = answer
+        if self.query_cache:
+            stats.update(self.query_cache.stats())
+        return stats
+
+    def embedder_stats(self) -> Dict:
+        if not self.embedder:
+            return {"enabled": False}
+        return {"enabled": True, "backend": EMBED_BACKEND, **self.embedder.stats()}
+
+    def close(self):
+        if self.embedder:
+            self.embedder.shutdown()
+        if self.query_cache:
+            self.query_cache.save()
@@ -1,15 +1,423 @@
-from collections import defaultdict
-from typing import List, Dict
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional, Tuple
 
-class SessionStore:
-    def __init__(self):
-        self.store = defaultdict(list)
+logger = logging.getLogger("sessions")
 
-    def get_history(self, session_id: str):
-        return self.store.get(session_id, [])
+# ------------------------
+# Config
+# ------------------------
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | sqlite
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite3")
+# Messages kept per session (oldest dropped first); the rolling summary covers older turns
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "100"))
+# Sessions untouched for this long are evicted (0 disables)
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(6 * 3600)))
+# Memory backend: total budget for message text, least recently used sessions go first
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", "64"))
+# How often (seconds) idle sessions are swept, piggybacked on writes
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+# Rough per-message overhead (dict, strings) on top of the text itself
+_MESSAGE_OVERHEAD = 200
+
+
+def _message_bytes(message: Dict) -> int:
+    return len(message.get("text", "")) + _MESSAGE_OVERHEAD
+
+
+class BaseSessionStore:
+    """
+    Chat history per session with a rolling summary.
+    Summary coverage is tracked by absolute message number, so it stays correct
+    while the per-session ring buffer drops old messages; get_summary() and
+    set_summary() take/return `covered` relative to get_history();
+    get_snapshot()/set_summary_at() use the absolute numbers, for writers that
+    await something (an LLM call) between reading the history and storing the summary.
+    The a*() variants are for the event loop: they run a store that does I/O
+    (`blocking`) in a worker thread.
+    """
+
+    blocking = False
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def get_snapshot(self, session_id: str) -> Tuple[List[Dict], int, Optional[str], int]:
+        """(history, offset, summary, covered) in one read; offset and covered are absolute."""
+        raise NotImplementedError
+
+    def get_context(self, session_id: str) -> Tuple[List[Dict], Optional[str], int]:
+        """(history, summary, covered) read as one consistent snapshot."""
+        history, offset, summary, covered = self.get_snapshot(session_id)
+        return history, summary, max(0, covered - offset)
 
     def append(self, session_id: str, message: Dict):
-        self.store[session_id].append(message)
+        self.append_many(session_id, [message])
+
+    def append_many(self, session_id: str, messages: List[Dict]):
+        """Store several messages (e.g. a user/assistant turn) in one write."""
+        raise NotImplementedError
+
+    def get_summary(self, session_id: str) -> Tuple[Optional[str], int]:
+        raise NotImplementedError
+
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        raise NotImplementedError
+
+    def set_summary_at(self, session_id: str, summary: str, covered: int):
+        """Store a summary covering messages [0, covered) by absolute number; a no-op
+        if the stored one already covers that far or the session is gone."""
+        raise NotImplementedError
 
     def clear(self, session_id: str):
-        self.store[session_id] = []
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {}
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(fn, *args) if self.blocking else fn(*args)
+
+    async def aget_context(self, session_id: str) -> Tuple[List[Dict], Optional[str], int]:
+        return await self._call(self.get_context, session_id)
+
+    async def aappend_many(self, session_id: str, messages: List[Dict]):
+        await self._call(self.append_many, session_id, messages)
+
+    async def aget_snapshot(self, session_id: str) -> Tuple[List[Dict], int, Optional[str], int]:
+        return await self._call(self.get_snapshot, session_id)
+
+    async def aset_summary(self, session_id: str, summary: str, covered: int):
+        await self._call(self.set_summary, session_id, summary, covered)
+
+    async def aset_summary_at(self, session_id: str, summary: str, covered: int):
+        await self._call(self.set_summary_at, session_id, summary, covered)
+
+    async def astats(self) -> Dict:
+        return await self._call(self.stats)
+
+
+# ------------------------
+# In-memory backend
+# ------------------------
+class _Session:
+    __slots__ = ("messages", "offset", "summary", "covered", "bytes", "touched")
+
+    def __init__(self, max_messages: int, start: int = 0):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.offset = start  # absolute number of the first retained message
+        self.summary: Optional[str] = None
+        self.covered = start  # absolute number of messages the summary covers
+        self.bytes = 0
+        self.touched = time.monotonic()
+
+
+class SessionStore(BaseSessionStore):
+    """
+    Process-local store: ring buffer per session, idle-TTL eviction and a global
+    byte budget enforced by evicting least recently used sessions.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        memory_bytes: int = int(SESSION_MEMORY_MB * 1024 * 1024),
+    ):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_bytes
+        self.store: "OrderedDict[str, _Session]" = OrderedDict()
+        self.bytes = 0
+        self.evicted_idle = 0
+        self.evicted_budget = 0
+        # Absolute numbers are never reused: a session created after a clear or an
+        # eviction starts above every number handed out before, so a stale fold can't land
+        self._next_seq = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        session = self.store.get(session_id)
+        if session is not None:
+            if self.idle_ttl and time.monotonic() - session.touched > self.idle_ttl:
+                self._drop(session_id)
+                self.evicted_idle += 1
+                session = None
+            else:
+                self.store.move_to_end(session_id)
+        if session is None and create:
+            session = self.store[session_id] = _Session(self.max_messages, self._next_seq)
+        return session
+
+    def _drop(self, session_id: str):
+        session = self.store.pop(session_id, None)
+        if session:
+            self.bytes -= session.bytes
+            self._next_seq = max(self._next_seq, session.offset + len(session.messages), session.covered)
+
+    def _sweep(self):
+        now = time.monotonic()
+        if self.idle_ttl and now - self._last_sweep >= SESSION_SWEEP_INTERVAL:
+            self._last_sweep = now
+            # OrderedDict is in LRU order, so idle sessions are at the front
+            while self.store:
+                session_id, session = next(iter(self.store.items()))
+                if now - session.touched <= self.idle_ttl:
+                    break
+                self._drop(session_id)
+                self.evicted_idle += 1
+        while self.bytes > self.memory_budget and len(self.store) > 1:
+            self._drop(next(iter(self.store)))
+            self.evicted_budget += 1
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            session = self._get(session_id)
+            return list(session.messages) if session else []
+
+    def get_snapshot(self, session_id: str) -> Tuple[List[Dict], int, Optional[str], int]:
+        with self._lock:
+            session = self._get(session_id)
+            if not session:
+                return [], 0, None, 0
+            return list(session.messages), session.offset, session.summary, session.covered
+
+    def append_many(self, session_id: str, messages: List[Dict]):
+        with self._lock:
+            session = self._get(session_id, create=True)
+            for message in messages:
+                if len(session.messages) == session.messages.maxlen:
+                    session.bytes -= _message_bytes(session.messages[0])
+                    self.bytes -= _message_bytes(session.messages[0])
+                    session.offset += 1
+                session.messages.append(message)
+                session.bytes += _message_bytes(message)
+                self.bytes += _message_bytes(message)
+            session.touched = time.monotonic()
+            self._sweep()
+
+    def get_summary(self, session_id: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            session = self._get(session_id)
+            if not session:
+                return None, 0
+            return session.summary, max(0, session.covered - session.offset)
+
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            session = self._get(session_id, create=True)
+            session.summary = summary
+            session.covered = session.offset + covered
+
+    def set_summary_at(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            session = self._get(session_id)
+            # A recreated session starts at or above the stale fold's position
+            if session and covered > session.covered:
+                session.summary = summary
+                session.covered = covered
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "sessions": len(self.store),
+            "bytes": self.bytes,
+            "budget_bytes": self.memory_budget,
+            "evicted_idle": self.evicted_idle,
+            "evicted_budget": self.evicted_budget,
+        }
+
+
+# ------------------------
+# SQLite backend (shared by worker processes)
+# ------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    covered INTEGER NOT NULL DEFAULT 0,
+    touched REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+-- Where new sessions start numbering: above every session swept so far
+CREATE TABLE IF NOT EXISTS seq_floor (value INTEGER NOT NULL);
+INSERT INTO seq_floor (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM seq_floor);
+"""
+
+
+_FLOOR = "(SELECT value FROM seq_floor)"
+
+
+class SqliteSessionStore(BaseSessionStore):
+    """
+    SQLite file in WAL mode so every uvicorn/gunicorn worker sees the same
+    history. A turn is one transaction: insert the messages, trim the ring,
+    touch the session. Idle sessions are swept on writes. Calls block (up to the
+    10 s busy timeout under write contention), so async code uses the a*() methods.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        idle_ttl: float = SESSION_IDLE_TTL,
+    ):
+        self.path = path
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.evicted_idle = 0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        logger.info(f"💾 Session store: sqlite {path}")
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT role, text FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [{"role": role, "text": text} for role, text in rows]
+
+    def get_snapshot(self, session_id: str) -> Tuple[List[Dict], int, Optional[str], int]:
+        with self._lock:
+            # One read transaction: a WAL snapshot, so another worker's turn can't land in between
+            self.db.execute("BEGIN")
+            try:
+                row = self.db.execute("SELECT summary, covered FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                rows = self.db.execute(
+                    "SELECT role, text FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+                ).fetchall()
+                first = self._first_seq(session_id)
+            finally:
+                self.db.execute("COMMIT")
+        history = [{"role": role, "text": text} for role, text in rows]
+        if not row:
+            return history, first, None, 0
+        return history, first, row[0], row[1]
+
+    def append_many(self, session_id: str, messages: List[Dict]):
+        now = time.time()
+        with self._lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    f"INSERT INTO sessions (id, next_seq, covered, touched) VALUES (?, {_FLOOR}, {_FLOOR}, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET touched = excluded.touched",
+                    (session_id, now),
+                )
+                (start,) = db.execute("SELECT next_seq FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                db.executemany(
+                    "INSERT INTO messages (session_id, seq, role, text) VALUES (?, ?, ?, ?)",
+                    [(session_id, start + i, m.get("role", "user"), m.get("text", "")) for i, m in enumerate(messages)],
+                )
+                end = start + len(messages)
+                db.execute("UPDATE sessions SET next_seq = ? WHERE id = ?", (end, session_id))
+                db.execute("DELETE FROM messages WHERE session_id = ? AND seq < ?", (session_id, end - self.max_messages))
+                self._sweep(now)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def _sweep(self, now: float):
+        if not self.idle_ttl or now - self._last_sweep < SESSION_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        cutoff = now - self.idle_ttl
+        self.db.execute(
+            "UPDATE seq_floor SET value = MAX(value, COALESCE((SELECT MAX(next_seq) FROM sessions WHERE touched < ?), 0))",
+            (cutoff,),
+        )
+        self.db.execute(
+            "DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE touched < ?)", (cutoff,)
+        )
+        self.evicted_idle += self.db.execute("DELETE FROM sessions WHERE touched < ?", (cutoff,)).rowcount
+
+    def _first_seq(self, session_id: str) -> int:
+        # After a clear the session has no messages; the next one starts at next_seq
+        row = self.db.execute(
+            "SELECT COALESCE((SELECT MIN(seq) FROM messages WHERE session_id = ?), "
+            f"(SELECT next_seq FROM sessions WHERE id = ?), {_FLOOR})",
+            (session_id, session_id),
+        ).fetchone()
+        return row[0]
+
+    def get_summary(self, session_id: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            row = self.db.execute("SELECT summary, covered FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if not row:
+                return None, 0
+            return row[0], max(0, row[1] - self._first_seq(session_id))
+
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            covered_abs = self._first_seq(session_id) + covered
+            self.db.execute(
+                f"INSERT INTO sessions (id, next_seq, summary, covered, touched) VALUES (?, {_FLOOR}, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, covered = excluded.covered",
+                (session_id, summary, covered_abs, time.time()),
+            )
+
+    def set_summary_at(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            # A clear moves covered to next_seq and a swept session comes back above the
+            # floor, so a fold that raced either is dropped here
+            self.db.execute(
+                "UPDATE sessions SET summary = ?, covered = ? WHERE id = ? AND covered < ?",
+                (summary, covered, session_id, covered),
+            )
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            # Keep next_seq so message numbers stay monotonic across clears
+            self.db.execute("UPDATE sessions SET summary = NULL, covered = next_seq WHERE id = ?", (session_id,))
+            self.db.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions, = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            messages, = self.db.execute("SELECT COUNT(*) FROM messages").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "messages": messages,
+            "evicted_idle": self.evicted_idle,
+        }
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> BaseSessionStore:
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    return SessionStore()
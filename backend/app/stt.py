@@ -1,29 +1,444 @@
 # app/stt.py
+import io
 import os
-from typing import Optional
+import time
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Union, BinaryIO, List, Dict, Tuple
 
-try:
-    from faster_whisper import WhisperModel
-except Exception as e:
-    raise ImportError("Please install faster-whisper: pip install faster-whisper. Error: " + str(e))
+import numpy as np
 
+from app import metrics, admission, model_client
+
+logger = logging.getLogger("stt")
+
+# ------------------------
+# Config
+# ------------------------
 # Model choice: small by default; change via WHISPER_MODEL env var
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
 # Device: "cuda" if available, else "cpu". You can override with WHISPER_DEVICE env var.
 WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cuda" if os.getenv("CUDA_VISIBLE_DEVICES") else "cpu")
+# int8 / int8_float32 keep CPU inference fast; float16 suits GPUs
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "float16" if WHISPER_DEVICE == "cuda" else "int8")
+
+# Worker pool: each worker owns one model instance with its own CPU thread budget
+STT_WORKERS = int(os.getenv("STT_WORKERS", "1"))
+STT_WORKER_MODE = os.getenv("STT_WORKER_MODE", "thread")  # thread | process (remote: MODEL_SERVER_SOCKET)
+STT_CPU_THREADS = int(os.getenv("STT_CPU_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, STT_WORKERS)))))
+
+# Short clips waiting together are encoded/decoded as one batch
+STT_BATCH_SIZE = int(os.getenv("STT_BATCH_SIZE", "8"))
+STT_BATCH_WAIT_MS = float(os.getenv("STT_BATCH_WAIT_MS", "10"))
+STT_NO_SPEECH_THRESHOLD = float(os.getenv("STT_NO_SPEECH_THRESHOLD", "0.6"))
+
+# Request classes: beam size and queue priority (lower runs first)
+BEAM_SIZES = {
+    "file": int(os.getenv("STT_BEAM_SIZE_FILE", "5")),
+    "final": int(os.getenv("STT_BEAM_SIZE_STREAM", "1")),
+    "partial": int(os.getenv("STT_BEAM_SIZE_PARTIAL", "1")),
+}
+PRIORITIES = {"final": 0, "file": 1, "partial": 2}
+
+# Whisper expects 16 kHz mono float32 when given raw samples
+WHISPER_SAMPLE_RATE = 16000
+# Clips up to one Whisper window can share a batch
+_WINDOW_S = 30.0
+
+
+def _load_model(cpu_threads: int = STT_CPU_THREADS):
+    # Imported here so the app starts (and serves non-STT routes) without faster-whisper
+    try:
+        from faster_whisper import WhisperModel
+    except Exception as e:
+        raise ImportError("Please install faster-whisper: pip install faster-whisper. Error: " + str(e))
+    return WhisperModel(
+        WHISPER_MODEL,
+        device=WHISPER_DEVICE,
+        compute_type=WHISPER_COMPUTE_TYPE,
+        cpu_threads=cpu_threads,
+        num_workers=1,
+    )
 
-# Initialize a module-level model (load once)
-_whisper_model = WhisperModel(WHISPER_MODEL, device=WHISPER_DEVICE)
 
-def transcribe_audio_file(file_path: str, language: Optional[str] = "en") -> str:
+# ------------------------
+# Inference (runs inside a worker thread or process)
+# ------------------------
+def _transcribe_one(model, audio: np.ndarray, language: Optional[str], beam_size: int,
+                    initial_prompt: Optional[str], long_form: bool) -> str:
+    if long_form:
+        segments, info = model.transcribe(audio, language=language, beam_size=beam_size, initial_prompt=initial_prompt)
+    else:
+        # VAD-closed stream segments: no long-form context, no timestamps
+        segments, info = model.transcribe(
+            audio,
+            language=language,
+            beam_size=beam_size,
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            vad_filter=False,
+        )
+    return " ".join(seg.text for seg in segments).strip()
+
+
+def _transcribe_batch(model, items: List[Tuple]) -> List[str]:
+    """
+    One encoder pass and one generate() call for several <=30 s clips that share
+    language and beam size, mirroring what faster-whisper's BatchedInferencePipeline
+    does for the chunks of a single file.
+    """
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_suppressed_tokens
+
+    _, language, beam_size, _, _ = items[0]
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language or "en")
+    features = np.stack([pad_or_trim(model.feature_extractor(audio)[..., :-1]) for audio, *_ in items])
+    prompts = [
+        model.get_prompt(tokenizer, previous_tokens=tokenizer.encode(prompt) if prompt else [], without_timestamps=True)
+        for _, _, _, prompt, _ in items
+    ]
+    results = model.model.generate(
+        model.encode(features),
+        prompts,
+        beam_size=beam_size,
+        max_length=model.max_length,
+        suppress_blank=True,
+        suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+        return_no_speech_prob=True,
+    )
+    return [
+        "" if r.no_speech_prob > STT_NO_SPEECH_THRESHOLD else tokenizer.decode(r.sequences_ids[0]).strip()
+        for r in results
+    ]
+
+
+def _run_items(model, items: List[Tuple]) -> List[str]:
+    # Batching needs the CTranslate2 model internals, not just transcribe()
+    if len(items) > 1 and hasattr(model, "feature_extractor"):
+        try:
+            return _transcribe_batch(model, items)
+        except Exception as e:
+            logger.warning(f"⚠️ Batched STT failed ({e}); transcribing clips one by one")
+    return [_transcribe_one(model, *item) for item in items]
+
+
+# Process mode: one model per child process
+_process_model = None
+
+
+def _init_process(cpu_threads: int):
+    global _process_model
+    _process_model = _load_model(cpu_threads)
+
+
+def _process_items(items: List[Tuple]) -> List[str]:
+    return _run_items(_process_model, items)
+
+
+# ------------------------
+# Pool
+# ------------------------
+class _Job:
+    __slots__ = ("audio", "language", "kind", "beam_size", "initial_prompt", "future", "enqueued_at")
+
+    def __init__(self, audio: np.ndarray, language: Optional[str], kind: str, initial_prompt: Optional[str]):
+        self.audio = audio
+        self.language = language
+        self.kind = kind
+        self.beam_size = BEAM_SIZES[kind]
+        self.initial_prompt = initial_prompt
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / WHISPER_SAMPLE_RATE
+
+    @property
+    def batchable(self) -> bool:
+        return self.duration <= _WINDOW_S
+
+    def item(self) -> Tuple:
+        return self.audio, self.language, self.beam_size, self.initial_prompt, self.kind == "file"
+
+
+class WhisperPool:
+    """
+    Fixed set of Whisper workers fed from one priority queue.
+    - each worker is a dispatcher thread that owns a model (thread mode) or a
+      single-process executor holding one (process mode); CTranslate2 releases
+      the GIL, so threads scale until cpu_threads * workers saturates the CPU
+    - a worker takes the highest-priority job, then gathers queued jobs with the
+      same language and beam size (up to STT_BATCH_SIZE, waiting STT_BATCH_WAIT_MS)
+    - submit() returns a concurrent Future; atranscribe() awaits it
+    - in remote mode (start_remote) no model loads here: each job is sent to a
+      model server, whose own pool prioritises and batches across web workers
+    """
+
+    def __init__(
+        self,
+        workers: int = STT_WORKERS,
+        mode: str = STT_WORKER_MODE,
+        cpu_threads: int = STT_CPU_THREADS,
+        batch_size: int = STT_BATCH_SIZE,
+        batch_wait_ms: float = STT_BATCH_WAIT_MS,
+    ):
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.cpu_threads = cpu_threads
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._executors: List[ProcessPoolExecutor] = []
+        self._client: Optional[model_client.ModelClient] = None
+        self._remote: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self._by_kind: Dict[str, Dict] = {
+            k: {"jobs": 0, "audio_s": 0.0, "compute_s": 0.0, "wait_s": 0.0} for k in BEAM_SIZES
+        }
+
+    @property
+    def started(self) -> bool:
+        return bool(self._threads) or self._client is not None
+
+    def start(self, model_factory=None):
+        """
+        Load the workers' models. `model_factory` (thread mode only) builds any
+        object with WhisperModel's transcribe(); used to plug in stub models.
+        """
+        if self.started:
+            return
+        t0 = time.perf_counter()
+        for i in range(self.workers):
+            if self.mode == "process" and model_factory is None:
+                executor = ProcessPoolExecutor(max_workers=1, initializer=_init_process, initargs=(self.cpu_threads,))
+                executor.submit(_process_items, []).result()  # load now, surface errors at startup
+                self._executors.append(executor)
+                runner = lambda items, ex=executor: ex.submit(_process_items, items).result()
+            else:
+                model = model_factory() if model_factory else _load_model(self.cpu_threads)
+                runner = lambda items, m=model: _run_items(m, items)
+            thread = threading.Thread(target=self._worker, args=(runner,), name=f"whisper-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(
+            f"🎤 Whisper pool ready: {self.workers} {self.mode} worker(s), model={WHISPER_MODEL}, "
+            f"compute_type={WHISPER_COMPUTE_TYPE}, cpu_threads={self.cpu_threads} ({time.perf_counter() - t0:.1f}s)"
+        )
+
+    def start_remote(self, client: "model_client.ModelClient"):
+        """Send jobs to a model server (app/model_server.py) instead of loading Whisper here."""
+        if self.started:
+            return
+        info = client.info()
+        if "stt" not in info["models"]:
+            raise RuntimeError(f"Model server at {client.path} does not serve STT")
+        self.mode = "remote"
+        self.workers = client.connections
+        self._remote = ThreadPoolExecutor(max_workers=client.connections, thread_name_prefix="whisper-remote")
+        self._client = client
+        logger.info(f"🎤 Whisper via model server {client.path} (pid {info['pid']}, {client.connections} connections)")
+
+    def shutdown(self):
+        if self._remote:
+            self._remote.shutdown(wait=False, cancel_futures=True)
+        for _ in self._threads:
+            self._queue.put((99, next(self._seq), None))
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------
+    # Submission
+    # ------------------------
+    def submit(self, audio: np.ndarray, language: Optional[str] = "en", kind: str = "file",
+               initial_prompt: Optional[str] = None) -> Future:
+        if not self.started:
+            raise RuntimeError("Whisper pool not loaded yet")
+        job = _Job(np.asarray(audio, dtype=np.float32), language, kind, initial_prompt)
+        if self._remote:
+            return self._remote.submit(self._transcribe_remote, job)
+        self._queue.put((PRIORITIES[kind], next(self._seq), job))
+        return job.future
+
+    async def atranscribe(self, audio: np.ndarray, language: Optional[str] = "en", kind: str = "file",
+                          initial_prompt: Optional[str] = None) -> str:
+        # Partials are disposable, so they queue behind everything else for a slot
+        priority = admission.BACKGROUND if kind == "partial" else None
+        async with admission.stage("stt", priority):
+            # Queue wait + inference, as the caller sees it
+            with metrics.stage("stt"):
+                return await asyncio.wrap_future(self.submit(audio, language, kind, initial_prompt))
+
+    # ------------------------
+    # Workers
+    # ------------------------
+    def _collect(self, first: _Job) -> List[_Job]:
+        batch = [first]
+        if not first.batchable or self.batch_size == 1:
+            return batch
+        deferred = []
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            job = entry[2]
+            if job is None:
+                deferred.append(entry)
+                break
+            if job.batchable and (job.language, job.beam_size) == (first.language, first.beam_size):
+                batch.append(job)
+            else:
+                deferred.append(entry)
+        for entry in deferred:
+            self._queue.put(entry)
+        return batch
+
+    def _worker(self, runner):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            batch = [j for j in self._collect(job) if j.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            with self._lock:
+                self.busy += 1
+            try:
+                texts = runner([j.item() for j in batch])
+                for j, text in zip(batch, texts):
+                    j.future.set_result(text)
+            except Exception as e:
+                for j in batch:
+                    j.future.set_exception(e)
+            finally:
+                self._record(batch, started)
+
+    def _transcribe_remote(self, job: _Job) -> str:
+        started = time.perf_counter()
+        with self._lock:
+            self.busy += 1
+        try:
+            return self._client.transcribe(job.audio, job.language, job.kind, job.initial_prompt)
+        finally:
+            self._record([job], started)
+
+    def _record(self, batch: List[_Job], started: float):
+        elapsed = time.perf_counter() - started
+        total_audio = sum(j.duration for j in batch) or 1e-9
+        with self._lock:
+            self.busy -= 1
+            self.batches += 1
+            self.batched_jobs += len(batch)
+            for j in batch:
+                s = self._by_kind[j.kind]
+                s["jobs"] += 1
+                s["audio_s"] += j.duration
+                # Batch compute time is shared in proportion to audio length
+                s["compute_s"] += elapsed * j.duration / total_audio
+                s["wait_s"] += started - j.enqueued_at
+        metrics.observe_rtf(f"stt_{batch[0].kind}", elapsed, total_audio)
+
+    # ------------------------
+    # Metrics
+    # ------------------------
+    def stats(self) -> Dict:
+        with self._lock:
+            by_kind = {}
+            for kind, s in self._by_kind.items():
+                by_kind[kind] = {
+                    "jobs": s["jobs"],
+                    "beam_size": BEAM_SIZES[kind],
+                    "audio_s": round(s["audio_s"], 2),
+                    "rtf": round(s["compute_s"] / s["audio_s"], 4) if s["audio_s"] else None,
+                    "avg_wait_ms": round(s["wait_s"] / s["jobs"] * 1000, 1) if s["jobs"] else None,
+                }
+            audio_s = sum(s["audio_s"] for s in self._by_kind.values())
+            compute_s = sum(s["compute_s"] for s in self._by_kind.values())
+            return {
+                "model": WHISPER_MODEL,
+                "device": WHISPER_DEVICE,
+                "compute_type": WHISPER_COMPUTE_TYPE,
+                "mode": self.mode,
+                "server": self._client.path if self._client else None,
+                "workers": self.workers,
+                "cpu_threads": self.cpu_threads,
+                "queue_depth": self._queue.qsize(),
+                "busy": self.busy,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_jobs / self.batches, 2) if self.batches else None,
+                "rtf": round(compute_s / audio_s, 4) if audio_s else None,
+                "by_class": by_kind,
+            }
+
+
+# Module-level pool; models load once via load() (startup warmup or first use)
+pool = WhisperPool()
+
+
+def load(model_factory=None) -> WhisperPool:
+    socket_path = model_client.remote_socket("stt")
+    if socket_path and model_factory is None:
+        pool.start_remote(model_client.connect(socket_path))
+    else:
+        pool.start(model_factory)
+    return pool
+
+
+# ------------------------
+# Public API
+# ------------------------
+def _decode(source: Union[str, BinaryIO]) -> np.ndarray:
+    from faster_whisper import decode_audio
+    return decode_audio(source, sampling_rate=WHISPER_SAMPLE_RATE)
+
+
+def transcribe_audio_file(file_path: Union[str, BinaryIO], language: Optional[str] = "en") -> str:
     """
     Transcribe audio file to text using faster-whisper.
-    Returns the transcript string.
+    Accepts a path or an in-memory file object (e.g. io.BytesIO of an upload).
+    Returns the transcript string. Blocking; prefer atranscribe_bytes() from async code.
     """
-    # faster-whisper returns segments, info
-    segments, info = _whisper_model.transcribe(file_path, language=language, beam_size=5)
-    texts = []
-    for seg in segments:
-        # segment has .text attribute
-        texts.append(seg.text)
-    return " ".join(texts).strip()
+    return pool.submit(_decode(file_path), language, "file").result()
+
+
+def transcribe_bytes(data: bytes, language: Optional[str] = "en") -> str:
+    """Transcribe an encoded audio file held in memory (no temp file)."""
+    return transcribe_audio_file(io.BytesIO(data), language=language)
+
+
+async def atranscribe_bytes(data: bytes, language: Optional[str] = "en") -> str:
+    """Decode in a worker thread, then await the pool."""
+    audio = await asyncio.to_thread(_decode, io.BytesIO(data))
+    return await pool.atranscribe(audio, language, "file")
+
+
+async def atranscribe_array(
+    samples: np.ndarray,
+    language: Optional[str] = "en",
+    kind: str = "final",
+    initial_prompt: Optional[str] = None,
+) -> str:
+    """Transcribe 16 kHz mono float32 samples already in memory (stream segments)."""
+    return await pool.atranscribe(samples, language, kind, initial_prompt)
+
+
+def shutdown():
+    pool.shutdown()
+
+
+def stats() -> Dict:
+    return pool.stats()
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, List, Tuple
+
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+try:
+    import av
+except ImportError:
+    av = None
+
+from app.stt import atranscribe_array, WHISPER_SAMPLE_RATE
+from app.components import components, ComponentNotReady, NOT_READY_RETRY_AFTER
+from app import admission
+
+logger = logging.getLogger("stt_ws")
+
+router = APIRouter()
+
+# ------------------------
+# Config
+# ------------------------
+VAD_FRAME_MS = int(os.getenv("STT_VAD_FRAME_MS", "30"))
+# Speech must last this long to open a segment, and silence this long to close it
+VAD_START_MS = int(os.getenv("STT_VAD_START_MS", "90"))
+VAD_SILENCE_MS = int(os.getenv("STT_VAD_SILENCE_MS", "500"))
+# Audio kept from before speech onset so the first syllable isn't clipped
+VAD_PREROLL_MS = int(os.getenv("STT_VAD_PREROLL_MS", "300"))
+# Frame is speech when its RMS exceeds noise_floor * ratio (and the absolute minimum)
+VAD_ENERGY_RATIO = float(os.getenv("STT_VAD_ENERGY_RATIO", "3.0"))
+VAD_MIN_RMS = float(os.getenv("STT_VAD_MIN_RMS", "0.01"))
+MAX_SEGMENT_S = float(os.getenv("STT_MAX_SEGMENT_S", "15"))
+# How often an open segment is re-transcribed for a partial result (0 disables)
+PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", "700"))
+
+
+# ------------------------
+# Voice activity detection
+# ------------------------
+class SpeechSegmenter:
+    """
+    Energy-based VAD over 16 kHz float32 samples.
+    - feed() consumes any number of samples and returns what happened, in order:
+      ("start", None) when speech begins and ("end", (audio, start_s, end_s)) when
+      a segment closes; one call may open and close several segments
+    - the noise floor adapts on non-speech frames, so a steady hum or fan does
+      not keep a segment open
+    - segments are force-closed after MAX_SEGMENT_S to bound Whisper latency
+    """
+
+    def __init__(self, sample_rate: int = WHISPER_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame = sample_rate * VAD_FRAME_MS // 1000
+        self.start_frames = max(1, VAD_START_MS // VAD_FRAME_MS)
+        self.silence_frames = max(1, VAD_SILENCE_MS // VAD_FRAME_MS)
+        self.preroll_frames = VAD_PREROLL_MS // VAD_FRAME_MS
+        self.max_frames = int(MAX_SEGMENT_S * 1000 / VAD_FRAME_MS)
+        self.noise_floor = VAD_MIN_RMS / VAD_ENERGY_RATIO
+
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._frames: List[np.ndarray] = []  # pre-roll while idle, segment while active
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._position = 0  # frames consumed
+        self._segment_start = 0
+        self.active = False
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(frame * frame)))
+        speech = rms > max(VAD_MIN_RMS, self.noise_floor * VAD_ENERGY_RATIO)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+    def feed(self, samples: np.ndarray) -> List[Tuple[str, Optional[Tuple[np.ndarray, float, float]]]]:
+        events = []
+        buf = np.concatenate([self._pending, samples]) if len(self._pending) else samples
+        n = len(buf) // self.frame
+        self._pending = buf[n * self.frame:].copy()
+
+        for i in range(n):
+            frame = buf[i * self.frame:(i + 1) * self.frame]
+            speech = self._is_speech(frame)
+            self._frames.append(frame)
+            self._position += 1
+
+            if not self.active:
+                self._voiced_run = self._voiced_run + 1 if speech else 0
+                if self._voiced_run >= self.start_frames:
+                    self.active = True
+                    events.append(("start", None))
+                    self._silent_run = 0
+                    self._segment_start = self._position - len(self._frames)
+                else:
+                    del self._frames[:-max(self.preroll_frames, self.start_frames)]
+                continue
+
+            self._silent_run = 0 if speech else self._silent_run + 1
+            if self._silent_run >= self.silence_frames or len(self._frames) >= self.max_frames:
+                events.append(("end", self._close()))
+        return events
+
+    def _close(self) -> Tuple[np.ndarray, float, float]:
+        # Drop most of the trailing silence; keep a little for word endings
+        keep = len(self._frames) - max(0, self._silent_run - self.start_frames)
+        audio = np.concatenate(self._frames[:keep])
+        start_s = self._segment_start * VAD_FRAME_MS / 1000
+        end_s = (self._segment_start + keep) * VAD_FRAME_MS / 1000
+        self._frames = []
+        self._voiced_run = self._silent_run = 0
+        self.active = False
+        return audio, start_s, end_s
+
+    def current(self) -> Optional[np.ndarray]:
+        """Audio of the open segment so far (for partial transcripts)."""
+        return np.concatenate(self._frames) if self.active and self._frames else None
+
+    def flush(self) -> Optional[Tuple[np.ndarray, float, float]]:
+        if not self.active:
+            return None
+        return self._close()
+
+
+# ------------------------
+# Decoders (client frames -> 16 kHz float32)
+# ------------------------
+class PcmDecoder:
+    """Raw little-endian 16-bit mono PCM at any rate."""
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self._odd = b""
+
+    def decode(self, data: bytes) -> np.ndarray:
+        data = self._odd + data
+        cut = len(data) - len(data) % 2
+        self._odd = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype="<i2").astype(np.float32) / 32768.0
+        if self.sample_rate == WHISPER_SAMPLE_RATE or not len(samples):
+            return samples
+        # Linear resample; adequate for speech recognition input
+        n_out = int(len(samples) * WHISPER_SAMPLE_RATE / self.sample_rate)
+        x = np.linspace(0, len(samples) - 1, n_out, dtype=np.float32)
+        return np.interp(x, np.arange(len(samples), dtype=np.float32), samples).astype(np.float32)
+
+
+class OpusDecoder:
+    """Raw Opus packets (one per message, e.g. WebCodecs AudioEncoder output)."""
+
+    def __init__(self, sample_rate: int = 48000):
+        if av is None:
+            raise ValueError("Opus input needs PyAV (pip install av)")
+        self.codec = av.CodecContext.create("opus", "r")
+        self.codec.sample_rate = sample_rate
+        self.codec.layout = "mono"
+        self.resampler = av.AudioResampler(format="flt", layout="mono", rate=WHISPER_SAMPLE_RATE)
+
+    def decode(self, data: bytes) -> np.ndarray:
+        out = []
+        for frame in self.codec.decode(av.Packet(data)):
+            for resampled in self.resampler.resample(frame):
+                out.append(resampled.to_ndarray().reshape(-1))
+        return np.concatenate(out).astype(np.float32) if out else np.zeros(0, dtype=np.float32)
+
+
+def make_decoder(fmt: str, sample_rate: int):
+    if fmt in ("pcm", "pcm_s16le"):
+        return PcmDecoder(sample_rate)
+    if fmt == "opus":
+        return OpusDecoder(sample_rate)
+    raise ValueError(f"Unsupported input format '{fmt}'. Use pcm_s16le or opus")
+
+
+# ------------------------
+# WebSocket endpoint
+# ------------------------
+@router.websocket("/ws/stt")
+async def websocket_stt(websocket: WebSocket):
+    """
+    Streaming speech-to-text.
+    - Client may first send JSON {"type": "start", "format": "pcm_s16le" | "opus",
+      "sample_rate": 16000, "language": "en"}, then binary audio frames, and
+      {"type": "stop"} to flush the last segment
+    - Server sends {"type": "speech_start"}, periodic {"type": "partial", "text"}
+      while speech is ongoing, and {"type": "final", "text", "start_ms", "end_ms",
+      "latency_ms"} when VAD closes a segment (latency measured from end of speech)
+    Audio never touches disk; segments are transcribed on the shared Whisper pool,
+    where finals outrank queued partials.
+    """
+    await websocket.accept()
+    admission.set_priority(admission.INTERACTIVE)
+    try:
+        components.check("stt")
+    except ComponentNotReady as e:
+        await websocket.send_json({"type": "error", "message": str(e), "retry_after": NOT_READY_RETRY_AFTER})
+        await websocket.close(code=1013)  # try again later
+        return
+
+    decoder = PcmDecoder(WHISPER_SAMPLE_RATE)
+    segmenter = SpeechSegmenter()
+    language = "en"
+    segment_id = 0
+    last_partial = 0.0
+    partial_task: Optional[asyncio.Task] = None
+    partials: set = set()  # partial transcriptions still running, incl. ones of closed segments
+    send_lock = asyncio.Lock()
+    # Finals are transcribed in order, one at a time, off the receive loop
+    finals: asyncio.Queue = asyncio.Queue()
+
+    async def send(msg: dict):
+        async with send_lock:
+            await websocket.send_json(msg)
+
+    async def partial(seg_id: int, audio: np.ndarray):
+        try:
+            text = await atranscribe_array(audio, language, "partial")
+            if text and seg_id == segment_id:
+                await send({"type": "partial", "segment": seg_id, "text": text})
+        except Exception as e:
+            logger.warning(f"Partial transcription failed: {e}")
+
+    async def final_worker():
+        previous = None
+        while True:
+            item = await finals.get()
+            if item is None:
+                return
+            seg_id, audio, start_s, end_s, closed_at = item
+            try:
+                # Previous final gives Whisper context across segment boundaries
+                text = await atranscribe_array(audio, language, "final", previous)
+            except admission.Overloaded as e:
+                await send({"type": "error", "segment": seg_id, "message": str(e), "busy": True,
+                            "retry_after": e.retry_after})
+                continue
+            except Exception as e:
+                logger.exception("STT stream error")
+                await send({"type": "error", "segment": seg_id, "message": f"STT failed: {e}"})
+                continue
+            previous = text or previous
+            await send({
+                "type": "final",
+                "segment": seg_id,
+                "text": text,
+                "start_ms": round(start_s * 1000),
+                "end_ms": round(end_s * 1000),
+                "latency_ms": round((time.perf_counter() - closed_at) * 1000, 1),
+            })
+
+    def close_segment(seg: Tuple[np.ndarray, float, float]):
+        nonlocal segment_id, partial_task
+        audio, start_s, end_s = seg
+        finals.put_nowait((segment_id, audio, start_s, end_s, time.perf_counter()))
+        segment_id += 1
+        partial_task = None
+
+    worker = asyncio.create_task(final_worker())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("text") is not None:
+                try:
+                    ctrl = json.loads(message["text"])
+                except ValueError:
+                    await send({"type": "error", "message": "Invalid JSON"})
+                    continue
+                if ctrl.get("type") == "start":
+                    try:
+                        decoder = make_decoder(
+                            ctrl.get("format", "pcm_s16le"),
+                            int(ctrl.get("sample_rate") or (48000 if ctrl.get("format") == "opus" else WHISPER_SAMPLE_RATE)),
+                        )
+                    except ValueError as e:
+                        await send({"type": "error", "message": str(e)})
+                        continue
+                    language = ctrl.get("language", language)
+                    await send({"type": "ready", "sample_rate": WHISPER_SAMPLE_RATE})
+                elif ctrl.get("type") == "stop":
+                    tail = segmenter.flush()
+                    if tail is not None:
+                        await send({"type": "speech_end", "segment": segment_id})
+                        close_segment(tail)
+                continue
+
+            data = message.get("bytes")
+            if not data:
+                continue
+            try:
+                samples = decoder.decode(data)
+            except Exception as e:
+                await send({"type": "error", "message": f"Could not decode audio: {e}"})
+                continue
+
+            for event, seg in segmenter.feed(samples):
+                if event == "start":
+                    await send({"type": "speech_start", "segment": segment_id})
+                else:
+                    await send({"type": "speech_end", "segment": segment_id})
+                    close_segment(seg)
+
+            now = time.perf_counter()
+            if (
+                PARTIAL_INTERVAL_MS
+                and segmenter.active
+                and (partial_task is None or partial_task.done())
+                and (now - last_partial) * 1000 >= PARTIAL_INTERVAL_MS
+            ):
+                last_partial = now
+                partial_task = asyncio.create_task(partial(segment_id, segmenter.current()))
+                partials.add(partial_task)
+                partial_task.add_done_callback(partials.discard)
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # The client is gone: segments still queued are not transcribed
+        pending = [worker, *partials]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
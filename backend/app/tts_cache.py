@@ -0,0 +1,314 @@
+import os
+import re
+import struct
+import hashlib
+import asyncio
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Dict, Iterator, AsyncIterator
+
+import numpy as np
+
+from app.utils import split_sentences
+from app.tts_registry import registry
+from app import metrics
+
+logger = logging.getLogger("tts_cache")
+
+# ------------------------
+# Config
+# ------------------------
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") == "1"
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+# Empty disables the disk tier
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+
+# Sentences of one text in flight at once (0 = one per engine instance of the model, at least 2).
+# Renders only overlap with TTS_POOL_SIZE > 1 (default 1); with one instance the window
+# still queues the next sentence so the engine never idles while one is being sent.
+TTS_PARALLEL_SENTENCES = int(os.getenv("TTS_PARALLEL_SENTENCES", "0"))
+# Threads that render sentences (shared by all requests; each blocks on a free engine instance)
+TTS_SENTENCE_THREADS = int(os.getenv("TTS_SENTENCE_THREADS", "16"))
+# Joins between sentences: short fade out/in against clicks, plus optional silence
+TTS_JOIN_FADE_MS = float(os.getenv("TTS_JOIN_FADE_MS", "5"))
+TTS_SENTENCE_GAP_MS = float(os.getenv("TTS_SENTENCE_GAP_MS", "0"))
+
+_MAGIC = b"PCM1"
+_HEADER = struct.Struct("<4sI")  # magic, sample rate
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WS_RE.sub(" ", text.strip())
+
+
+def cache_key(text: str, voice: Optional[str], model_name: str, sample_rate: int) -> str:
+    raw = "\x1f".join([normalize_text(text), voice or "", model_name, str(sample_rate)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed PCM cache with two LRU tiers, each bounded in bytes:
+    - memory: OrderedDict of key -> (pcm, sample_rate)
+    - disk:   <dir>/<key>.pcm files (small header + PCM), promoted to memory on hit
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+        disk_dir: str = TTS_CACHE_DIR,
+        disk_bytes: int = int(TTS_CACHE_DISK_MB * 1024 * 1024),
+    ):
+        self.memory_budget = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_budget = disk_bytes
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[bytes, int]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> file size
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        if self.disk_dir:
+            self._scan_disk()
+
+    # ------------------------
+    # Disk tier
+    # ------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pcm")
+
+    def _scan_disk(self):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pcm"):
+                    st = os.stat(os.path.join(self.disk_dir, name))
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"⚠️ TTS disk cache disabled ({self.disk_dir}): {e}")
+            self.disk_dir = ""
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_budget and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, int]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                magic, sample_rate = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    return None
+                pcm = f.read()
+            os.utime(self._path(key))
+            return pcm, sample_rate
+        except (OSError, struct.error):
+            return None
+
+    def _write_disk(self, key: str, pcm: bytes, sample_rate: int):
+        path = self._path(key)
+        tmp = None
+        try:
+            # Own temp file: other workers (and threads) may be writing the same sentence
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, sample_rate))
+                f.write(pcm)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"TTS cache write failed: {e}")
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        size = _HEADER.size + len(pcm)
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    # ------------------------
+    # Memory tier
+    # ------------------------
+    def _put_memory(self, key: str, pcm: bytes, sample_rate: int):
+        if len(pcm) > self.memory_budget:
+            return
+        old = self._mem.pop(key, None)
+        if old:
+            self._mem_bytes -= len(old[0])
+        self._mem[key] = (pcm, sample_rate)
+        self._mem_bytes += len(pcm)
+        while self._mem_bytes > self.memory_budget and self._mem:
+            _, (evicted, _) = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def get(self, key: str) -> Optional[Tuple[bytes, int]]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit:
+                self._mem.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += len(hit[0])
+                return hit
+            on_disk = self.disk_dir and key in self._disk
+        if on_disk:
+            hit = self._read_disk(key)
+            if hit:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._put_memory(key, *hit)
+                    self.disk_hits += 1
+                    self.bytes_saved += len(hit[0])
+                return hit
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, pcm: bytes, sample_rate: int):
+        with self._lock:
+            self._put_memory(key, pcm, sample_rate)
+        if self.disk_dir:
+            self._write_disk(key, pcm, sample_rate)
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_bytes": self._mem_bytes,
+            "memory_entries": len(self._mem),
+            "disk_bytes": self._disk_bytes,
+            "disk_entries": len(self._disk),
+        }
+
+
+cache = TTSCache() if TTS_CACHE_ENABLED else None
+
+
+_executor = ThreadPoolExecutor(max_workers=max(1, TTS_SENTENCE_THREADS), thread_name_prefix="tts-sentence")
+
+
+def _render(pool, sentence: str, voice: Optional[str]) -> Tuple[bytes, int]:
+    # pyttsx3 only learns its rate on the first render; keys need the real one
+    if cache is None or not pool.sample_rate:
+        return pool.synthesize(sentence, voice)
+    key = cache_key(sentence, voice, pool.model_name, pool.sample_rate)
+    hit = cache.get(key)
+    if hit is None:
+        hit = pool.synthesize(sentence, voice)
+        cache.put(key, *hit)
+    return hit
+
+
+def _join_edges(pcm: bytes, sample_rate: int, first: bool, last: bool) -> bytes:
+    """Fade a sentence's inner edges and pad the silence gap, so adjacent sentences join cleanly."""
+    fade = int(sample_rate * TTS_JOIN_FADE_MS / 1000)
+    gap = b"" if last else b"\x00\x00" * int(sample_rate * TTS_SENTENCE_GAP_MS / 1000)
+    if fade <= 0 or (first and last):
+        return pcm + gap
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    fade = min(fade, len(samples) // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        if not first:
+            samples[:fade] *= ramp
+        if not last:
+            samples[-fade:] *= ramp[::-1]
+    return samples.astype("<i2").tobytes() + gap
+
+
+def parallel_sentences(model_name: Optional[str] = None) -> int:
+    """How many sentences of one text are in flight at once (extra ones wait for an engine instance)."""
+    return max(1, TTS_PARALLEL_SENTENCES or max(2, registry.get(model_name).size))
+
+
+def iter_synthesized(text: str, voice: Optional[str] = None, model_name: Optional[str] = None) -> Iterator[Tuple[bytes, int]]:
+    """
+    Yield (pcm, sample_rate) per sentence of `text`, in order, as each is ready.
+    Up to parallel_sentences() sentences are in flight and render at once on
+    separate engine instances, so a long answer takes about 1/N of the sequential
+    time (N = TTS_POOL_SIZE) and the first sentence can be played immediately.
+    Sentences heard before come from the cache. Blocking.
+    """
+    pool = registry.get(model_name)
+    sentences = split_sentences(text) or [text]
+    window = parallel_sentences(model_name)
+    pending: deque = deque()
+    upcoming = iter(sentences)
+
+    def submit():
+        sentence = next(upcoming, None)
+        if sentence is not None:
+            pending.append(_executor.submit(_render, pool, sentence, voice))
+
+    for _ in range(window):
+        submit()
+    index = 0
+    try:
+        while pending:
+            pcm, sample_rate = pending.popleft().result()
+            submit()
+            yield _join_edges(pcm, sample_rate, index == 0, index == len(sentences) - 1), sample_rate
+            index += 1
+    finally:
+        # Consumer went away (e.g. client disconnected): drop renders not yet started
+        for future in pending:
+            future.cancel()
+
+
+async def aiter_synthesized(text: str, voice: Optional[str] = None, model_name: Optional[str] = None) -> AsyncIterator[Tuple[bytes, int]]:
+    """iter_synthesized for the event loop: each sentence is awaited in a worker thread."""
+    parts = iter_synthesized(text, voice, model_name)
+    try:
+        while (part := await asyncio.to_thread(next, parts, None)) is not None:
+            yield part
+    finally:
+        try:
+            parts.close()
+        except ValueError:
+            # Cancelled mid-sentence: the generator is still running in its thread
+            # and finishes that sentence (into the cache) on its own
+            pass
+
+
+def synthesize_cached(text: str, voice: Optional[str] = None, model_name: Optional[str] = None) -> Tuple[bytes, int]:
+    """
+    Synthesize `text` sentence by sentence (in parallel, see iter_synthesized)
+    through the cache, so answers that partially repeat earlier ones only render
+    their new sentences. Returns concatenated mono 16-bit PCM and its sample rate.
+    Blocking.
+    """
+    with metrics.stage("tts"):
+        parts = list(iter_synthesized(text, voice, model_name))
+    return b"".join(pcm for pcm, _ in parts), parts[0][1]
+
+
+def stats() -> Dict:
+    return cache.stats() if cache else {"enabled": False}
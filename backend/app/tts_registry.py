@@ -0,0 +1,348 @@
+import os
+import io
+import time
+import uuid
+import wave
+import queue
+import logging
+import tempfile
+import threading
+import importlib.util
+from contextlib import contextmanager
+from typing import Optional, Tuple, Dict, List
+
+from app import metrics, model_client
+
+logger = logging.getLogger("tts_registry")
+
+# Coqui TTS (pulls in torch) and the pyttsx3 fallback are imported when a model
+# is first loaded, not at import time
+_coqui_available = importlib.util.find_spec("TTS") is not None
+_pyttsx3_available = importlib.util.find_spec("pyttsx3") is not None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ------------------------
+# Config
+# ------------------------
+DEFAULT_MODEL = os.getenv("COQUI_TTS_MODEL") or os.getenv("COQUI_MODEL") or "tts_models/en/vctk/vits"
+# Extra models to preload, comma separated (the default model is always included)
+EXTRA_MODELS = [m.strip() for m in os.getenv("COQUI_TTS_MODELS", "").split(",") if m.strip()]
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "1"))
+# torch intra-op threads for Coqui, so instances rendering sentences in parallel don't
+# oversubscribe the CPU (torch's default per op is all cores). torch.set_num_threads is
+# process-wide: it also throttles a torch embedder in the same process. Hence 0 = cores /
+# TTS_POOL_SIZE only where TTS is the sole model (STT and embeddings on a model server),
+# else torch's default; an explicit value is always applied.
+TTS_TORCH_THREADS = int(os.getenv("TTS_TORCH_THREADS", "0"))
+TTS_ACQUIRE_TIMEOUT = float(os.getenv("TTS_ACQUIRE_TIMEOUT", "30"))
+TTS_WARMUP_TEXT = os.getenv("TTS_WARMUP_TEXT", "Hello.")
+
+PYTTSX3_MODEL = "pyttsx3"
+
+
+def _rss_mb() -> Optional[float]:
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int, channels: int = 1) -> bytes:
+    """Wrap mono 16-bit PCM in a WAV container, in memory."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+# ------------------------
+# Engines
+# ------------------------
+class CoquiEngine:
+    def __init__(self, model_name: str):
+        from TTS.api import TTS as CoquiTTS
+
+        self.model_name = model_name
+        try:
+            # Try with phonemes (default)
+            self.tts = CoquiTTS(model_name=model_name)
+        except Exception as e:
+            logger.warning(f"[TTS] failed with phonemes: {e}; retrying with use_phonemes=False")
+            self.tts = CoquiTTS(model_name=model_name, progress_bar=False, gpu=False)
+            # Force-disable phonemes if supported by API
+            if hasattr(self.tts, "use_phonemes"):
+                self.tts.use_phonemes = False
+
+    @property
+    def speakers(self) -> List[str]:
+        return list(getattr(self.tts, "speakers", None) or [])
+
+    @property
+    def sample_rate(self) -> int:
+        return self.tts.synthesizer.output_sample_rate
+
+    def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+        speakers = self.speakers
+        if voice and speakers and voice not in speakers:
+            raise ValueError(f"Invalid voice. Available voices include: {speakers[:5]}...")
+        if not voice and speakers:
+            voice = speakers[0]
+        wav = self.tts.tts(text=text, speaker=voice)
+        samples = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+        return (samples * 32767).astype("<i2").tobytes(), self.sample_rate
+
+
+class Pyttsx3Engine:
+    model_name = PYTTSX3_MODEL
+    sample_rate = 0  # read from the WAV header of each render (0 until the first one)
+
+    def __init__(self):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        self._voices = {v.name.lower(): v.id for v in (self.engine.getProperty("voices") or [])}
+        self._default_voice = self.engine.getProperty("voice")
+
+    @property
+    def speakers(self) -> List[str]:
+        return list(self._voices)
+
+    def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+        voice_id = self._default_voice
+        if voice:
+            for name, vid in self._voices.items():
+                if voice.lower() in name:
+                    voice_id = vid
+                    break
+        self.engine.setProperty("voice", voice_id)
+        # pyttsx3 can only render to a file
+        out_path = os.path.join(tempfile.gettempdir(), f"tts_{uuid.uuid4().hex}.wav")
+        try:
+            self.engine.save_to_file(text, out_path)
+            self.engine.runAndWait()
+            with wave.open(out_path, "rb") as w:
+                self.sample_rate = w.getframerate()
+                return w.readframes(w.getnframes()), self.sample_rate
+        finally:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+
+
+class RemoteEngine:
+    """Proxy for a model loaded in a model server (app/model_server.py); PCM comes back via shared memory."""
+
+    def __init__(self, client: "model_client.ModelClient", model_name: str, spec: Dict):
+        self.client = client
+        self.model_name = model_name
+        self.sample_rate = spec["sample_rate"]
+        self.speakers = spec["speakers"]
+
+    def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+        return self.client.synthesize(text, voice, self.model_name)
+
+
+class EnginePool:
+    """
+    A fixed set of instances of one model. Each instance serves one request at a
+    time; callers block (up to TTS_ACQUIRE_TIMEOUT) until one is free.
+    """
+
+    def __init__(self, model_name: str, factory, size: int):
+        self.model_name = model_name
+        self.size = size
+        self._idle: "queue.Queue" = queue.Queue()
+        self.instances = []
+        self.load_time_s = 0.0
+        self.warmup_s = None
+        self.memory_mb = None
+        self.inferences = 0
+        self.inference_s = 0.0
+
+        rss_before = _rss_mb()
+        t0 = time.perf_counter()
+        for _ in range(size):
+            engine = factory()
+            self.instances.append(engine)
+            self._idle.put(engine)
+        self.load_time_s = time.perf_counter() - t0
+        rss_after = _rss_mb()
+        if rss_before is not None and rss_after is not None:
+            self.memory_mb = round(rss_after - rss_before, 1)
+
+    @property
+    def speakers(self) -> List[str]:
+        return self.instances[0].speakers if self.instances else []
+
+    @property
+    def sample_rate(self) -> int:
+        return self.instances[0].sample_rate if self.instances else 0
+
+    @contextmanager
+    def acquire(self, timeout: float = TTS_ACQUIRE_TIMEOUT):
+        try:
+            engine = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"TTS model {self.model_name} busy (no free instance after {timeout}s)")
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+    def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+        with self.acquire() as engine:
+            t0 = time.perf_counter()
+            try:
+                pcm, sample_rate = engine.synthesize(text, voice)
+                metrics.observe_rtf("tts", time.perf_counter() - t0, len(pcm) / 2 / sample_rate if sample_rate else 0)
+                return pcm, sample_rate
+            finally:
+                self.inferences += 1
+                self.inference_s += time.perf_counter() - t0
+
+    def warmup(self, text: str = TTS_WARMUP_TEXT):
+        t0 = time.perf_counter()
+        for engine in self.instances:
+            engine.synthesize(text)
+        self.warmup_s = time.perf_counter() - t0
+
+    def stats(self) -> Dict:
+        return {
+            "instances": self.size,
+            "idle": self._idle.qsize(),
+            "load_time_s": round(self.load_time_s, 3),
+            "warmup_s": round(self.warmup_s, 3) if self.warmup_s is not None else None,
+            "memory_mb": self.memory_mb,
+            "inferences": self.inferences,
+            "avg_inference_s": round(self.inference_s / self.inferences, 3) if self.inferences else None,
+        }
+
+
+class TTSRegistry:
+    """
+    Process-wide registry of loaded TTS models shared by /tts and /ws/tts.
+    Each model is loaded once (TTS_POOL_SIZE instances) and reused; if Coqui is
+    unavailable or fails to load, requests fall back to a single pyttsx3 engine.
+    """
+
+    def __init__(self, default_model: str = DEFAULT_MODEL, pool_size: int = TTS_POOL_SIZE):
+        self.default_model = default_model
+        self.pool_size = pool_size
+        self._pools: Dict[str, EnginePool] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Set by the loader when no STT/embedding models share this process (see TTS_TORCH_THREADS)
+        self.dedicated = False
+
+    def _torch_threads(self) -> int:
+        if TTS_TORCH_THREADS:
+            return TTS_TORCH_THREADS
+        if self.dedicated and self.pool_size > 1:
+            return max(1, (os.cpu_count() or 1) // self.pool_size)
+        return 0
+
+    def _load(self, model_name: str) -> EnginePool:
+        if model_name == PYTTSX3_MODEL:
+            if not _pyttsx3_available:
+                raise RuntimeError("pyttsx3 not installed")
+            return EnginePool(model_name, Pyttsx3Engine, 1)
+        if not _coqui_available:
+            raise RuntimeError("Coqui TTS not installed")
+        threads = self._torch_threads()
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+            logger.info(f"🧵 torch intra-op threads set to {threads} for this process")
+        return EnginePool(model_name, lambda: CoquiEngine(model_name), self.pool_size)
+
+    def register(self, model_name: str, factory, size: int = 1) -> EnginePool:
+        """Load `size` instances from `factory` under `model_name` (e.g. a custom or stub engine)."""
+        with self._lock:
+            self._pools[model_name] = EnginePool(model_name, factory, size)
+            self._errors.pop(model_name, None)
+        return self._pools[model_name]
+
+    def get(self, model_name: Optional[str] = None) -> EnginePool:
+        """Return the pool for `model_name`, loading it on first use, else the pyttsx3 fallback."""
+        model_name = model_name or self.default_model
+        for name in (model_name, PYTTSX3_MODEL):
+            pool = self._pools.get(name)
+            if pool:
+                return pool
+            if name in self._errors:
+                continue
+            with self._lock:
+                if name not in self._pools and name not in self._errors:
+                    try:
+                        self._pools[name] = self._load(name)
+                        logger.info(f"🔊 Loaded TTS model {name}: {self._pools[name].stats()}")
+                    except Exception as e:
+                        logger.warning(f"[TTS] Could not load {name}: {e}")
+                        self._errors[name] = str(e)
+            if name in self._pools:
+                return self._pools[name]
+        raise RuntimeError("❌ No TTS backend available. Install Coqui TTS (`pip install TTS`) or pyttsx3.")
+
+    def load_all(self, warmup: bool = True) -> "TTSRegistry":
+        """
+        Load the default and extra models and warm each with a dummy utterance.
+        Raises if not even the fallback engine can be loaded.
+        """
+        self.get(self.default_model)
+        for name in dict.fromkeys([self.default_model, *EXTRA_MODELS]):
+            try:
+                pool = self.get(name)
+                if warmup and pool.warmup_s is None:
+                    pool.warmup()
+            except Exception as e:
+                logger.warning(f"[TTS] Warmup failed for {name}: {e}")
+        return self
+
+    def load_remote(self, client: "model_client.ModelClient") -> "TTSRegistry":
+        """Register proxies for the models a model server has loaded (one per client connection)."""
+        info = client.info()
+        if "tts" not in info["models"]:
+            raise RuntimeError(f"Model server at {client.path} does not serve TTS")
+        for name in dict.fromkeys([self.default_model, *EXTRA_MODELS]):
+            spec = info["tts"].get(name)
+            if spec is None:
+                logger.warning(f"[TTS] Model server has no {name}")
+                continue
+            self.register(name, lambda name=name, spec=spec: RemoteEngine(client, name, spec), client.connections)
+        if self.default_model not in self._pools:
+            raise RuntimeError(f"Model server at {client.path} has no TTS model {self.default_model}")
+        logger.info(f"🔊 TTS via model server {client.path} (pid {info['pid']}): {', '.join(self._pools)}")
+        return self
+
+    def synthesize(self, text: str, voice: Optional[str] = None, model_name: Optional[str] = None) -> Tuple[bytes, int]:
+        return self.get(model_name).synthesize(text, voice)
+
+    def stats(self) -> Dict:
+        return {
+            "default_model": self.default_model,
+            "models": {name: pool.stats() for name, pool in self._pools.items()},
+            "errors": dict(self._errors),
+        }
+
+
+registry = TTSRegistry()
+
+
+def load() -> TTSRegistry:
+    """Component loader: the models in this process, or proxies to a model server (MODEL_SERVER_SOCKET)."""
+    socket_path = model_client.remote_socket("tts")
+    if socket_path:
+        return registry.load_remote(model_client.connect(socket_path))
+    registry.dedicated = all(model_client.remote_socket(m) for m in ("stt", "embed"))
+    return registry.load_all()
@@ -1,54 +1,154 @@
-import os
-import uuid
-import tempfile
+import time
 import asyncio
-from fastapi import APIRouter, WebSocket
+from contextlib import aclosing
+from typing import Optional, Tuple
 
-# Try Coqui TTS
-try:
-    from TTS.api import TTS as CoquiTTS
-    _coqui_available = True
-except Exception:
-    _coqui_available = False
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-# Fallback to pyttsx3
-try:
-    import pyttsx3
-    _pyttsx3_available = True
-except Exception:
-    _pyttsx3_available = False
+from app.utils import SentenceSplitter
+from app.tts_cache import synthesize_cached, aiter_synthesized, parallel_sentences
+from app.audio import negotiate_format, iter_audio, iter_pcm, wav_stream_header, STREAMABLE_FORMATS
+from app.components import components, ComponentNotReady
+from app import metrics, admission
+from app.ws_framing import Framing
 
 
 router = APIRouter()
 
-# Initialize Coqui model once
-coqui_tts = None
-if _coqui_available:
-    model_name = os.getenv("COQUI_TTS_MODEL", "tts_models/en/vctk/vits")
-    try:
-        # Try with phonemes (default)
-        coqui_tts = CoquiTTS(model_name=model_name)
-    except Exception as e:
-        print(f"[TTS] Warning: failed with phonemes: {e}")
-        print("[TTS] Retrying with use_phonemes=False ...")
+
+def synthesize_pcm(text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+    """
+    Synthesize `text` to mono 16-bit PCM with the shared registry model, reusing
+    cached audio for sentences heard before. Returns (pcm_bytes, sample_rate).
+    Blocking; call from a worker thread.
+    """
+    return synthesize_cached(text, voice)
+
+
+class SpeechPipeline:
+    """
+    Sentence-pipelined speech for a streamed answer.
+    - feed() takes LLM deltas; every completed sentence is queued for synthesis
+      while generation continues
+    - up to parallel_sentences() queued sentences are in flight (rendering at once
+      on separate TTS engine instances), and a sender task sends them in order, per sentence an
+      {"type": "audio", ...} header followed by binary frames in `audio_format`
+    Sends go through `send_lock` so audio frames never split a header/frame pair
+    when interleaved with token messages on the same socket, and through
+    `framing` (see app/ws_framing.py) when the socket negotiated one.
+    """
+
+    def __init__(self, websocket: WebSocket, send_lock: asyncio.Lock, voice: Optional[str] = None,
+                 started_at: Optional[float] = None, audio_format: str = "pcm", framing: Optional[Framing] = None):
+        self.websocket = websocket
+        self.send_lock = send_lock
+        self.framing = framing or Framing(websocket)
+        self.voice = voice
+        self.audio_format = audio_format
+        self.started_at = started_at or time.perf_counter()
+        self.first_audio_ms: Optional[float] = None
+        self.sentences = 0
+        self._splitter = SentenceSplitter()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._rendering = asyncio.Semaphore(parallel_sentences())
+        self._task = asyncio.create_task(self._run())
+
+    def feed(self, text: str):
+        for sentence in self._splitter.feed(text):
+            self._queue.put_nowait(sentence)
+
+    async def finish(self):
+        tail = self._splitter.flush()
+        if tail:
+            self._queue.put_nowait(tail)
+        self._queue.put_nowait(None)
+        await self._task
+
+    def cancel(self):
+        self._task.cancel()
+
+    def _render(self, sentence: str):
+        pcm, sample_rate = synthesize_pcm(sentence, self.voice)
+        return [bytes(f) for f in iter_audio(pcm, sample_rate, self.audio_format)], sample_rate
+
+    async def _synthesize(self, sentence: str):
+        async with self._rendering, admission.stage("tts"):
+            return await asyncio.to_thread(self._render, sentence)
+
+    async def _run(self):
+        # Render tasks in sentence order; _rendering bounds how many run at once
+        renders: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.create_task(self._send_in_order(renders))
         try:
-            coqui_tts = CoquiTTS(model_name=model_name, progress_bar=False, gpu=False)
-            # Force-disable phonemes if supported by API
-            if hasattr(coqui_tts, "use_phonemes"):
-                coqui_tts.use_phonemes = False
-        except Exception as e2:
-            print(f"[TTS] Coqui TTS completely failed: {e2}")
-            coqui_tts = None
+            while (sentence := await self._queue.get()) is not None:
+                renders.put_nowait((sentence, asyncio.create_task(self._synthesize(sentence))))
+            renders.put_nowait(None)
+            await sender
+        finally:
+            sender.cancel()
+            while not renders.empty():
+                item = renders.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+    async def _send_in_order(self, renders: asyncio.Queue):
+        seq = 0
+        while (item := await renders.get()) is not None:
+            sentence, render = item
+            try:
+                frames, sample_rate = await render
+            except Exception as e:
+                async with self.send_lock:
+                    await self.framing.send({"type": "audio_error", "seq": seq, "message": str(e)})
+                seq += 1
+                continue
+
+            async with self.send_lock:
+                await self.framing.send({
+                    "type": "audio",
+                    "seq": seq,
+                    "text": sentence,
+                    "format": "pcm_s16le" if self.audio_format == "pcm" else self.audio_format,
+                    "sample_rate": sample_rate,
+                    "bytes": sum(len(f) for f in frames),
+                })
+                with metrics.stage("ws_send"):
+                    for frame in frames:
+                        await self.framing.send_audio(frame)
+                if self.first_audio_ms is None:
+                    self.first_audio_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+            seq += 1
+        self.sentences = seq
+
+
+async def _send_sentences(websocket: WebSocket, text: str, voice: Optional[str], fmt: str) -> int:
+    """Send wav/pcm sentence by sentence as each is rendered; returns the sample rate."""
+    sample_rate = 0
+    async with aclosing(aiter_synthesized(text, voice)) as parts:
+        async for pcm, rate in parts:
+            with metrics.stage("ws_send"):
+                if fmt == "wav" and not sample_rate:
+                    await websocket.send_bytes(wav_stream_header(rate))
+                for frame in iter_pcm(pcm):
+                    await websocket.send_bytes(bytes(frame))
+            sample_rate = rate
+    return sample_rate
 
 
 @router.websocket("/ws/tts")
 async def websocket_tts(websocket: WebSocket):
     """
     WebSocket endpoint for real-time TTS.
-    - Client sends JSON: {"text": "...", "voice": "..."}
-    - Server responds with audio bytes in small chunks.
+    - Client sends JSON: {"text": "...", "voice": "...", "format": "wav", "stream": false}
+      (format: wav | pcm | opus | mp3)
+    - pcm, and wav with "stream": true (header without a length), are sent
+      sentence by sentence as soon as each is rendered; other formats once the
+      whole text is
+    - Server responds with audio bytes in small chunks; compressed formats are
+      chunked on Ogg page / MP3 frame boundaries so each message is decodable.
     """
     await websocket.accept()
+    admission.set_priority(admission.INTERACTIVE)
     try:
         while True:
             data = await websocket.receive_json()
@@ -59,33 +159,46 @@ async def websocket_tts(websocket: WebSocket):
                 await websocket.send_json({"error": "Empty text"})
                 continue
 
-            # Generate audio file
-            out_path = os.path.join(tempfile.gettempdir(), f"tts_{uuid.uuid4().hex}.wav")
-
-            if _coqui_available and coqui_tts:
-                try:
-                    coqui_tts.tts_to_file(text=text, speaker=voice, file_path=out_path)
-                except Exception as e:
-                    await websocket.send_json({"error": f"TTS failed: {str(e)}"})
-                    continue
-
-            elif _pyttsx3_available:
-                engine = pyttsx3.init()
-                engine.save_to_file(text, out_path)
-                engine.runAndWait()
-            else:
-                await websocket.send_json({"error": "No TTS backend installed"})
+            try:
+                fmt = negotiate_format(data.get("format"))
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+
+            try:
+                components.check("tts")
+            except ComponentNotReady as e:
+                await websocket.send_json({"error": str(e)})
+                continue
+
+            timings = metrics.start_timings()
+            streamed = fmt == "pcm" or (fmt in STREAMABLE_FORMATS and data.get("stream"))
+            try:
+                async with admission.stage("tts"):
+                    if streamed:
+                        sample_rate = await _send_sentences(websocket, text, voice, fmt)
+                    else:
+                        pcm, sample_rate = await asyncio.to_thread(synthesize_pcm, text, voice)
+                if not streamed:
+                    frames = await asyncio.to_thread(lambda: [bytes(f) for f in iter_audio(pcm, sample_rate, fmt)])
+            except admission.Overloaded as e:
+                await websocket.send_json({"error": str(e), "busy": True, "retry_after": e.retry_after})
+                continue
+            except Exception as e:
+                await websocket.send_json({"error": f"TTS failed: {str(e)}"})
                 continue
 
-            # Stream file back in chunks
-            with open(out_path, "rb") as f:
-                while chunk := f.read(4096):
-                    await websocket.send_bytes(chunk)
+            if not streamed:
+                # Stream audio back in chunks, straight from memory
+                with metrics.stage("ws_send"):
+                    for frame in frames:
+                        await websocket.send_bytes(frame)
 
             # Notify end of audio
-            await websocket.send_json({"event": "end"})
-            os.remove(out_path)
+            await websocket.send_json({"event": "end", "format": fmt, "sample_rate": sample_rate, "timings_ms": timings})
 
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         await websocket.send_json({"error": str(e)})
         await websocket.close()
@@ -18,3 +18,47 @@ def pick_emotion(text: str) -> str:
                 return emotion
     # fallback random soft emotion or neutral
     return random.choice(["neutral","explaining"])
+
+
+# ------------------------
+# Sentence splitting (for sentence-level TTS)
+# ------------------------
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;:])[\"')\]]*\s+|\n+")
+# Fragments shorter than this are merged into the next sentence ("e.g.", "1.", ...)
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS) -> list:
+    splitter = SentenceSplitter(min_chars)
+    sentences = splitter.feed(text)
+    tail = splitter.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+class SentenceSplitter:
+    """
+    Incremental sentence splitter for streamed LLM output.
+    feed() returns the sentences completed by the new text; flush() returns the rest.
+    """
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buf = ""
+
+    def feed(self, text: str) -> list:
+        self.buf += text
+        out = []
+        start = 0
+        for m in _SENTENCE_END_RE.finditer(self.buf):
+            candidate = self.buf[start:m.end()].strip()
+            if len(candidate) >= self.min_chars:
+                out.append(candidate)
+                start = m.end()
+        self.buf = self.buf[start:]
+        return out
+
+    def flush(self) -> str:
+        tail, self.buf = self.buf.strip(), ""
+        return tail
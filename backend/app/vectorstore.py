@@ -0,0 +1,453 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import List, Tuple, Optional, Sequence, Any, Iterable
+
+import numpy as np
+
+from app.cache import read_collection_stamp
+
+logger = logging.getLogger("vectorstore")
+
+# ------------------------
+# Config
+# ------------------------
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" | "mmap"
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+
+# Rows scored per NumPy block; bounds the temporary float32 copy for int8 indexes.
+_SCAN_BLOCK = 65536
+
+# (chunk id, text) pairs, best match first
+SearchResult = List[Tuple[Optional[str], str]]
+
+
+class VectorStore:
+    """
+    Minimal interface RagService retrieves through.
+    """
+
+    name = "base"
+
+    def search(self, embedding: Sequence[float], k: int = 4) -> SearchResult:
+        raise NotImplementedError
+
+    def search_many(self, embeddings: Sequence[Sequence[float]], k: int = 4) -> List[SearchResult]:
+        return [self.search(e, k) for e in embeddings]
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def sample(self, n: int) -> Tuple[List[str], np.ndarray]:
+        """Up to `n` stored texts with their stored embeddings (for compatibility checks)."""
+        raise NotImplementedError
+
+    def version(self) -> Any:
+        """Opaque value that changes whenever the stored documents change."""
+        return self.count()
+
+
+# ------------------------
+# Chroma (LangChain) backend
+# ------------------------
+class ChromaVectorStore(VectorStore):
+    name = "chroma"
+
+    def __init__(self, db, chroma_dir: str):
+        self.db = db
+        self.chroma_dir = chroma_dir
+
+    def search(self, embedding: Sequence[float], k: int = 4) -> SearchResult:
+        docs = self.db.similarity_search_by_vector([float(x) for x in embedding], k=k)
+        return [(getattr(d, "id", None), d.page_content) for d in docs if getattr(d, "page_content", None)]
+
+    def search_many(self, embeddings: Sequence[Sequence[float]], k: int = 4) -> List[SearchResult]:
+        # One collection query for the whole batch instead of one per embedding
+        if not len(embeddings):
+            return []
+        res = self.db._collection.query(
+            query_embeddings=[[float(x) for x in e] for e in embeddings], n_results=k, include=["documents"]
+        )
+        return [
+            [(i, doc) for i, doc in zip(ids, docs) if doc]
+            for ids, docs in zip(res["ids"], res["documents"])
+        ]
+
+    def count(self) -> int:
+        return self.db._collection.count()
+
+    def sample(self, n: int) -> Tuple[List[str], np.ndarray]:
+        page = self.db._collection.get(include=["embeddings", "documents"], limit=n)
+        keep = [i for i, d in enumerate(page["documents"]) if d]
+        return [page["documents"][i] for i in keep], np.asarray([page["embeddings"][i] for i in keep], dtype=np.float32)
+
+    def version(self) -> Any:
+        return (self.count(), read_collection_stamp(self.chroma_dir))
+
+
+# ------------------------
+# Memory-mapped NumPy backend
+# ------------------------
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    idx = np.argpartition(-scores, k)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def _write_blob(path: str, items: List[str]):
+    """Store strings as one UTF-8 blob plus an offsets array (both mmap-able)."""
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded]) if encoded else []
+    with open(f"{path}.bin.tmp", "wb") as f:
+        for b in encoded:
+            f.write(b)
+    _save_npy(f"{path}.offsets.npy", offsets)
+    os.replace(f"{path}.bin.tmp", f"{path}.bin")
+
+
+def _save_npy(path: str, arr: np.ndarray):
+    # Write to a new inode and rename: readers that still mmap the old file keep a valid mapping.
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+class _Blob:
+    def __init__(self, path: str):
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+        size = int(self.offsets[-1]) if len(self.offsets) else 0
+        self.data = np.memmap(f"{path}.bin", dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[int(self.offsets[i]):int(self.offsets[i + 1])]).decode("utf-8")
+
+
+# Data files of one build; they live in <index_dir>/<meta["generation"]>/
+# (indexes built before generations have them directly in <index_dir>)
+_DATA_FILES = ("vectors.npy", "scales.npy", "centroids.npy", "list_offsets.npy",
+               "ids.bin", "ids.offsets.npy", "texts.bin", "texts.offsets.npy")
+
+
+def _read_meta(index_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class _Index:
+    """
+    One build of the index, opened as a unit. Reloads swap in a new _Index with a
+    single assignment and searches capture one, so a search never mixes the
+    row count, vectors and texts of two builds.
+    """
+
+    def __init__(self, index_dir: str):
+        meta_path = os.path.join(index_dir, "meta.json")
+        # stat before reading: a meta.json replaced in between is picked up by the next reload check
+        self.mtime = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        d = os.path.join(index_dir, meta["generation"]) if meta.get("generation") else index_dir
+        self.meta = meta
+        self.count = int(meta["count"])
+        self.vectors = np.load(os.path.join(d, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(d, "scales.npy"), mmap_mode="r") if meta["dtype"] == "int8" else None
+        self.centroids = np.load(os.path.join(d, "centroids.npy")) if meta.get("nlist") else None
+        self.list_offsets = np.load(os.path.join(d, "list_offsets.npy")) if meta.get("nlist") else None
+        self.ids = _Blob(os.path.join(d, "ids"))
+        self.texts = _Blob(os.path.join(d, "texts"))
+
+    def result(self, row: int) -> Tuple[Optional[str], str]:
+        return self.ids[row], self.texts[row]
+
+    def score_block(self, Q: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """(stop - start, m) cosine scores of rows [start, stop) against the columns of Q (dim x m)."""
+        block = self.vectors[start:stop]
+        if self.scales is not None:
+            return (block.astype(np.float32) @ Q) * self.scales[start:stop, None]
+        return block @ Q
+
+
+def _top_k_columns(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row indices of the k best scores in each column (unordered)."""
+    n, m = scores.shape
+    if k >= n:
+        return np.broadcast_to(np.arange(n)[:, None], (n, m))
+    return np.argpartition(-scores, k - 1, axis=0)[:k]
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Exact (or IVF-probed) top-k over embeddings stored in memory-mapped .npy files.
+    - float32 rows, or int8 rows with a per-row scale (`quantize=True` at build time)
+    - rows are L2-normalized, so scores are cosine similarities
+    - optional coarse IVF partition: rows are grouped by nearest centroid and only the
+      `nprobe` closest lists are scanned
+    Files are opened with mmap_mode="r", so worker processes share the page cache
+    instead of each holding a private copy.
+    """
+
+    name = "mmap"
+
+    def __init__(self, index_dir: str = VECTOR_INDEX_DIR, nprobe: int = VECTOR_IVF_NPROBE):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._index = self._open()
+
+    # ------------------------
+    # Loading
+    # ------------------------
+    def _open(self) -> _Index:
+        index = _Index(self.index_dir)
+        meta = index.meta
+        logger.info(f"📦 Opened mmap index {self.index_dir}: {meta['count']} x {meta['dim']} {meta['dtype']}, nlist={meta.get('nlist', 0)}")
+        return index
+
+    @property
+    def meta(self) -> dict:
+        return self._index.meta
+
+    def _current(self) -> _Index:
+        """The latest build, reopened if meta.json changed. Callers use the returned object throughout."""
+        index = self._index
+        try:
+            mtime = os.stat(os.path.join(self.index_dir, "meta.json")).st_mtime_ns
+        except OSError:
+            return index
+        if mtime == index.mtime:
+            return index
+        with self._lock:
+            if self._index.mtime == mtime:
+                return self._index
+            try:
+                self._index = self._open()
+            except (OSError, ValueError, KeyError) as e:
+                # Caught mid-rebuild; keep serving the build we have and retry on the next search
+                logger.warning(f"⚠️ Reloading mmap index {self.index_dir} failed: {e}")
+            return self._index
+
+    # ------------------------
+    # Search
+    # ------------------------
+    @staticmethod
+    def _score_rows(index: _Index, q: np.ndarray, start: int, stop: int) -> np.ndarray:
+        out = np.empty(stop - start, dtype=np.float32)
+        for s in range(start, stop, _SCAN_BLOCK):
+            e = min(s + _SCAN_BLOCK, stop)
+            out[s - start:e - start] = index.score_block(q[:, None], s, e)[:, 0]
+        return out
+
+    def _candidates(self, index: _Index, q: np.ndarray) -> List[Tuple[int, int]]:
+        if index.centroids is None:
+            return [(0, index.count)]
+        probe = _top_k(index.centroids @ q, min(self.nprobe, len(index.centroids)))
+        return [(int(index.list_offsets[c]), int(index.list_offsets[c + 1])) for c in probe]
+
+    def _search_normalized(self, index: _Index, q: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        rows, scores = [], []
+        for start, stop in self._candidates(index, q):
+            if stop > start:
+                rows.append(np.arange(start, stop))
+                scores.append(self._score_rows(index, q, start, stop))
+        if not rows:
+            return []
+        rows_all = np.concatenate(rows)
+        scores_all = np.concatenate(scores)
+        best = _top_k(scores_all, k)
+        return [(int(rows_all[i]), float(scores_all[i])) for i in best]
+
+    def search_rows(self, embedding: Sequence[float], k: int = 4) -> List[Tuple[int, float]]:
+        q = np.asarray(embedding, dtype=np.float32).ravel()
+        n = np.linalg.norm(q)
+        return self._search_normalized(self._current(), q / n if n else q, k)
+
+    def search(self, embedding: Sequence[float], k: int = 4) -> SearchResult:
+        index = self._current()
+        q = np.asarray(embedding, dtype=np.float32).ravel()
+        n = np.linalg.norm(q)
+        return [index.result(r) for r, _ in self._search_normalized(index, q / n if n else q, k)]
+
+    def search_many(self, embeddings: Sequence[Sequence[float]], k: int = 4) -> List[SearchResult]:
+        index = self._current()
+        Q = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        if index.centroids is not None:
+            return [[index.result(r) for r, _ in self._search_normalized(index, q, k)] for q in Q]
+        # Exact path: one (block x dim) @ (dim x m) product per block for the whole batch,
+        # keeping only a running top-k per query instead of all count x m scores
+        m = Q.shape[0]
+        k = min(k, index.count)
+        best_rows = np.empty((0, m), dtype=np.int64)
+        best_scores = np.empty((0, m), dtype=np.float32)
+        for s in range(0, index.count, _SCAN_BLOCK):
+            e = min(s + _SCAN_BLOCK, index.count)
+            scores = index.score_block(Q.T, s, e)
+            top = _top_k_columns(scores, k)
+            scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=0)])
+            rows = np.concatenate([best_rows, top + s])
+            keep = _top_k_columns(scores, k)
+            best_scores = np.take_along_axis(scores, keep, axis=0)
+            best_rows = np.take_along_axis(rows, keep, axis=0)
+        order = np.argsort(-best_scores, axis=0, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=0)
+        return [[index.result(int(r)) for r in best_rows[:, j]] for j in range(m)]
+
+    def count(self) -> int:
+        return self._current().count
+
+    def sample(self, n: int) -> Tuple[List[str], np.ndarray]:
+        index = self._current()
+        n = min(n, index.count)
+        rows = np.asarray(index.vectors[:n], dtype=np.float32)
+        if index.scales is not None:
+            rows = rows * index.scales[:n, None]
+        return [index.texts[i] for i in range(n)], rows
+
+    def version(self) -> Any:
+        index = self._current()
+        return (index.count, index.mtime)
+
+    # ------------------------
+    # Building
+    # ------------------------
+    @staticmethod
+    def build(
+        index_dir: str,
+        ids: List[str],
+        texts: List[str],
+        embeddings: np.ndarray,
+        quantize: bool = False,
+        nlist: int = 0,
+        kmeans_iters: int = 20,
+        seed: int = 0,
+    ):
+        """
+        Write a new build into its own generation directory, then point meta.json
+        at it (an atomic rename). Readers see either the old build or the new one,
+        never a mix; the previous generation is kept for readers still opening it.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        previous = _read_meta(index_dir)
+        generation = f"gen-{time.time_ns()}"
+        d = os.path.join(index_dir, generation)
+        os.makedirs(d)
+        vecs = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        n, dim = vecs.shape if vecs.ndim == 2 else (0, 0)
+
+        centroids = None
+        list_offsets = None
+        if nlist and n >= nlist:
+            centroids, assign = _kmeans(vecs, nlist, kmeans_iters, seed)
+            order = np.argsort(assign, kind="stable")
+            vecs = vecs[order]
+            ids = [ids[i] for i in order]
+            texts = [texts[i] for i in order]
+            list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+            list_offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        else:
+            nlist = 0
+
+        if quantize:
+            scales = np.abs(vecs).max(axis=1) / 127.0 if n else np.zeros(0, np.float32)
+            scales[scales == 0] = 1.0
+            q = np.clip(np.round(vecs / scales[:, None]), -127, 127).astype(np.int8)
+            _save_npy(os.path.join(d, "vectors.npy"), q)
+            _save_npy(os.path.join(d, "scales.npy"), scales.astype(np.float32))
+        else:
+            _save_npy(os.path.join(d, "vectors.npy"), vecs)
+        if centroids is not None:
+            _save_npy(os.path.join(d, "centroids.npy"), centroids)
+            _save_npy(os.path.join(d, "list_offsets.npy"), list_offsets)
+        _write_blob(os.path.join(d, "ids"), [str(i) for i in ids])
+        _write_blob(os.path.join(d, "texts"), list(texts))
+
+        meta = {"count": n, "dim": dim, "dtype": "int8" if quantize else "float32",
+                "nlist": nlist, "built_at": time.time(), "generation": generation}
+        meta_path = os.path.join(index_dir, "meta.json")
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)  # written last: readers reload on its mtime
+        _prune_generations(index_dir, keep={generation, (previous or {}).get("generation", "")})
+        return meta
+
+
+def _prune_generations(index_dir: str, keep: set):
+    """Remove builds other than `keep` ("" = the pre-generation files in index_dir itself)."""
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name.startswith("gen-") and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name in _DATA_FILES and "" not in keep:
+            os.remove(path)
+
+
+def _kmeans(x: np.ndarray, nlist: int, iters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means; good enough for a coarse IVF partition."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    assign = np.zeros(len(x), dtype=np.int64)
+    for _ in range(iters):
+        assign = np.concatenate([
+            np.argmax(x[s:s + _SCAN_BLOCK] @ centroids.T, axis=1) for s in range(0, len(x), _SCAN_BLOCK)
+        ])
+        for c in range(nlist):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                centroids[c] = x[rng.integers(len(x))]
+        centroids = _normalize_rows(centroids)
+    return centroids, assign
+
+
+def iter_chroma_collection(collection, page_size: int = 5000) -> Iterable[Tuple[List[str], List[str], List]]:
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], page["documents"], page["embeddings"]
+        offset += len(page["ids"])
+
+
+def build_from_chroma(collection_name: str, chroma_dir: str, index_dir: str, quantize: bool = False, nlist: int = 0):
+    import chromadb
+    collection = chromadb.PersistentClient(path=chroma_dir).get_collection(collection_name)
+    ids: List[str] = []
+    texts: List[str] = []
+    vectors = []
+    for page_ids, page_docs, page_embs in iter_chroma_collection(collection):
+        ids.extend(page_ids)
+        texts.extend(d or "" for d in page_docs)
+        vectors.append(np.asarray(page_embs, dtype=np.float32))
+    embeddings = np.concatenate(vectors) if vectors else np.zeros((0, 0), np.float32)
+    return MmapVectorStore.build(index_dir, ids, texts, embeddings, quantize=quantize, nlist=nlist)
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="Build a memory-mapped vector index from the Chroma collection.")
+    p.add_argument("--chroma-dir", default=os.getenv("CHROMA_DIR", "./chroma_db"))
+    p.add_argument("--collection", default="ai_tutor")
+    p.add_argument("--out", default=VECTOR_INDEX_DIR)
+    p.add_argument("--int8", action="store_true", help="Store int8-quantized vectors")
+    p.add_argument("--nlist", type=int, default=0, help="Number of IVF lists (0 = exact scan)")
+    args = p.parse_args()
+    m = build_from_chroma(args.collection, args.chroma_dir, args.out, quantize=args.int8, nlist=args.nlist)
+    print(f"Built {args.out}: {m['count']} vectors, dim={m['dim']}, dtype={m['dtype']}, nlist={m['nlist']}")
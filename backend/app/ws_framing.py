@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("ws_framing")
+
+# ------------------------
+# Config
+# ------------------------
+# Default token framing for /ws/chat and /ws/voice when the client doesn't ask:
+#   json      one {"type": "token"} text message per LLM delta (original behaviour)
+#   coalesced deltas batched into one token message per WS_COALESCE_MS / WS_COALESCE_CHARS
+#   msgpack   coalesced, and every message is a binary msgpack map
+WS_FRAMING = os.getenv("WS_FRAMING", "json")
+WS_COALESCE_MS = float(os.getenv("WS_COALESCE_MS", "25"))
+WS_COALESCE_CHARS = int(os.getenv("WS_COALESCE_CHARS", "256"))
+
+FRAMINGS = ("json", "coalesced", "msgpack")
+
+
+def _dumps(message: Dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+
+class Framing:
+    """
+    How messages go out on one socket.
+    - send() writes a control/token message: compact JSON text (orjson), or a
+      binary msgpack map in msgpack mode
+    - send_audio() writes audio bytes: a raw binary frame, or in msgpack mode a
+      {"type": "audio_frame", "data": <bin>} map so binary frames stay unambiguous
+    - coalesce_s > 0 lets TokenStream batch deltas into fewer token messages
+    """
+
+    def __init__(self, websocket: WebSocket, mode: str = "json", coalesce_ms: float = WS_COALESCE_MS,
+                 coalesce_chars: int = WS_COALESCE_CHARS):
+        if mode not in FRAMINGS:
+            raise ValueError(f"Unknown framing '{mode}'. Use one of: {', '.join(FRAMINGS)}")
+        if mode == "msgpack" and msgpack is None:
+            raise ValueError("msgpack framing needs msgpack (pip install msgpack)")
+        self.websocket = websocket
+        self.mode = mode
+        self.coalesce_s = coalesce_ms / 1000 if mode != "json" else 0.0
+        self.coalesce_chars = coalesce_chars
+        self.messages = 0
+
+    @classmethod
+    def negotiate(cls, websocket: WebSocket) -> "Framing":
+        """From ?framing=json|coalesced|msgpack&coalesce_ms=25 on the URL (defaults: WS_FRAMING)."""
+        params = websocket.query_params
+        coalesce_ms = float(params.get("coalesce_ms") or WS_COALESCE_MS)
+        return cls(websocket, params.get("framing") or WS_FRAMING, coalesce_ms)
+
+    async def send(self, message: Dict):
+        self.messages += 1
+        if self.mode == "msgpack":
+            await self.websocket.send_bytes(msgpack.packb(message, use_bin_type=True))
+        else:
+            await self.websocket.send_text(_dumps(message))
+
+    async def send_audio(self, data: bytes):
+        if self.mode == "msgpack":
+            await self.websocket.send_bytes(msgpack.packb({"type": "audio_frame", "data": data}, use_bin_type=True))
+        else:
+            await self.websocket.send_bytes(data)
+
+
+class TokenStream:
+    """
+    Sends LLM deltas as "token" messages and keeps the full answer.
+    - Without coalescing every delta is its own message
+    - With coalescing the first delta goes out at once (time to first token is
+      untouched); later ones are buffered and flushed when coalesce_s has passed
+      since the oldest buffered delta (a timer covers stalls) or the buffer
+      reaches coalesce_chars
+    - The answer is accumulated as a list of parts and joined once in text()
+    """
+
+    def __init__(self, framing: Framing, send_lock: asyncio.Lock):
+        self.framing = framing
+        self.send_lock = send_lock
+        self.parts: List[str] = []
+        self.send_s = 0.0
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._timer: Optional[asyncio.Task] = None
+
+    async def feed(self, delta: str):
+        self.parts.append(delta)
+        if not self.framing.coalesce_s or len(self.parts) == 1:
+            await self._send(delta)
+            return
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        if self._pending_chars >= self.framing.coalesce_chars:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.framing.coalesce_s)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            text = "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+            await self._send(text)
+
+    async def _send(self, text: str):
+        t0 = time.perf_counter()
+        async with self.send_lock:
+            await self.framing.send({"type": "token", "text": text})
+        self.send_s += time.perf_counter() - t0
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def text(self) -> str:
+        return "".join(self.parts)
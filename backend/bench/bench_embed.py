@@ -0,0 +1,71 @@
+"""
+Query-embedding throughput: one forward pass per request vs BatchingEmbedder.
+
+Fires --requests embeddings from --concurrency concurrent callers at
+all-MiniLM-L6-v2, first with micro-batching disabled (batch size 1) and then
+with the configured window/batch size, and reports throughput and latency.
+
+    python -m bench.bench_embed --concurrency 32 --requests 512 --batch-wait-ms 3
+"""
+import json
+import time
+import asyncio
+import argparse
+
+from app.embedder import BatchingEmbedder, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS
+from bench.bench_retrieval import _percentile
+
+
+async def _drive(embedder: BatchingEmbedder, questions, concurrency: int):
+    latencies = []
+    next_idx = iter(range(len(questions)))
+
+    async def caller():
+        for i in next_idx:
+            t0 = time.perf_counter()
+            await embedder.aembed(questions[i])
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return time.perf_counter() - t0, latencies
+
+
+def main(args):
+    try:
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+    except ImportError:
+        from langchain.embeddings import SentenceTransformerEmbeddings
+
+    model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    model.embed_documents(["warmup"] * 8)
+    questions = [f"How do I solve problem {i} about derivatives of polynomials?" for i in range(args.requests)]
+
+    report = {"concurrency": args.concurrency, "requests": args.requests, "modes": {}}
+    for name, batch_size in (("unbatched", 1), ("batched", args.batch_size)):
+        embedder = BatchingEmbedder(model, batch_size=batch_size, batch_wait_ms=args.batch_wait_ms)
+        elapsed, latencies = asyncio.run(_drive(embedder, questions, args.concurrency))
+        entry = {
+            "throughput_qps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            **embedder.stats(),
+        }
+        embedder.shutdown()
+        report["modes"][name] = entry
+        print(f"{name:10s} {entry['throughput_qps']:8.1f} q/s  p50={entry['p50_ms']} ms  "
+              f"p99={entry['p99_ms']} ms  avg_batch={entry['avg_batch_size']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--requests", type=int, default=512)
+    p.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    p.add_argument("--batch-wait-ms", type=float, default=EMBED_BATCH_WAIT_MS)
+    p.add_argument("--json", default=None)
+    main(p.parse_args())
@@ -0,0 +1,117 @@
+"""
+all-MiniLM-L6-v2 throughput: PyTorch (sentence-transformers) vs ONNX Runtime fp32 vs int8.
+
+For each backend, embeds --requests single queries one at a time (the
+per-query path) and the chunk corpus in --ingest-batch batches (the ingest
+path). Reports texts/s and latency, plus min/mean cosine of every ONNX vector
+against the PyTorch one. With --chroma-dir, also checks each ONNX variant
+against vectors already stored in the collection.
+
+    python -m bench.bench_embed_onnx --requests 200 --chunks 2048 --ingest-batch 64 --threads 4
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from app.onnx_embedder import OnnxEmbeddings, check_compatibility
+from bench.bench_retrieval import _percentile
+
+MODEL = "all-MiniLM-L6-v2"
+
+
+class TorchEmbeddings:
+    def __init__(self, threads: int):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(threads)
+        self.model = SentenceTransformer(MODEL)
+
+    def embed_array(self, texts):
+        return self.model.encode(texts, batch_size=max(1, len(texts)), show_progress_bar=False, convert_to_numpy=True)
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+
+def _corpus(n: int):
+    # Chunk-like texts of varied length, as ingest produces
+    words = ("derivative limit integral function slope tangent area curve rate change "
+             "polynomial exponential logarithm chain rule product quotient theorem").split()
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(words, size=rng.integers(20, 180))) for _ in range(n)]
+
+
+def _bench(model, queries, chunks, ingest_batch: int) -> dict:
+    model.embed_array(queries[:8])  # warm up
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        model.embed_array([q])
+        latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    vectors = [model.embed_array(chunks[s:s + ingest_batch]) for s in range(0, len(chunks), ingest_batch)]
+    ingest_s = time.perf_counter() - t0
+    return {
+        "query_p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "query_p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "query_per_s": round(len(latencies) / sum(latencies), 1),
+        "ingest_chunks_per_s": round(len(chunks) / ingest_s, 1),
+        "_vectors": np.concatenate(vectors),
+    }
+
+
+def main(args):
+    queries = [f"How do I find the derivative of x^{i} times sin(x)?" for i in range(args.requests)]
+    chunks = _corpus(args.chunks)
+    backends = {
+        "torch": lambda: TorchEmbeddings(args.threads),
+        "onnx_fp32": lambda: OnnxEmbeddings(MODEL, quantize=False, threads=args.threads, batch_size=args.onnx_batch),
+        "onnx_int8": lambda: OnnxEmbeddings(MODEL, quantize=True, threads=args.threads, batch_size=args.onnx_batch),
+    }
+    store = None
+    if args.chroma_dir:
+        from langchain_community.vectorstores import Chroma
+        from app.vectorstore import ChromaVectorStore
+        store = ChromaVectorStore(Chroma(collection_name=args.collection, persist_directory=args.chroma_dir), args.chroma_dir)
+
+    report = {"config": vars(args), "backends": {}}
+    reference = None
+    for name, factory in backends.items():
+        model = factory()
+        res = _bench(model, queries, chunks, args.ingest_batch)
+        vectors = res.pop("_vectors")
+        if reference is None:
+            reference = vectors
+        else:
+            cosine = (vectors * reference).sum(axis=1) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+            res["cosine_vs_torch_min"] = round(float(cosine.min()), 5)
+            res["cosine_vs_torch_mean"] = round(float(cosine.mean()), 5)
+            if store is not None:
+                try:
+                    res["collection_check"] = check_compatibility(model, store, sample=args.verify_sample)
+                except RuntimeError as e:
+                    res["collection_check"] = {"error": str(e)}
+        report["backends"][name] = res
+        print(f"{name:10s} query p50={res['query_p50_ms']} ms ({res['query_per_s']}/s)  "
+              f"ingest={res['ingest_chunks_per_s']} chunks/s  cosine_min={res.get('cosine_vs_torch_min', '-')}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--chunks", type=int, default=2048)
+    p.add_argument("--ingest-batch", type=int, default=64)
+    p.add_argument("--onnx-batch", type=int, default=32)
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--chroma-dir", default=None)
+    p.add_argument("--collection", default="ai_tutor")
+    p.add_argument("--verify-sample", type=int, default=256)
+    p.add_argument("--json", default=None)
+    main(p.parse_args())
@@ -0,0 +1,122 @@
+"""
+Hedged LLM requests against two local stubs with injected tail latency.
+
+Starts a "primary" stub where --slow-rate of requests stall for --slow-ms and a
+clean "secondary" stub, then streams the same workload through LLMRouter with
+hedging off and on. Reports time to first token percentiles, hedges fired/won
+and the extra requests the hedges cost.
+
+    python -m bench.bench_hedge --requests 300 --concurrency 8 --slow-rate 0.04 --slow-ms 2000
+"""
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.providers import LLMProvider
+from app import llm_router
+from app.llm_router import LLMRouter
+from bench.load_llm import _spawn, _wait_ready
+from bench.bench_retrieval import _percentile
+
+MESSAGES = [{"role": "user", "content": "Explain derivatives briefly."}]
+
+
+def _provider(name: str, port: int, http_client) -> LLMProvider:
+    # No SDK retries, as in build_providers with several providers
+    client = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{port}/v1", http_client=http_client, max_retries=0)
+    return LLMProvider(name, client, "stub", 0.2, 256)
+
+
+async def _stub_requests(port: int) -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"http://127.0.0.1:{port}/stats")).json()["requests"]
+
+
+async def _run(args, hedge: bool) -> dict:
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=200)) as http_client:
+        router = LLMRouter(
+            [_provider("primary", args.primary_port, http_client), _provider("secondary", args.secondary_port, http_client)],
+            hedge=hedge,
+        )
+        before = [await _stub_requests(p) for p in (args.primary_port, args.secondary_port)]
+        ttfts, errors = [], 0
+        remaining = iter(range(args.requests))
+
+        async def caller():
+            nonlocal errors
+            for _ in remaining:
+                t0 = time.perf_counter()
+                first = None
+                try:
+                    async for _delta in router.stream(MESSAGES):
+                        if first is None:
+                            first = time.perf_counter() - t0
+                except Exception:
+                    errors += 1
+                    continue
+                if first is not None:
+                    ttfts.append(first)
+
+        await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+        after = [await _stub_requests(p) for p in (args.primary_port, args.secondary_port)]
+        stats = router.stats()
+
+    sent = sum(a - b for a, b in zip(after, before))
+    return {
+        "ttft_p50_ms": round(_percentile(ttfts, 50) * 1000, 1),
+        "ttft_p95_ms": round(_percentile(ttfts, 95) * 1000, 1),
+        "ttft_p99_ms": round(_percentile(ttfts, 99) * 1000, 1),
+        "errors": errors,
+        "upstream_requests": sent,
+        "extra_load": round(sent / args.requests - 1, 3),
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "failovers": stats["failovers"],
+    }
+
+
+async def main(args):
+    stubs = [
+        _spawn(["-m", "bench.stub_llm", "--port", str(args.primary_port), "--ttft-ms", str(args.ttft_ms),
+                "--slow-rate", str(args.slow_rate), "--slow-ms", str(args.slow_ms), "--error-rate", str(args.error_rate)]),
+        _spawn(["-m", "bench.stub_llm", "--port", str(args.secondary_port), "--ttft-ms", str(args.secondary_ttft_ms)]),
+    ]
+    # Short warm-up window so the p95 deadline is learned within the run
+    llm_router.LLM_HEDGE_MIN_SAMPLES = args.min_samples
+    report = {"config": vars(args), "modes": {}}
+    try:
+        for port in (args.primary_port, args.secondary_port):
+            await _wait_ready(f"http://127.0.0.1:{port}/stats")
+        for name, hedge in (("no_hedge", False), ("hedge", True)):
+            res = await _run(args, hedge)
+            report["modes"][name] = res
+            print(f"{name:9s} ttft p50={res['ttft_p50_ms']} p95={res['ttft_p95_ms']} p99={res['ttft_p99_ms']} ms  "
+                  f"hedges={res['hedges']} won={res['hedge_wins']} extra_load={res['extra_load']:.1%} errors={res['errors']}")
+    finally:
+        for stub in stubs:
+            stub.terminate()
+            stub.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--primary-port", type=int, default=9011)
+    p.add_argument("--secondary-port", type=int, default=9012)
+    p.add_argument("--ttft-ms", type=float, default=200)
+    p.add_argument("--secondary-ttft-ms", type=float, default=400)
+    p.add_argument("--slow-rate", type=float, default=0.04)
+    p.add_argument("--slow-ms", type=float, default=2000)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--min-samples", type=int, default=10)
+    p.add_argument("--json", default=None)
+    asyncio.run(main(p.parse_args()))
@@ -0,0 +1,134 @@
+"""
+Model-server IPC: what a web worker pays to reach models in another process.
+
+Starts app.model_server with the stub STT/TTS engines (zero real-time factor,
+so only transport is measured) and a stub embedder, then drives STT clips,
+TTS sentences and query embeddings from --concurrency threads through
+ModelClient. Runs once with audio/PCM in the connections' shared-memory arenas
+and once with every payload pushed through the socket (MODEL_SHM_ARENA_MB=0), and reports per-op latency percentiles and
+the RSS of this (web worker) process vs the model server.
+
+    python -m bench.bench_model_server --requests 400 --concurrency 8 --clip-s 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+
+import numpy as np
+import psutil
+
+from app import model_client
+from app.model_client import ModelClient
+from bench.load_llm import _spawn
+from bench.bench_retrieval import _percentile
+
+MODES = {"shm": 4, "socket": 0}
+SENTENCE = "The derivative measures how fast a function changes as its input changes."
+
+
+class StubEmbeddings:
+    def embed_documents(self, texts):
+        return np.random.default_rng(len(texts)).random((len(texts), 384), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _serve(args):
+    from app.model_server import ModelServer
+    from bench.stub_audio import StubWhisperModel, StubTTSEngine
+
+    server = ModelServer(args.socket, ["stt", "tts", "embed"])
+    server.load(StubWhisperModel, StubTTSEngine, StubEmbeddings)
+    asyncio.run(server.serve())
+
+
+def _wait_socket(path: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        probe = ModelClient(path, connections=1)
+        try:
+            probe.info()
+            probe.close()
+            return
+        except model_client.ModelServerError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {path}")
+
+
+def _drive(client: ModelClient, op: str, args) -> dict:
+    clip = np.random.default_rng(0).uniform(-0.1, 0.1, int(args.clip_s * 16000)).astype(np.float32)
+    calls = {
+        "stt": lambda: client.transcribe(clip, "en", "final", None),
+        "tts": lambda: client.synthesize(SENTENCE),
+        "embed": lambda: client.embed([SENTENCE]),
+    }[op]
+    latencies, lock = [], threading.Lock()
+    remaining = iter(range(args.requests))
+
+    def caller():
+        for _ in remaining:
+            t0 = time.perf_counter()
+            calls()
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return {
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main(args):
+    report = {"config": vars(args), "modes": {}}
+    for mode, arena_mb in MODES.items():
+        server = _spawn(
+            ["-m", "bench.bench_model_server", "--serve", "--socket", args.socket],
+            env={"STUB_STT_RTF": "0", "STUB_TTS_RTF": "0"},
+        )
+        try:
+            _wait_socket(args.socket)
+            model_client.MODEL_SHM_ARENA_MB = arena_mb
+            client = ModelClient(args.socket, connections=args.concurrency)
+            result = {op: _drive(client, op, args) for op in ("stt", "tts", "embed")}
+            result["client"] = client.stats()
+            result["worker_rss_mb"] = round(psutil.Process().memory_info().rss / 2**20, 1)
+            result["server_rss_mb"] = client.server_stats()["rss_mb"]
+            client.close()
+        finally:
+            server.terminate()
+            server.wait()
+        report["modes"][mode] = result
+        print(f"{mode:7s} " + "  ".join(
+            f"{op} p50={result[op]['p50_ms']} p99={result[op]['p99_ms']} ms" for op in ("stt", "tts", "embed")
+        ) + f"  worker_rss={result['worker_rss_mb']} MB server_rss={result['server_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--socket", default=f"/tmp/bench-models-{os.getpid()}.sock")
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--clip-s", type=float, default=5.0)
+    p.add_argument("--json", default=None)
+    args = p.parse_args()
+    if args.serve:
+        sys.exit(_serve(args))
+    main(args)
@@ -0,0 +1,131 @@
+"""
+Question bank: sequential /query-style answers vs RagService.answer_batch.
+
+Starts the stub LLM, builds an exact mmap index of --corpus random chunks and
+answers --questions questions twice with a stub embedder: one answer_single()
+after another (what a client looping over /query gets), then through
+answer_batch() with --concurrency LLM calls in flight. Also times the
+embed + retrieve phase alone, per query vs batched (one embedding pass, one
+matrix top-k).
+
+    python -m bench.bench_query_batch --questions 200 --concurrency 8 --corpus 100000
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+import httpx
+import numpy as np
+
+from app.rag import RagService
+from app.embedder import BatchingEmbedder
+from app.llm_router import LLMRouter
+from app.vectorstore import MmapVectorStore
+from bench.load_llm import _spawn, _wait_ready
+from bench.bench_hedge import _provider
+
+DIM = 384
+
+
+class StubEmbeddings:
+    """Deterministic per-text vectors; costs a fixed overhead per call plus a little per text, like a forward pass."""
+
+    def __init__(self, call_ms: float, text_ms: float):
+        self.call_s = call_ms / 1000
+        self.text_s = text_ms / 1000
+
+    def embed_documents(self, texts):
+        time.sleep(self.call_s + self.text_s * len(texts))
+        return [np.random.default_rng(abs(hash(t)) % 2**32).standard_normal(DIM, dtype=np.float32).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _service(args, index_dir: str, http_client) -> RagService:
+    # RagService wants a configured provider; the router is swapped for the stub below
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    rag = RagService(load_models=False)
+    rag.llm = LLMRouter([_provider("stub", args.stub_port, http_client)], hedge=False)
+    rag.embedding = StubEmbeddings(args.embed_call_ms, args.embed_text_ms)
+    rag.embedder = BatchingEmbedder(rag.embedding)
+    rag.store = MmapVectorStore(index_dir)
+    return rag
+
+
+async def _retrieval(rag: RagService, questions) -> dict:
+    t0 = time.perf_counter()
+    for q in questions:
+        await rag._aretrieve_chunks(q)
+    per_query = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    embeddings = await rag._aembed_many(questions)
+    await asyncio.to_thread(rag._retrieve_many, embeddings, 4, None)
+    batched = time.perf_counter() - t0
+    return {"per_query_ms": round(per_query * 1000, 1), "batched_ms": round(batched * 1000, 1)}
+
+
+async def main(args):
+    stub = _spawn(["-m", "bench.stub_llm", "--port", str(args.stub_port), "--ttft-ms", str(args.ttft_ms),
+                   "--tokens", str(args.tokens), "--tokens-per-s", str(args.tokens_per_s)])
+    index_dir = tempfile.mkdtemp(prefix="bench-batch-")
+    try:
+        corpus = np.random.default_rng(0).standard_normal((args.corpus, DIM), dtype=np.float32)
+        MmapVectorStore.build(index_dir, [f"c{i}" for i in range(args.corpus)],
+                              [f"chunk {i}" for i in range(args.corpus)], corpus)
+        await _wait_ready(f"http://127.0.0.1:{args.stub_port}/stats")
+        questions = [f"What is the derivative of x^{i} sin(x)?" for i in range(args.questions)]
+
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=200)) as http_client:
+            rag = _service(args, index_dir, http_client)
+            report = {"config": vars(args), "retrieval": await _retrieval(rag, questions)}
+
+            t0 = time.perf_counter()
+            for q in questions:
+                await rag.answer_single(q)
+            sequential = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            first, errors = None, 0
+            async for result in rag.answer_batch(questions, concurrency=args.concurrency):
+                first = first or time.perf_counter() - t0
+                errors += "error" in result
+            batch = time.perf_counter() - t0
+            rag.close()
+
+        report.update({
+            "sequential_s": round(sequential, 2),
+            "batch_s": round(batch, 2),
+            "batch_first_result_ms": round(first * 1000, 1),
+            "batch_errors": errors,
+            "speedup": round(sequential / batch, 2),
+        })
+        print(f"embed+retrieve: per-query {report['retrieval']['per_query_ms']} ms, batched {report['retrieval']['batched_ms']} ms")
+        print(f"answers: sequential {report['sequential_s']} s, batch {report['batch_s']} s "
+              f"({report['speedup']}x, first result {report['batch_first_result_ms']} ms, {errors} errors)")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        stub.terminate()
+        stub.wait()
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--questions", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--corpus", type=int, default=100000)
+    p.add_argument("--embed-call-ms", type=float, default=8.0)
+    p.add_argument("--embed-text-ms", type=float, default=0.5)
+    p.add_argument("--stub-port", type=int, default=9011)
+    p.add_argument("--ttft-ms", type=float, default=300)
+    p.add_argument("--tokens", type=int, default=60)
+    p.add_argument("--tokens-per-s", type=float, default=400)
+    p.add_argument("--json", default=None)
+    asyncio.run(main(p.parse_args()))
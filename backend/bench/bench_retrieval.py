@@ -0,0 +1,117 @@
+"""
+Retrieval latency / recall benchmark: Chroma (via LangChain) vs the mmap index.
+
+Exports the Chroma collection, builds float32, int8 and (optionally) IVF mmap
+indexes in a temp dir, then runs the same query vectors through every backend.
+Queries are stored embeddings with Gaussian noise added (or real questions
+embedded with all-MiniLM-L6-v2 when --questions is given). Recall@k is measured
+against an exact float32 brute-force scan.
+
+    python -m bench.bench_retrieval --chroma-dir ./chroma_db --queries 500 --k 4 --nlist 256
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from app.vectorstore import MmapVectorStore, ChromaVectorStore, iter_chroma_collection
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    idx = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def _run(store, queries, k):
+    latencies, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = store.search(q, k)
+        latencies.append(time.perf_counter() - t0)
+        results.append([rid for rid, _ in res])
+    return latencies, results
+
+
+def main(args):
+    import chromadb
+    try:
+        from langchain_community.vectorstores import Chroma
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+    except ImportError:
+        from langchain.vectorstores import Chroma
+        from langchain.embeddings import SentenceTransformerEmbeddings
+
+    collection = chromadb.PersistentClient(path=args.chroma_dir).get_collection(args.collection)
+    ids, texts, vecs = [], [], []
+    for page_ids, page_docs, page_embs in iter_chroma_collection(collection):
+        ids.extend(page_ids)
+        texts.extend(d or "" for d in page_docs)
+        vecs.append(np.asarray(page_embs, dtype=np.float32))
+    X = np.concatenate(vecs)
+    Xn = X / np.linalg.norm(X, axis=1, keepdims=True)
+    print(f"Collection {args.collection}: {len(ids)} vectors, dim={X.shape[1]}")
+
+    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    rng = np.random.default_rng(args.seed)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()][: args.queries]
+        queries = np.asarray(embedding.embed_documents(questions), dtype=np.float32)
+    else:
+        picks = rng.choice(len(X), min(args.queries, len(X)), replace=False)
+        queries = Xn[picks] + args.noise * rng.normal(size=(len(picks), X.shape[1])).astype(np.float32)
+
+    truth = []
+    for q in queries:
+        scores = Xn @ (q / np.linalg.norm(q))
+        truth.append(set(ids[i] for i in np.argsort(-scores)[: args.k]))
+
+    db = Chroma(collection_name=args.collection, embedding_function=embedding, persist_directory=args.chroma_dir)
+    backends = {"chroma": ChromaVectorStore(db, args.chroma_dir)}
+
+    tmp = tempfile.mkdtemp(prefix="mmap_bench_")
+    variants = {"mmap_f32": {}, "mmap_int8": {"quantize": True}}
+    if args.nlist:
+        variants[f"mmap_ivf{args.nlist}"] = {"nlist": args.nlist}
+    for name, kw in variants.items():
+        path = os.path.join(tmp, name)
+        MmapVectorStore.build(path, ids, texts, X, **kw)
+        backends[name] = MmapVectorStore(path, nprobe=args.nprobe)
+
+    report = {"count": len(ids), "dim": int(X.shape[1]), "k": args.k, "queries": len(queries), "backends": {}}
+    for name, store in backends.items():
+        _run(store, queries[: min(20, len(queries))], args.k)  # warm caches / page in
+        latencies, results = _run(store, queries, args.k)
+        recall = float(np.mean([len(t & set(r)) / args.k for t, r in zip(truth, results)]))
+        entry = {
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+            "recall_at_k": round(recall, 4),
+        }
+        report["backends"][name] = entry
+        print(f"{name:14s} p50={entry['p50_ms']:8.3f} ms  p99={entry['p99_ms']:8.3f} ms  recall@{args.k}={entry['recall_at_k']:.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--chroma-dir", default=os.getenv("CHROMA_DIR", "./chroma_db"))
+    p.add_argument("--collection", default="ai_tutor")
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--questions", default=None, help="Text file with one question per line")
+    p.add_argument("--noise", type=float, default=0.05)
+    p.add_argument("--k", type=int, default=4)
+    p.add_argument("--nlist", type=int, default=0)
+    p.add_argument("--nprobe", type=int, default=8)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", default=None)
+    main(p.parse_args())
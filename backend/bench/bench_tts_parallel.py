@@ -0,0 +1,68 @@
+"""
+Long-answer TTS: sentence-parallel synthesis vs one engine.
+
+Registers the stub TTS engine (sleeps a real-time factor, releasing the GIL
+like torch inference does) with 1..N instances, renders a multi-sentence
+answer --repeats times with the PCM cache off, and reports the time to the
+first sentence (what a streaming client waits) and to the whole answer.
+
+    python -m bench.bench_tts_parallel --sentences 12 --pool-sizes 1,2,4,8
+"""
+import json
+import time
+import argparse
+
+from app import tts_cache
+from app.tts_registry import registry
+from bench.stub_audio import StubTTSEngine
+from bench.bench_retrieval import _percentile
+
+SENTENCE = "The derivative of a function tells us how quickly its output changes as the input changes."
+
+
+def _render(text: str):
+    t0 = time.perf_counter()
+    first_s, audio_bytes = None, 0
+    for pcm, _ in tts_cache.iter_synthesized(text):
+        if first_s is None:
+            first_s = time.perf_counter() - t0
+        audio_bytes += len(pcm)
+    return first_s, time.perf_counter() - t0, audio_bytes
+
+
+def main(args):
+    tts_cache.cache = None
+    text = " ".join(f"{SENTENCE[:-1]} ({i})." for i in range(args.sentences))
+    report = {"config": vars(args), "pool_sizes": {}}
+    baseline = None
+    for size in [int(s) for s in args.pool_sizes.split(",")]:
+        registry.register(registry.default_model, StubTTSEngine, size)
+        firsts, totals = [], []
+        for _ in range(args.repeats):
+            first_s, total_s, audio_bytes = _render(text)
+            firsts.append(first_s)
+            totals.append(total_s)
+        total_p50 = _percentile(totals, 50)
+        baseline = baseline or total_p50
+        res = {
+            "first_sentence_p50_ms": round(_percentile(firsts, 50) * 1000, 1),
+            "total_p50_ms": round(total_p50 * 1000, 1),
+            "speedup": round(baseline / total_p50, 2),
+            "audio_s": round(audio_bytes / 2 / StubTTSEngine.sample_rate, 1),
+        }
+        report["pool_sizes"][size] = res
+        print(f"instances={size:2d}  first={res['first_sentence_p50_ms']} ms  "
+              f"total={res['total_p50_ms']} ms  speedup={res['speedup']}x  ({res['audio_s']} s of audio)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sentences", type=int, default=12)
+    p.add_argument("--pool-sizes", default="1,2,4,8")
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--json", default=None)
+    main(p.parse_args())
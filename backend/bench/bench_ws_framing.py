@@ -0,0 +1,124 @@
+"""
+/ws/chat token framing: per-delta JSON vs coalesced JSON vs coalesced msgpack.
+
+Starts the stub LLM at a high token rate and the app (bench.e2e_app), runs
+--streams concurrent /ws/chat conversations per framing mode and reports
+server->client messages/s, token messages per answer, time to first token and
+server CPU per answer and per stream-second (from the app process' CPU times).
+
+    python -m bench.bench_ws_framing --streams 16 --turns 3 --tokens 400 --tokens-per-s 2000
+"""
+import json
+import time
+import asyncio
+import argparse
+
+import msgpack
+import psutil
+import websockets
+
+from bench.load_llm import _spawn, _wait_ready
+from bench.bench_retrieval import _percentile
+
+MODES = ["json", "coalesced", "msgpack"]
+
+
+async def _stream(url: str, turns: int, stats: dict):
+    async with websockets.connect(url, max_size=None) as ws:
+        for turn in range(turns):
+            t0 = time.perf_counter()
+            await ws.send(json.dumps({"query": f"Explain limits, part {turn}"}))
+            first = None
+            parts = []
+            while True:
+                raw = await ws.recv()
+                msg = msgpack.unpackb(raw) if isinstance(raw, bytes) else json.loads(raw)
+                stats["messages"] += 1
+                kind = msg.get("type")
+                if kind == "token":
+                    stats["token_messages"] += 1
+                    parts.append(msg["text"])
+                    if first is None:
+                        first = time.perf_counter() - t0
+                elif kind == "final":
+                    if "".join(parts) != msg["text"]:
+                        stats["mismatches"] += 1
+                    break
+                elif kind == "error":
+                    stats["errors"] += 1
+                    break
+            stats["answers"] += 1
+            if first is not None:
+                stats["ttft"].append(first)
+
+
+async def _run_mode(args, mode: str, server: psutil.Process) -> dict:
+    stats = {"messages": 0, "token_messages": 0, "answers": 0, "errors": 0, "mismatches": 0, "ttft": []}
+    url = f"ws://127.0.0.1:{args.app_port}/ws/chat?framing={mode}&coalesce_ms={args.coalesce_ms}"
+    cpu0 = sum(server.cpu_times()[:2])
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_stream(f"{url}&session_id=frame-{mode}-{i}", args.turns, stats) for i in range(args.streams)))
+    elapsed = time.perf_counter() - t0
+    cpu = sum(server.cpu_times()[:2]) - cpu0
+    return {
+        "messages_per_s": round(stats["messages"] / elapsed, 1),
+        "token_messages_per_answer": round(stats["token_messages"] / max(1, stats["answers"]), 1),
+        "ttft_p50_ms": round(_percentile(stats["ttft"], 50) * 1000, 1) if stats["ttft"] else None,
+        "server_cpu_s": round(cpu, 3),
+        "server_cpu_ms_per_answer": round(cpu / max(1, stats["answers"]) * 1000, 2),
+        "server_cpu_ms_per_stream_s": round(cpu / (elapsed * args.streams) * 1000, 2),
+        "elapsed_s": round(elapsed, 2),
+        "errors": stats["errors"],
+        "mismatches": stats["mismatches"],
+    }
+
+
+async def main(args):
+    stub = _spawn(["-m", "bench.stub_llm", "--port", str(args.stub_port), "--ttft-ms", "50",
+                   "--tokens", str(args.tokens), "--tokens-per-s", str(args.tokens_per_s)])
+    server = _spawn(
+        ["-m", "uvicorn", "bench.e2e_app:app", "--host", "127.0.0.1", "--port", str(args.app_port), "--log-level", "warning"],
+        env={
+            "GROQ_API_KEY": "",
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+            "SEMANTIC_CACHE_ENABLED": "0",
+            "HF_HUB_OFFLINE": "1",
+            "METRICS_ENABLED": "0",
+        },
+    )
+    report = {"config": vars(args), "modes": {}}
+    try:
+        await _wait_ready(f"http://127.0.0.1:{args.stub_port}/stats")
+        await _wait_ready(f"http://127.0.0.1:{args.app_port}/healthz/live")
+        await asyncio.sleep(2)  # let background warmup settle
+        process = psutil.Process(server.pid)
+        for mode in args.modes:
+            res = await _run_mode(args, mode, process)
+            report["modes"][mode] = res
+            print(f"{mode:10s} {res['messages_per_s']:9.1f} msg/s  {res['token_messages_per_answer']:6.1f} token msgs/answer  "
+                  f"ttft={res['ttft_p50_ms']} ms  cpu={res['server_cpu_ms_per_answer']} ms/answer  "
+                  f"errors={res['errors']} mismatches={res['mismatches']}")
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    p.add_argument("--streams", type=int, default=16)
+    p.add_argument("--turns", type=int, default=3)
+    p.add_argument("--tokens", type=int, default=400)
+    p.add_argument("--tokens-per-s", type=float, default=2000)
+    p.add_argument("--coalesce-ms", type=float, default=25)
+    p.add_argument("--stub-port", type=int, default=9041)
+    p.add_argument("--app-port", type=int, default=8041)
+    p.add_argument("--json", default=None)
+    asyncio.run(main(p.parse_args()))
@@ -0,0 +1,352 @@
+"""
+End-to-end load and latency benchmark, fully offline.
+
+Starts the stub LLM (bench.stub_llm) and the app (bench.e2e_app, i.e. app.main
+with stub STT/TTS engines unless --real-audio), waits for every component to
+settle, then runs each scenario with N concurrent simulated students:
+
+    query    POST /query
+    chat     POST /chat              (one session per student)
+    ws_chat  /ws/chat                (time to first token; with --ws-tts also
+                                      time to first audio)
+    stt      POST /stt               (a generated WAV clip)
+    ws_tts   /ws/tts                 (time to first audio frame)
+    voice    /ws/voice               (spoken question; TTFT/TTFA from end of audio)
+
+and writes throughput, p50/p95/p99 latency, TTFT and TTFA per scenario to JSON.
+With --baseline, results are compared against an earlier run and the exit code
+is 1 when any metric regressed by more than --tolerance.
+
+    python -m bench.e2e --students 8 --turns 5 --json bench_e2e.json
+    python -m bench.e2e --baseline bench_e2e.json --tolerance 0.2
+"""
+import io
+import sys
+import json
+import time
+import wave
+import asyncio
+import argparse
+import platform
+import subprocess
+
+import httpx
+import numpy as np
+import websockets
+
+from bench.load_llm import _spawn, _wait_ready
+
+SCENARIOS = ["query", "chat", "ws_chat", "stt", "ws_tts", "voice"]
+# Metrics where higher is worse / better, for --baseline comparisons
+_LOWER_IS_BETTER = ["p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "ttfa_p50_ms"]
+_HIGHER_IS_BETTER = ["throughput_rps"]
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    idx = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _question(student: int, turn: int) -> str:
+    return f"Can you explain derivatives with an example? (student {student}, turn {turn})"
+
+
+def _wav_clip(seconds: float = 2.0, sample_rate: int = 16000) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pcm = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+# ------------------------
+# Scenarios: each runs one student's turns and returns per-turn records
+# ------------------------
+async def _rest(client: httpx.AsyncClient, path: str, student: int, turns: int, **kwargs):
+    records = []
+    for turn in range(turns):
+        t0 = time.perf_counter()
+        try:
+            if path == "/stt":
+                r = await client.post(path, files={"file": ("clip.wav", kwargs["clip"], "audio/wav")})
+            elif path == "/chat":
+                r = await client.post(path, json={"session_id": f"bench-{student}", "query": _question(student, turn)})
+            else:
+                r = await client.post(path, json={"query": _question(student, turn)})
+            ok = r.status_code == 200 and "error" not in r.json()
+        except (httpx.HTTPError, ValueError):
+            ok = False
+        records.append({"ok": ok, "latency": time.perf_counter() - t0})
+    return records
+
+
+async def _ws_chat(ws_url: str, student: int, turns: int, tts: bool):
+    records = []
+    url = f"{ws_url}/ws/chat?session_id=bench-ws-{student}" + ("&tts=1" if tts else "")
+    async with websockets.connect(url, max_size=None) as ws:
+        for turn in range(turns):
+            t0 = time.perf_counter()
+            ttft = ttfa = None
+            ok = False
+            await ws.send(json.dumps({"query": _question(student, turn)}))
+            while True:
+                msg = await ws.recv()
+                now = time.perf_counter() - t0
+                if isinstance(msg, bytes):
+                    ttfa = ttfa if ttfa is not None else now
+                    continue
+                data = json.loads(msg)
+                kind = data.get("type")
+                if kind == "token" and ttft is None:
+                    ttft = now
+                elif kind == "error":
+                    break
+                elif (kind == "final" and not tts) or kind == "audio_end":
+                    ok = True
+                    break
+            records.append({"ok": ok, "latency": time.perf_counter() - t0, "ttft": ttft, "ttfa": ttfa})
+    return records
+
+
+async def _ws_tts(ws_url: str, student: int, turns: int, fmt: str):
+    records = []
+    async with websockets.connect(f"{ws_url}/ws/tts", max_size=None) as ws:
+        for turn in range(turns):
+            t0 = time.perf_counter()
+            ttfa = None
+            ok = False
+            text = f"A derivative measures how fast a function changes. This is answer {turn} for student {student}."
+            await ws.send(json.dumps({"text": text, "format": fmt}))
+            while True:
+                msg = await ws.recv()
+                if isinstance(msg, bytes):
+                    ttfa = ttfa if ttfa is not None else time.perf_counter() - t0
+                    continue
+                data = json.loads(msg)
+                ok = data.get("event") == "end"
+                break
+            records.append({"ok": ok, "latency": time.perf_counter() - t0, "ttfa": ttfa})
+    return records
+
+
+async def _voice(ws_url: str, student: int, turns: int, seconds: float):
+    records = []
+    sample_rate = 16000
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # A tone for the "speech" then enough silence for the VAD to close the utterance
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes() + bytes(sample_rate * 2)
+    frame = sample_rate // 50 * 2  # 20 ms
+    async with websockets.connect(f"{ws_url}/ws/voice?session_id=bench-voice-{student}", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "start", "format": "pcm_s16le", "sample_rate": sample_rate}))
+        for _ in range(turns):
+            # Real-time pacing, like a microphone
+            for i in range(0, len(audio), frame):
+                await ws.send(audio[i:i + frame])
+                await asyncio.sleep(0.02)
+            t0 = time.perf_counter()
+            ttft = ttfa = None
+            ok = False
+            while True:
+                msg = await ws.recv()
+                now = time.perf_counter() - t0
+                if isinstance(msg, bytes):
+                    ttfa = ttfa if ttfa is not None else now
+                    continue
+                kind = json.loads(msg).get("type")
+                if kind == "token" and ttft is None:
+                    ttft = now
+                elif kind == "error":
+                    break
+                elif kind == "audio_end":
+                    ok = True
+                    break
+            records.append({"ok": ok, "latency": time.perf_counter() - t0, "ttft": ttft, "ttfa": ttfa})
+    return records
+
+
+async def _run_scenario(name: str, args, base_url: str) -> dict:
+    ws_url = base_url.replace("http://", "ws://")
+    limits = httpx.Limits(max_connections=args.students, max_keepalive_connections=args.students)
+    clip = _wav_clip(args.clip_seconds)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        async def student(i: int):
+            try:
+                if name == "ws_chat":
+                    return await _ws_chat(ws_url, i, args.turns, args.ws_tts)
+                if name == "voice":
+                    return await _voice(ws_url, i, args.turns, args.clip_seconds)
+                if name == "ws_tts":
+                    return await _ws_tts(ws_url, i, args.turns, args.audio_format)
+                return await _rest(client, f"/{name}", i, args.turns, clip=clip)
+            except (OSError, websockets.WebSocketException, asyncio.TimeoutError):
+                return [{"ok": False, "latency": 0.0}]
+
+        t_start = time.perf_counter()
+        per_student = await asyncio.gather(*(student(i) for i in range(args.students)))
+        elapsed = time.perf_counter() - t_start
+
+    records = [r for rs in per_student for r in rs]
+    ok = [r for r in records if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    ttft = [r["ttft"] for r in ok if r.get("ttft") is not None]
+    ttfa = [r["ttfa"] for r in ok if r.get("ttfa") is not None]
+    return {
+        "students": args.students,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": _ms(_percentile(latencies, 50)),
+        "p95_ms": _ms(_percentile(latencies, 95)),
+        "p99_ms": _ms(_percentile(latencies, 99)),
+        "ttft_p50_ms": _ms(_percentile(ttft, 50)),
+        "ttft_p95_ms": _ms(_percentile(ttft, 95)),
+        "ttfa_p50_ms": _ms(_percentile(ttfa, 50)),
+        "ttfa_p95_ms": _ms(_percentile(ttfa, 95)),
+    }
+
+
+# ------------------------
+# Harness
+# ------------------------
+async def _wait_settled(base_url: str, timeout: float) -> dict:
+    """Wait until no component is pending/loading; returns the final /healthz body."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            health = (await client.get("/healthz")).json()
+            states = [c["state"] for c in health.get("components", {}).values()]
+            if all(s in ("ready", "failed") for s in states) or time.monotonic() > deadline:
+                return health
+            await asyncio.sleep(0.5)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions of `report` against `baseline`."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for key in _LOWER_IS_BETTER:
+            if current.get(key) is not None and before.get(key):
+                if current[key] > before[key] * (1 + tolerance):
+                    regressions.append(f"{name}.{key}: {before[key]} -> {current[key]}")
+        for key in _HIGHER_IS_BETTER:
+            if before.get(key) and current.get(key) is not None:
+                if current[key] < before[key] * (1 - tolerance):
+                    regressions.append(f"{name}.{key}: {before[key]} -> {current[key]}")
+        if current["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}.errors: {before.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+async def main(args) -> int:
+    stub = _spawn(
+        ["-m", "bench.stub_llm", "--port", str(args.stub_port), "--ttft-ms", str(args.ttft_ms),
+         "--tokens", str(args.tokens), "--tokens-per-s", str(args.tokens_per_s)]
+    )
+    app_env = {
+        "GROQ_API_KEY": "",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        "BENCH_STUB_AUDIO": "0" if args.real_audio else "1",
+        "SEMANTIC_CACHE_ENABLED": "1" if args.caches else "0",
+        "QUERY_CACHE_ENABLED": "1" if args.caches else "0",
+        "TTS_CACHE_ENABLED": "1" if args.caches else "0",
+        "SESSION_BACKEND": "memory",
+        # Never reach for the network: models must already be cached
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+    }
+    server = _spawn(
+        ["-m", "uvicorn", "bench.e2e_app:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+         "--workers", "1", "--log-level", "warning"],
+        env=app_env,
+    )
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    try:
+        await _wait_ready(f"http://127.0.0.1:{args.stub_port}/stats")
+        await _wait_ready(f"{base_url}/healthz/live")
+        health = await _wait_settled(base_url, args.warmup_timeout)
+
+        report = {
+            "meta": {
+                "revision": _git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "students": args.students,
+                "turns": args.turns,
+                "stub_llm": {"ttft_ms": args.ttft_ms, "tokens": args.tokens, "tokens_per_s": args.tokens_per_s},
+                "real_audio": args.real_audio,
+                "caches": args.caches,
+            },
+            "components": {name: c["state"] for name, c in health.get("components", {}).items()},
+            "scenarios": {},
+        }
+        for name in args.scenarios:
+            res = await _run_scenario(name, args, base_url)
+            report["scenarios"][name] = res
+            print(
+                f"{name:8s} {res['throughput_rps']:8.2f} req/s  p50={res['p50_ms']} p95={res['p95_ms']} "
+                f"p99={res['p99_ms']} ms  ttft={res['ttft_p50_ms']} ttfa={res['ttfa_p50_ms']} ms  errors={res['errors']}"
+            )
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            return 1 if regressions else 0
+        return 0
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    p.add_argument("--students", type=int, default=8, help="Concurrent simulated students")
+    p.add_argument("--turns", type=int, default=5, help="Requests per student per scenario")
+    p.add_argument("--stub-port", type=int, default=9001)
+    p.add_argument("--app-port", type=int, default=8010)
+    p.add_argument("--ttft-ms", type=float, default=300)
+    p.add_argument("--tokens", type=int, default=60)
+    p.add_argument("--tokens-per-s", type=float, default=400)
+    p.add_argument("--ws-tts", action="store_true", help="Request speech on /ws/chat (measures TTFA)")
+    p.add_argument("--audio-format", default="pcm", help="Format for /ws/tts (wav, pcm, opus, mp3)")
+    p.add_argument("--clip-seconds", type=float, default=2.0, help="Length of the /stt upload")
+    p.add_argument("--real-audio", action="store_true", help="Use the real Whisper/Coqui models (must be cached)")
+    p.add_argument("--caches", action="store_true", help="Keep answer/retrieval/TTS caches enabled")
+    p.add_argument("--timeout", type=float, default=120)
+    p.add_argument("--warmup-timeout", type=float, default=300)
+    p.add_argument("--json", default=None, help="Write the report to this JSON file")
+    p.add_argument("--baseline", default=None, help="Earlier JSON report to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    sys.exit(asyncio.run(main(p.parse_args())))
@@ -0,0 +1,24 @@
+"""
+ASGI entry point for the e2e benchmark: app.main, with the STT and TTS
+components switched to the stub engines in bench.stub_audio unless
+BENCH_STUB_AUDIO=0 (then the real Whisper/Coqui models must be cached locally).
+
+    uvicorn bench.e2e_app:app
+"""
+import os
+
+from app.main import app  # noqa: F401
+from app import stt
+from app.components import components
+from app.tts_registry import registry, TTS_POOL_SIZE
+from bench.stub_audio import StubWhisperModel, StubTTSEngine
+
+
+def _load_stub_tts():
+    registry.register(registry.default_model, StubTTSEngine, TTS_POOL_SIZE)
+    return registry
+
+
+if os.getenv("BENCH_STUB_AUDIO", "1") == "1":
+    components["stt"].loader = lambda: stt.load(StubWhisperModel)
+    components["tts"].loader = _load_stub_tts
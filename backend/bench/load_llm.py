@@ -0,0 +1,120 @@
+"""
+Concurrency load test for the async LLM path.
+
+Starts the stub LLM server and a single-worker uvicorn running app.main
+(pointed at the stub through OPENAI_BASE_URL), then drives /query at
+increasing concurrency and prints requests/s per level. With a non-blocking
+LLM path throughput should grow roughly linearly with concurrency until the
+connection pool (LLM_MAX_CONNECTIONS) is saturated.
+
+    python -m bench.load_llm --concurrency 1 4 16 64 --requests 128
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+
+def _spawn(args, env=None):
+    return subprocess.Popen([sys.executable, *args], env={**os.environ, **(env or {})})
+
+
+async def _wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                r = await client.get(url)
+                if r.status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def _run_level(base_url: str, concurrency: int, total: int) -> dict:
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/query", json={"query": f"What is a derivative? #{i}"})
+                    r.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+                except httpx.HTTPError:
+                    errors += 1
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else None
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+    }
+
+
+async def main(args):
+    stub_port, app_port = args.stub_port, args.app_port
+    stub = _spawn(
+        ["-m", "bench.stub_llm", "--port", str(stub_port), "--ttft-ms", str(args.ttft_ms),
+         "--tokens", str(args.tokens), "--tokens-per-s", str(args.tokens_per_s)]
+    )
+    app_env = {
+        "GROQ_API_KEY": "",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+    }
+    server = _spawn(
+        ["-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port), "--workers", "1"],
+        env=app_env,
+    )
+    try:
+        await _wait_ready(f"http://127.0.0.1:{stub_port}/stats")
+        await _wait_ready(f"http://127.0.0.1:{app_port}/healthz")
+        base_url = f"http://127.0.0.1:{app_port}"
+        results = []
+        for c in args.concurrency:
+            total = max(args.requests, c)
+            res = await _run_level(base_url, c, total)
+            results.append(res)
+            print(f"concurrency={c:4d}  {res['throughput_rps']:8.2f} req/s  p50={res['p50_ms']} ms  errors={res['errors']}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    p.add_argument("--requests", type=int, default=128)
+    p.add_argument("--stub-port", type=int, default=9001)
+    p.add_argument("--app-port", type=int, default=8010)
+    p.add_argument("--ttft-ms", type=float, default=300)
+    p.add_argument("--tokens", type=int, default=60)
+    p.add_argument("--tokens-per-s", type=float, default=400)
+    p.add_argument("--json", default=None, help="Write results to this JSON file")
+    asyncio.run(main(p.parse_args()))
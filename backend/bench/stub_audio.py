@@ -0,0 +1,40 @@
+"""
+Stub STT/TTS engines for offline benchmarks.
+
+They follow the WhisperModel.transcribe() and TTS engine interfaces, cost a
+configurable real-time factor of sleep, and need no model downloads, so the
+e2e benchmark measures the server pipeline rather than model quality.
+"""
+import os
+import time
+import types
+from typing import Optional, Tuple
+
+import numpy as np
+
+STUB_STT_RTF = float(os.getenv("STUB_STT_RTF", "0.1"))
+STUB_STT_TEXT = os.getenv("STUB_STT_TEXT", "What is a derivative?")
+STUB_TTS_RTF = float(os.getenv("STUB_TTS_RTF", "0.2"))
+# Spoken duration per character of input text (~15 chars/s)
+STUB_TTS_SEC_PER_CHAR = float(os.getenv("STUB_TTS_SEC_PER_CHAR", "0.065"))
+STUB_TTS_SAMPLE_RATE = int(os.getenv("STUB_TTS_SAMPLE_RATE", "22050"))
+
+
+class StubWhisperModel:
+    def transcribe(self, audio, **kwargs):
+        duration = len(audio) / 16000 if isinstance(audio, np.ndarray) else 1.0
+        time.sleep(duration * STUB_STT_RTF)
+        return [types.SimpleNamespace(text=STUB_STT_TEXT)], None
+
+
+class StubTTSEngine:
+    model_name = "stub"
+    sample_rate = STUB_TTS_SAMPLE_RATE
+    speakers = []
+
+    def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[bytes, int]:
+        duration = max(0.2, len(text) * STUB_TTS_SEC_PER_CHAR)
+        time.sleep(duration * STUB_TTS_RTF)
+        t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+        pcm = (0.2 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes()
+        return pcm, self.sample_rate
@@ -0,0 +1,116 @@
+"""
+Local OpenAI-compatible chat-completions stub used by the load tests.
+
+It answers POST /v1/chat/completions (and /openai/v1/... for the Groq client)
+after a configurable delay, streaming tokens at a configurable rate.
+
+    python -m bench.stub_llm --port 9001 --ttft-ms 300 --tokens 60 --tokens-per-s 400
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+STUB_TTFT_MS = float(os.getenv("STUB_TTFT_MS", "300"))
+STUB_TOKENS = int(os.getenv("STUB_TOKENS", "60"))
+STUB_TOKENS_PER_S = float(os.getenv("STUB_TOKENS_PER_S", "400"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+# Tail latency injection: this fraction of requests waits an extra STUB_SLOW_MS before the first token
+STUB_SLOW_RATE = float(os.getenv("STUB_SLOW_RATE", "0"))
+STUB_SLOW_MS = float(os.getenv("STUB_SLOW_MS", "2000"))
+
+app = FastAPI(title="Stub LLM")
+_counter = {"requests": 0}
+
+
+def _chunk(completion_id: str, model: str, content: str = None, finish: str = None) -> str:
+    delta = {"content": content} if content is not None else {}
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(body)}\n\n"
+
+
+def _tokens(n: int):
+    words = ["Let's", " go", " step", " by", " step.", " First,", " recall", " the", " definition."]
+    return [words[i % len(words)] for i in range(n)]
+
+
+@app.post("/v1/chat/completions")
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    _counter["requests"] += 1
+    body = await request.json()
+    model = body.get("model", "stub")
+    stream = bool(body.get("stream"))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    tokens = _tokens(STUB_TOKENS)
+    interval = 1.0 / STUB_TOKENS_PER_S if STUB_TOKENS_PER_S > 0 else 0.0
+    ttft_s = STUB_TTFT_MS / 1000
+    if STUB_SLOW_RATE and (_counter["requests"] % max(1, round(1 / STUB_SLOW_RATE))) == 0:
+        ttft_s += STUB_SLOW_MS / 1000
+
+    if STUB_ERROR_RATE and (_counter["requests"] % max(1, round(1 / STUB_ERROR_RATE))) == 0:
+        await asyncio.sleep(ttft_s)
+        return JSONResponse({"error": {"message": "stub injected failure"}}, status_code=500)
+
+    if not stream:
+        await asyncio.sleep(ttft_s + interval * len(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    async def event_stream():
+        await asyncio.sleep(ttft_s)
+        for tok in tokens:
+            yield _chunk(completion_id, model, tok)
+            if interval:
+                await asyncio.sleep(interval)
+        yield _chunk(completion_id, model, finish="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return dict(_counter)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9001)
+    p.add_argument("--ttft-ms", type=float, default=STUB_TTFT_MS)
+    p.add_argument("--tokens", type=int, default=STUB_TOKENS)
+    p.add_argument("--tokens-per-s", type=float, default=STUB_TOKENS_PER_S)
+    p.add_argument("--error-rate", type=float, default=STUB_ERROR_RATE)
+    p.add_argument("--slow-rate", type=float, default=STUB_SLOW_RATE, help="Fraction of requests with extra delay")
+    p.add_argument("--slow-ms", type=float, default=STUB_SLOW_MS)
+    args = p.parse_args()
+    STUB_TTFT_MS = args.ttft_ms
+    STUB_TOKENS = args.tokens
+    STUB_TOKENS_PER_S = args.tokens_per_s
+    STUB_ERROR_RATE = args.error_rate
+    STUB_SLOW_RATE = args.slow_rate
+    STUB_SLOW_MS = args.slow_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run from backend/ or the repo root: tests import the `app` package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Manual client script for a running server, not a test module
+collect_ignore = ["ws_test.py"]
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app import admission
+from app.admission import StageLimiter, Overloaded, INTERACTIVE, BULK, BACKGROUND
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_concurrency_without_waiting():
+    async def scenario():
+        limiter = StageLimiter("t", concurrency=2, queue_size=0)
+        assert await limiter.acquire() == 0.0
+        assert await limiter.acquire() == 0.0
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "queue full"
+        assert limiter.active == 2 and limiter.rejected == 1
+
+    run(scenario())
+
+
+def test_released_slot_goes_to_best_priority_waiter():
+    async def scenario():
+        limiter = StageLimiter("t", concurrency=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(priority, name):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(waiter(p, n)) for p, n in
+                 ((BACKGROUND, "background"), (BULK, "bulk"), (INTERACTIVE, "interactive"))]
+        await asyncio.sleep(0)
+        assert limiter.queued == 3
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "bulk", "background"]
+        assert limiter.active == 0 and limiter.queued == 0
+
+    run(scenario())
+
+
+def test_wait_timeout_is_rejected():
+    async def scenario():
+        limiter = StageLimiter("t", concurrency=1, queue_size=1, max_wait=0.01)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "wait timeout"
+        assert limiter.rejected == 1 and limiter.queued == 0 and limiter.active == 1
+
+    run(scenario())
+
+
+def test_release_during_timeout_cancellation(monkeypatch):
+    """A release that pops the waiter's cancelled entry at the timeout edge must still yield a 429."""
+    limiter = StageLimiter("t", concurrency=1, queue_size=1, max_wait=0.05)
+
+    async def timeout_edge(future, timeout):
+        # What asyncio.wait_for does on timeout, with release() landing while it cancels
+        future.cancel()
+        limiter.release()
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        await limiter.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", timeout_edge)
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "wait timeout"
+        assert limiter.rejected == 1
+        assert limiter.active == 0 and limiter.queued == 0
+
+    run(scenario())
+
+
+def test_slot_handed_over_as_waiter_gives_up_is_passed_on(monkeypatch):
+    limiter = StageLimiter("t", concurrency=1, queue_size=2, max_wait=0.05)
+
+    async def scenario():
+        await limiter.acquire()
+        real_wait_for = asyncio.wait_for
+        next_waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        async def handed_then_timeout(future, timeout):
+            limiter.release()  # first waiter in the heap (us) gets the slot...
+            raise asyncio.TimeoutError  # ...just as we time out
+
+        monkeypatch.setattr(admission.asyncio, "wait_for", handed_then_timeout)
+        with pytest.raises(Overloaded):
+            await limiter.acquire(INTERACTIVE)
+        monkeypatch.setattr(admission.asyncio, "wait_for", real_wait_for)
+        await asyncio.wait_for(next_waiter, 1)
+        assert limiter.active == 1 and limiter.queued == 0
+
+    run(scenario())
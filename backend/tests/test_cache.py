@@ -0,0 +1,107 @@
+import os
+import threading
+
+import numpy as np
+
+from app import cache as cache_mod
+from app.cache import LRUCache, QueryCache, SemanticCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_query_cache_normalizes_query_text():
+    cache = QueryCache(path="", encoder="torch:m:fp32")
+    cache.put_embedding("  What IS   a derivative? ", [1.0, 2.0])
+    assert np.allclose(cache.get_embedding("what is a derivative?"), [1.0, 2.0])
+
+
+def test_query_cache_embeddings_are_per_encoder(tmp_path):
+    path = str(tmp_path / "query_cache.pkl")
+    torch_cache = QueryCache(path=path, encoder="torch:all-MiniLM-L6-v2:fp32")
+    torch_cache.put_embedding("q", [1.0, 0.0])
+    torch_cache.put_results([1.0, 0.0], 4, 1, [("c1", "text")])
+    torch_cache.save()
+
+    assert QueryCache(path=path, encoder="torch:all-MiniLM-L6-v2:fp32").get_embedding("q") is not None
+    onnx_cache = QueryCache(path=path, encoder="onnx:all-MiniLM-L6-v2:int8")
+    assert onnx_cache.get_embedding("q") is None
+    assert len(onnx_cache.results) == 0
+
+
+def test_concurrent_saves_leave_a_loadable_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "query_cache.pkl")
+    caches = [QueryCache(path=path, encoder="e") for _ in range(2)]
+    for i, cache in enumerate(caches):
+        for j in range(100 * (i + 1)):
+            cache.put_embedding(f"worker {i} query {j}", [float(i), float(j)])
+    # Both workers have their temp file open before either writes (shutting down together)
+    barrier = threading.Barrier(2)
+    dump = cache_mod.pickle.dump
+
+    def synchronized_dump(obj, f, **kwargs):
+        barrier.wait()
+        dump(obj, f, **kwargs)
+        f.flush()
+        barrier.wait()
+
+    monkeypatch.setattr(cache_mod.pickle, "dump", synchronized_dump)
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(cache_mod.os, "replace", lambda src, dst: (replace(src, dst), replaced.append(src)))
+    threads = [threading.Thread(target=cache.save) for cache in caches]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    monkeypatch.setattr(cache_mod.pickle, "dump", dump)
+    assert len(set(replaced)) == 2  # each save went through its own temp file
+    assert len(QueryCache(path=path, encoder="e").embeddings) in (100, 200)
+    assert os.listdir(tmp_path) == ["query_cache.pkl"]
+
+
+def test_retrieval_results_keyed_by_collection_version():
+    cache = QueryCache(path="")
+    cache.put_results([0.5, 0.5], 4, "v1", [("c1", "text")])
+    assert cache.get_results([0.5, 0.5], 4, "v1") == [("c1", "text")]
+    assert cache.get_results([0.5, 0.5], 4, "v2") is None
+    assert cache.get_results([0.5, 0.5], 3, "v1") is None
+
+
+def test_semantic_cache_skips_expired_best_match(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=8)
+    cache.store([1.0, 0.0, 0.0], "old")
+    now[0] += 50
+    cache.store([0.98, 0.2, 0.0], "fresh")
+    now[0] += 20  # "old" expired, "fresh" is 20 s old
+    assert cache.lookup([1.0, 0.0, 0.0]) == "fresh"
+    assert cache.expirations == 1 and cache.stats()["entries"] == 1
+
+
+def test_semantic_cache_threshold_and_version():
+    cache = SemanticCache(threshold=0.95, ttl=0, max_entries=8)
+    cache.store([1.0, 0.0], "answer", version=1)
+    assert cache.lookup([1.0, 0.01], version=1) == "answer"
+    assert cache.lookup([0.0, 1.0], version=1) is None  # below the threshold
+    assert cache.lookup([1.0, 0.0], version=2) is None  # collection changed
+    assert cache.invalidations == 1 and cache.stats()["entries"] == 0
+
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache(threshold=0.99, ttl=0, max_entries=2)
+    cache.store([1.0, 0.0, 0.0], "a")
+    cache.store([0.0, 1.0, 0.0], "b")
+    assert cache.lookup([1.0, 0.0, 0.0]) == "a"
+    cache.store([0.0, 0.0, 1.0], "c")  # evicts "b", not the just-used "a"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0]) == "a" and cache.evictions == 1
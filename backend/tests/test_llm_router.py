@@ -0,0 +1,139 @@
+import time
+import asyncio
+
+import pytest
+
+from app import llm_router
+from app.llm_router import LLMRouter, ProviderHealth
+
+
+class FakeProvider:
+    """Answers after `delay` seconds, or raises when `fail` is set; records cancellations."""
+
+    def __init__(self, name, delay=0.0, fail=False, tokens=("Hello", " world"), cleanup=0.0):
+        self.name = name
+        self.model_name = f"{name}-model"
+        self.delay = delay
+        self.fail = fail
+        self.tokens = tokens
+        self.calls = 0
+        self.cancelled = 0
+        self.cleanup = cleanup
+
+    async def _wait(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            await asyncio.sleep(self.cleanup)  # e.g. closing the HTTP stream
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+
+    async def complete(self, messages):
+        await self._wait()
+        return "".join(self.tokens)
+
+    async def stream(self, messages):
+        await self._wait()
+        for token in self.tokens:
+            yield token
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(autouse=True)
+def fast_router(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DEFAULT_MS", 20)
+    monkeypatch.setattr(llm_router, "LLM_CB_FAILURES", 2)
+    monkeypatch.setattr(llm_router, "LLM_CB_COOLDOWN_S", 0.05)
+
+
+def test_hedge_wins_when_first_choice_is_slow():
+    slow, fast = FakeProvider("slow", delay=2), FakeProvider("fast", tokens=("fast",))
+    router = LLMRouter([slow, fast], hedge=True)
+    assert asyncio.run(router.complete(MESSAGES)) == "fast"
+    assert router.hedges == 1 and router.hedge_wins == 1
+    assert slow.cancelled == 1
+
+
+def test_no_hedge_when_first_choice_is_fast():
+    first, second = FakeProvider("first"), FakeProvider("second")
+    router = LLMRouter([first, second], hedge=True)
+    assert asyncio.run(router.complete(MESSAGES)) == "Hello world"
+    assert router.hedges == 0 and second.calls == 0
+
+
+def test_stream_is_committed_to_the_hedge_winner():
+    slow, fast = FakeProvider("slow", delay=2), FakeProvider("fast", tokens=("a", "b", "c"))
+    router = LLMRouter([slow, fast], hedge=True)
+
+    async def collect():
+        return [delta async for delta in router.stream(MESSAGES)]
+
+    assert asyncio.run(collect()) == ["a", "b", "c"]
+    assert slow.cancelled == 1
+
+
+def test_caller_cancelled_during_hedge_cleanup():
+    slow = FakeProvider("slow", delay=2, cleanup=0.2)
+    fast = FakeProvider("fast", delay=0.05)
+    router = LLMRouter([slow, fast], hedge=True)
+
+    async def scenario():
+        request = asyncio.create_task(router.complete(MESSAGES))
+        await asyncio.sleep(0.15)  # the hedge has won; the slow loser is being cancelled
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+
+    asyncio.run(scenario())
+    assert slow.cancelled == 1
+
+
+def test_failover_on_error():
+    broken, backup = FakeProvider("broken", fail=True), FakeProvider("backup", tokens=("ok",))
+    router = LLMRouter([broken, backup], hedge=False)
+    assert asyncio.run(router.complete(MESSAGES)) == "ok"
+    assert router.failovers == 1
+    assert router.health["broken"].failures == 1
+
+
+def test_open_circuit_is_skipped():
+    broken, backup = FakeProvider("broken", fail=True), FakeProvider("backup")
+    router = LLMRouter([broken, backup], hedge=False)
+    for _ in range(2):
+        router.health["broken"].failure()
+    assert router.stats()["providers"]["broken"]["circuit"] == "open"
+    assert [p.name for p in router._ordered()] == ["backup"]
+    assert asyncio.run(router.complete(MESSAGES)) == "Hello world"
+    assert broken.calls == 0
+
+
+def test_half_open_probe_closes_or_rearms_the_circuit():
+    health = ProviderHealth("p")
+    health.failure()
+    health.failure()
+    assert not health.available and health.opened == 1
+    time.sleep(0.06)
+    assert health.stats()["circuit"] == "half_open"
+    health.failure()  # failed probe: open again
+    assert not health.available and health.opened == 2
+    time.sleep(0.06)
+    health.success(0.1)
+    assert health.stats()["circuit"] == "closed" and health.consecutive_failures == 0
+
+
+def test_all_circuits_open_still_tries():
+    only = FakeProvider("only", fail=True)
+    router = LLMRouter([only], hedge=False)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await router.complete(MESSAGES)
+
+    asyncio.run(scenario())
+    assert only.calls == 3
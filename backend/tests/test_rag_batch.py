@@ -0,0 +1,73 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.rag import RagService
+from app.embedder import BatchingEmbedder
+from app.vectorstore import MmapVectorStore
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [np.random.default_rng(sum(map(ord, t))).random(8).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.inflight = 0
+        self.peak = 0
+
+    async def complete(self, messages):
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            await asyncio.sleep(0.01)
+            if "boom" in messages[-1]["content"]:
+                raise RuntimeError("provider down")
+            return "answer"
+        finally:
+            self.inflight -= 1
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    x = np.random.default_rng(0).random((40, 8)).astype(np.float32)
+    MmapVectorStore.build(str(tmp_path), [f"c{i}" for i in range(40)], [f"chunk {i}" for i in range(40)], x)
+    service = RagService(load_models=False)
+    service.embedding = FakeEmbeddings()
+    service.embedder = BatchingEmbedder(service.embedding)
+    service.store = MmapVectorStore(str(tmp_path))
+    service.llm = FakeLLM()
+    yield service
+    service.embedder.shutdown()
+
+
+def test_retrieve_batch_embeds_once_and_retrieves_every_question(rag):
+    queries = [f"question {i}" for i in range(10)] + [" "]
+    retrieved = asyncio.run(rag.retrieve_batch(queries))
+    assert rag.embedding.calls == [queries]
+    assert retrieved["todo"] == list(range(10))
+    assert all(len(c) == 4 for c in retrieved["chunks"])
+    assert retrieved["ready"] == [{"index": 10, "error": "Empty query"}]
+
+
+def test_answer_batch_bounds_concurrency_and_isolates_errors(rag):
+    queries = [f"question {i}" for i in range(12)] + ["boom"]
+
+    async def collect():
+        return [r async for r in rag.answer_batch(queries, concurrency=3)]
+
+    results = asyncio.run(collect())
+    assert sorted(r["index"] for r in results) == list(range(13))
+    assert rag.llm.peak == 3
+    errors = [r for r in results if "error" in r]
+    assert errors == [{"index": 12, "error": "provider down"}]
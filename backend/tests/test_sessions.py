@@ -0,0 +1,117 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app import sessions
+from app.sessions import SessionStore, SqliteSessionStore
+
+
+def _turn(i):
+    return [{"role": "user", "text": f"q{i}"}, {"role": "assistant", "text": f"a{i}"}]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield SessionStore(max_messages=6, idle_ttl=0)
+    else:
+        s = SqliteSessionStore(str(tmp_path / "sessions.sqlite3"), max_messages=6, idle_ttl=0)
+        yield s
+        s.close()
+
+
+def test_ring_buffer_keeps_latest_messages(store):
+    for i in range(5):
+        store.append_many("s", _turn(i))
+    history = store.get_history("s")
+    assert [m["text"] for m in history] == ["q2", "a2", "q3", "a3", "q4", "a4"]
+
+
+def test_summary_coverage_follows_evictions(store):
+    for i in range(3):
+        store.append_many("s", _turn(i))
+    store.set_summary("s", "first two turns", 4)
+    assert store.get_summary("s") == ("first two turns", 4)
+    store.append_many("s", _turn(3))  # drops q0/a0: the summary now covers 2 retained messages
+    history, summary, covered = store.get_context("s")
+    assert summary == "first two turns" and covered == 2
+    assert [m["text"] for m in history[covered:]] == ["q2", "a2", "q3", "a3"]
+
+
+def test_absolute_summary_survives_turns_during_the_fold(store):
+    for i in range(3):
+        store.append_many("s", _turn(i))
+    history, offset, summary, covered = store.get_snapshot("s")
+    fold_to = len(history) - 2
+    # Two more turns land (evicting q0..a1) while the summary is being written
+    store.append_many("s", _turn(3))
+    store.append_many("s", _turn(4))
+    store.set_summary_at("s", "turns 0-1", offset + fold_to)
+    history, summary, covered = store.get_context("s")
+    assert summary == "turns 0-1" and covered == 0
+    assert [m["text"] for m in history[covered:]][0] == "q2"
+
+
+def test_stale_summary_is_dropped(store):
+    for i in range(3):
+        store.append_many("s", _turn(i))
+    store.set_summary_at("s", "turns 0-1", 4)
+    store.set_summary_at("s", "turn 0", 2)  # a slower, older fold
+    assert store.get_summary("s") == ("turns 0-1", 4)
+    store.clear("s")
+    store.set_summary_at("s", "turns 0-2", 6)  # raced the clear
+    assert store.get_summary("s") == (None, 0)
+
+
+@pytest.mark.parametrize("reset", ["clear", "evict"])
+def test_stale_fold_skips_the_recreated_session(store, reset, monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_SWEEP_INTERVAL", 0)
+    for i in range(3):
+        store.append_many("s", _turn(i))
+    history, offset, _, _ = store.get_snapshot("s")
+    if reset == "clear":
+        store.clear("s")
+    else:
+        store.idle_ttl = 0.01
+        time.sleep(0.03)
+        store.append_many("other", _turn(0))  # writes sweep idle sessions
+        store.idle_ttl = 0
+    store.append_many("s", _turn(9))  # a new conversation under the same id
+    store.set_summary_at("s", "old conversation", offset + len(history) - 2)
+    assert store.get_context("s") == (_turn(9), None, 0)
+
+
+def test_clear_resets_history_and_summary(store):
+    store.append_many("s", _turn(0))
+    store.set_summary("s", "x", 2)
+    store.clear("s")
+    assert store.get_context("s") == ([], None, 0)
+    store.append_many("s", _turn(1))
+    assert store.get_context("s")[2] == 0
+
+
+def test_unknown_session_is_empty(store):
+    assert store.get_context("nope") == ([], None, 0)
+
+
+def test_async_facade_runs_sqlite_off_the_loop(tmp_path):
+    store = SqliteSessionStore(str(tmp_path / "s.sqlite3"), max_messages=6, idle_ttl=0)
+    loop_thread = []
+    original = store.append_many
+
+    def spy(session_id, messages):
+        loop_thread.append(threading.get_ident())
+        original(session_id, messages)
+
+    store.append_many = spy
+
+    async def scenario():
+        await store.aappend_many("s", _turn(0))
+        return threading.get_ident(), await store.aget_context("s")
+
+    ident, (history, summary, covered) = asyncio.run(scenario())
+    assert loop_thread and loop_thread[0] != ident
+    assert len(history) == 2 and summary is None and covered == 0
+    store.close()
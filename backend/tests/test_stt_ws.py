@@ -0,0 +1,31 @@
+import numpy as np
+
+from app.stt_ws import SpeechSegmenter, VAD_FRAME_MS, VAD_SILENCE_MS, WHISPER_SAMPLE_RATE
+
+
+def _tone(ms):
+    t = np.arange(WHISPER_SAMPLE_RATE * ms // 1000) / WHISPER_SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(ms):
+    return np.zeros(WHISPER_SAMPLE_RATE * ms // 1000, dtype=np.float32)
+
+
+def test_segment_opened_and_closed_in_one_feed():
+    segmenter = SpeechSegmenter()
+    pause = _silence(VAD_SILENCE_MS + 4 * VAD_FRAME_MS)
+    events = segmenter.feed(np.concatenate([_silence(300), _tone(600), pause, _tone(600), pause]))
+    assert [kind for kind, _ in events] == ["start", "end", "start", "end"]
+    assert not segmenter.active
+    audio, start_s, end_s = events[1][1]
+    assert start_s < end_s and end_s >= 0.8 and len(audio) > 0  # start includes the pre-roll
+
+
+def test_segment_spanning_feeds():
+    segmenter = SpeechSegmenter()
+    assert [k for k, _ in segmenter.feed(_tone(600))] == ["start"]
+    assert segmenter.active and segmenter.current() is not None
+    assert segmenter.feed(_tone(300)) == []
+    assert [k for k, _ in segmenter.feed(_silence(VAD_SILENCE_MS + 4 * VAD_FRAME_MS))] == ["end"]
+    assert segmenter.flush() is None
@@ -0,0 +1,27 @@
+from app import tts_cache
+from app.tts_cache import TTSCache
+from app.tts_registry import EnginePool
+
+
+class LateRateEngine:
+    """Like pyttsx3: the sample rate is only known once something was rendered."""
+
+    model_name = "late"
+    sample_rate = 0
+    speakers = []
+
+    def synthesize(self, text, voice=None):
+        self.sample_rate = 22050
+        return b"\x01\x00" * 100, self.sample_rate
+
+
+def test_rate_is_known_before_caching(monkeypatch):
+    cache = TTSCache(memory_bytes=1 << 20, disk_dir="", disk_bytes=0)
+    monkeypatch.setattr(tts_cache, "cache", cache)
+    pool = EnginePool("late", LateRateEngine, 1)
+
+    assert tts_cache._render(pool, "Hello there.", None)[1] == 22050
+    assert cache.stats()["memory_entries"] == 0  # rendered at an unknown rate: not keyed under 0
+    tts_cache._render(pool, "Hello there.", None)
+    pcm, rate = tts_cache._render(pool, "Hello there.", None)
+    assert rate == 22050 and cache.stats()["hits"] == 1
@@ -0,0 +1,25 @@
+from app.utils import SentenceSplitter, split_sentences
+
+
+def test_feed_returns_sentences_as_they_complete():
+    splitter = SentenceSplitter(min_chars=10)
+    out = []
+    for delta in ["The derivative ", "measures change. ", "It is a li", "mit! Next one"]:
+        out.extend(splitter.feed(delta))
+    assert out == ["The derivative measures change.", "It is a limit!"]
+    assert splitter.flush() == "Next one"
+    assert splitter.flush() == ""
+
+
+def test_short_fragments_merge_into_the_next_sentence():
+    splitter = SentenceSplitter(min_chars=20)
+    assert splitter.feed("E.g. this one is long enough. ") == ["E.g. this one is long enough."]
+
+
+def test_quotes_and_newlines_end_sentences():
+    text = 'She said "it converges." Then we stop\nA new line starts here'
+    assert split_sentences(text, min_chars=5) == [
+        'She said "it converges."',
+        "Then we stop",
+        "A new line starts here",
+    ]
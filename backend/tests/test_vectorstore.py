@@ -0,0 +1,107 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from app import vectorstore
+from app.vectorstore import MmapVectorStore
+
+
+def _corpus(n=500, dim=16, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return [f"id{i}" for i in range(n)], [f"text {i}" for i in range(n)], x
+
+
+def _exact(x, q, k):
+    xn = x / np.linalg.norm(x, axis=1, keepdims=True)
+    return list(np.argsort(-(xn @ (q / np.linalg.norm(q))))[:k])
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Several blocks even for a small corpus, so the running top-k merge is exercised
+    monkeypatch.setattr(vectorstore, "_SCAN_BLOCK", 64)
+
+
+def test_search_matches_brute_force(tmp_path, small_blocks):
+    ids, texts, x = _corpus()
+    MmapVectorStore.build(str(tmp_path), ids, texts, x)
+    store = MmapVectorStore(str(tmp_path))
+    q = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+    assert [i for i, _ in store.search(q, k=5)] == [f"id{r}" for r in _exact(x, q, 5)]
+
+
+def test_search_many_matches_search(tmp_path, small_blocks):
+    ids, texts, x = _corpus()
+    MmapVectorStore.build(str(tmp_path), ids, texts, x)
+    store = MmapVectorStore(str(tmp_path))
+    Q = np.random.default_rng(2).standard_normal((7, 16)).astype(np.float32)
+    assert store.search_many(Q, k=4) == [store.search(q, k=4) for q in Q]
+
+
+def test_search_many_k_larger_than_corpus(tmp_path):
+    ids, texts, x = _corpus(n=3)
+    MmapVectorStore.build(str(tmp_path), ids, texts, x)
+    store = MmapVectorStore(str(tmp_path))
+    results = store.search_many(x, k=10)
+    assert [len(r) for r in results] == [3, 3, 3]
+    assert [r[0][0] for r in results] == ids
+
+
+def test_int8_close_to_float32(tmp_path):
+    ids, texts, x = _corpus()
+    MmapVectorStore.build(str(tmp_path), ids, texts, x, quantize=True)
+    store = MmapVectorStore(str(tmp_path))
+    hits = sum(store.search(x[i], k=1)[0][0] == ids[i] for i in range(50))
+    assert hits == 50
+
+
+def test_ivf_probing_every_list_is_exact(tmp_path):
+    ids, texts, x = _corpus()
+    MmapVectorStore.build(str(tmp_path), ids, texts, x, nlist=8)
+    store = MmapVectorStore(str(tmp_path), nprobe=8)
+    q = x[10] + 0.1
+    assert [i for i, _ in store.search(q, k=5)] == [f"id{r}" for r in _exact(x, q, 5)]
+
+
+def test_rebuild_swaps_whole_index_and_drops_stale_files(tmp_path):
+    d = str(tmp_path)
+    ids, texts, x = _corpus(n=50)
+    MmapVectorStore.build(d, ids, texts, x, quantize=True)
+    store = MmapVectorStore(d)
+    old = store._current()
+
+    ids2, texts2, x2 = _corpus(n=20, seed=5)
+    texts2 = [f"new {t}" for t in texts2]
+    MmapVectorStore.build(d, ids2, texts2, x2)
+    os.utime(os.path.join(d, "meta.json"), ns=(old.mtime + 10**9, old.mtime + 10**9))
+
+    # A search that captured the old build keeps reading it consistently
+    assert old.count == 50 and old.texts[49] == "text 49"
+    assert store.count() == 20
+    assert store.search(x2[3], k=1) == [("id3", "new text 3")]
+
+    MmapVectorStore.build(d, ids2, texts2, x2)
+    generations = [n for n in os.listdir(d) if n.startswith("gen-")]
+    assert len(generations) == 2  # current + previous
+    assert not any(os.path.exists(os.path.join(d, g, "scales.npy")) for g in generations)
+
+
+def test_legacy_layout_still_opens(tmp_path):
+    d = str(tmp_path)
+    ids, texts, x = _corpus(n=30)
+    meta = MmapVectorStore.build(d, ids, texts, x)
+    gen = os.path.join(d, meta.pop("generation"))
+    for name in os.listdir(gen):
+        os.replace(os.path.join(gen, name), os.path.join(d, name))
+    os.rmdir(gen)
+    with open(os.path.join(d, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    store = MmapVectorStore(d)
+    assert store.search(x[4], k=1)[0][0] == "id4"
+    # The first generation build keeps the legacy files (previous build), the next removes them
+    MmapVectorStore.build(d, ids, texts, x)
+    assert os.path.exists(os.path.join(d, "vectors.npy"))
+    MmapVectorStore.build(d, ids, texts, x)
+    assert not os.path.exists(os.path.join(d, "vectors.npy"))